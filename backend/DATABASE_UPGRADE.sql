@@ -0,0 +1,41 @@
+-- OpsFlow Guardian 2.0 - Upgrade script for existing databases
+-- NEW_DATABASE_SETUP.sql creates fresh databases with everything below;
+-- run this against databases created from an earlier version of it.
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so run
+-- this file statement by statement (psql -f, or the Supabase SQL Editor
+-- without wrapping it in BEGIN/COMMIT). Every statement is idempotent.
+
+-- ================================
+-- WORKFLOWS: status / optimistic locking columns and keyset pagination indexes
+-- ================================
+
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS status VARCHAR(50) NOT NULL DEFAULT 'pending';
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS lock_version INTEGER NOT NULL DEFAULT 1;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_workflows_created_id ON workflows(created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_workflows_company_created_id ON workflows(company_id, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_workflows_status_created_id ON workflows(status, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_workflows_company_status_created_id ON workflows(company_id, status, created_at, id);
+
+-- ================================
+-- AUDIT TRAIL: keyset pagination indexes
+-- ================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_trail_company_created_id ON audit_trail(company_id, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_trail_company_event_created_id ON audit_trail(company_id, event_type, created_at, id);
+
+-- ================================
+-- AUDIT TRAIL: full-text search document
+-- Adding a STORED generated column rewrites the table; run it off-peak.
+-- ================================
+
+ALTER TABLE audit_trail ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english'::regconfig, coalesce(event_description, '')), 'A') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(resource_type, '')), 'B') ||
+    setweight(to_tsvector('english'::regconfig,
+        coalesce(metadata->>'action', '') || ' ' || coalesce(metadata->>'workflow_name', '') || ' ' ||
+        coalesce(metadata->>'agent_name', '') || ' ' || coalesce(metadata->>'details', '')), 'C')
+) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_trail_search_vector ON audit_trail USING GIN (search_vector);
@@ -213,10 +213,12 @@ CREATE TABLE workflows (
     requires_approval BOOLEAN DEFAULT FALSE,
     
     -- Status
+    status VARCHAR(50) NOT NULL DEFAULT 'pending',
     is_active BOOLEAN DEFAULT TRUE,
     is_template BOOLEAN DEFAULT FALSE,
     is_public BOOLEAN DEFAULT FALSE,
     version INTEGER DEFAULT 1,
+    lock_version INTEGER NOT NULL DEFAULT 1,
     
     -- Metadata
     tags JSONB,
@@ -240,6 +242,10 @@ CREATE INDEX idx_workflows_uuid ON workflows(workflow_uuid);
 CREATE INDEX idx_workflows_active ON workflows(is_active);
 CREATE INDEX idx_workflows_category ON workflows(category);
 CREATE INDEX idx_workflows_risk_level ON workflows(risk_level);
+CREATE INDEX idx_workflows_created_id ON workflows(created_at, id);
+CREATE INDEX idx_workflows_company_created_id ON workflows(company_id, created_at, id);
+CREATE INDEX idx_workflows_status_created_id ON workflows(status, created_at, id);
+CREATE INDEX idx_workflows_company_status_created_id ON workflows(company_id, status, created_at, id);
 
 -- ================================
 -- 6. WORKFLOW EXECUTIONS
@@ -527,7 +533,16 @@ CREATE TABLE audit_trail (
     error_message TEXT,
     
     -- Timestamp
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    -- Full-text search document (description > resource type > metadata keys)
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, coalesce(event_description, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(resource_type, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig,
+            coalesce(metadata->>'action', '') || ' ' || coalesce(metadata->>'workflow_name', '') || ' ' ||
+            coalesce(metadata->>'agent_name', '') || ' ' || coalesce(metadata->>'details', '')), 'C')
+    ) STORED
 );
 
 CREATE INDEX idx_audit_trail_company_id ON audit_trail(company_id);
@@ -536,6 +551,9 @@ CREATE INDEX idx_audit_trail_agent_id ON audit_trail(agent_id);
 CREATE INDEX idx_audit_trail_event_type ON audit_trail(event_type);
 CREATE INDEX idx_audit_trail_resource_type ON audit_trail(resource_type);
 CREATE INDEX idx_audit_trail_created_at ON audit_trail(created_at);
+CREATE INDEX idx_audit_trail_company_created_id ON audit_trail(company_id, created_at, id);
+CREATE INDEX idx_audit_trail_company_event_created_id ON audit_trail(company_id, event_type, created_at, id);
+CREATE INDEX idx_audit_trail_search_vector ON audit_trail USING GIN (search_vector);
 
 -- ================================
 -- 12. SYSTEM SETTINGS
@@ -4,48 +4,20 @@ Real AI Agent Integration with Portia SDK and Gemini
 """
 
 import logging
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Header
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple
 from uuid import uuid4
 from datetime import datetime, timezone
 import asyncio
 
-# Authentication setup
-security = HTTPBearer()
-
-class AuthenticationError(HTTPException):
-    def __init__(self, detail: str = "Authentication required to create or manage agents"):
-        super().__init__(status_code=401, detail=detail)
-
-def verify_auth(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify authentication token for agent operations"""
-    if not credentials or not credentials.credentials:
-        raise AuthenticationError("Valid authentication token required")
-    
-    # In production, validate the JWT token here
-    # For now, we'll accept any non-empty token
-    token = credentials.credentials
-    if len(token) < 10:  # Basic validation
-        raise AuthenticationError("Invalid authentication token")
-    
-    return token
-
-def get_user_from_auth(authorization: str = Header(None)):
-    """Extract user information from authorization header"""
-    if not authorization or not authorization.startswith("Bearer "):
-        raise AuthenticationError("Bearer token required for user identification")
-    
-    token = authorization.replace("Bearer ", "")
-    # In production, decode JWT to get user info
-    # For now, return mock user info
-    return {
-        "user_id": str(uuid4()),
-        "email": "user@company.com",
-        "organization_id": str(uuid4()),
-        "role": "admin"
-    }
+from app.core.auth import get_authenticated_user
+from app.core.config import settings
+from app.core.state_store import StateStore
+from app.services.execution_queue import execution_queue
+from app.services.redis_service import redis_service
+from app.services.chat_stream import STREAM_MODES, mock_chunks, stream_chat, stream_mode
 
 # Import Portia integration
 try:
@@ -64,6 +36,8 @@ except ImportError as e:
 # Configure logging
 logger = logging.getLogger(__name__)
 
+AGENT_EXECUTION_JOB = "agent_execution"
+
 # Initialize router
 router = APIRouter()
 
@@ -87,9 +61,66 @@ class WorkflowExecuteRequest(BaseModel):
     context: Optional[Dict[str, Any]] = Field(default={}, description="Additional context")
     organization_id: Optional[str] = Field(None, description="Organization ID")
 
-# Mock storage for development
-agents_storage = {}
-execution_storage = {}
+async def _offload_execution(execution_id: str, execution: Dict[str, Any]):
+    await redis_service.set_json(f"agent_execution:{execution_id}", execution, expire=settings.EXECUTION_STATUS_TTL)
+
+
+async def _load_execution(execution_id: str) -> Optional[Dict[str, Any]]:
+    return await redis_service.get_json(f"agent_execution:{execution_id}")
+
+
+def _gemini_chat_service():
+    """The Portia service if its Gemini model is configured (it initializes at startup), else None"""
+    try:
+        from app.services.portia_service import portia_service
+    except ImportError:
+        return None
+    gemini = portia_service.gemini_service
+    if gemini is None or gemini.model is None:
+        return None
+    return portia_service
+
+
+def _chat_chunks(message: str, agent_role: str, fallback_text: str) -> AsyncGenerator[str, None]:
+    """Stream from Gemini, else stream the mock reply"""
+    service = _gemini_chat_service()
+    if service is not None:
+        return service.chat_with_gemini_agent_stream(message, agent_role)
+    return mock_chunks(fallback_text)
+
+
+async def _chat_reply(message: str, agent_role: str, fallback_text: str) -> Tuple[str, bool]:
+    """Complete reply from Gemini, else the mock reply; returns (text, real_ai)"""
+    service = _gemini_chat_service()
+    if service is not None:
+        return await service.chat_with_gemini_agent(message, agent_role), True
+    return fallback_text, False
+
+
+def _streaming_chat_response(chunks: AsyncGenerator[str, None], request: Request, mode: str,
+                             meta: Dict[str, Any]) -> StreamingResponse:
+    return StreamingResponse(
+        stream_chat(chunks, request, mode, meta),
+        media_type=STREAM_MODES[mode],
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+        }
+    )
+
+
+# Mock storage for development. Agents are configuration, so they are never
+# evicted; executions are bounded and finished ones are offloaded to Redis.
+agents_storage: Dict[str, Dict[str, Any]] = {}
+execution_storage = StateStore(
+    "agent_executions",
+    is_terminal=lambda execution: execution.get("status") in ("completed", "failed"),
+    max_live=settings.STATE_STORE_MAX_LIVE,
+    max_terminal=settings.STATE_STORE_MAX_TERMINAL,
+    terminal_ttl=settings.STATE_STORE_TERMINAL_TTL,
+    offload=_offload_execution,
+    loader=_load_execution
+)
 
 @router.get("/")
 async def list_agents():
@@ -132,17 +163,12 @@ async def list_agents():
 @router.post("/")
 async def create_agent_direct(
     agent_data: AgentCreateRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    authorization: str = Header(None)
+    user_info: Dict[str, Any] = Depends(get_authenticated_user)
 ):
     """Create a new AI agent with company profile personalization (Authentication Required)"""
     try:
         from app.services.ai_personalization_service import ai_personalization_service
         
-        # Verify authentication
-        verify_auth(credentials)
-        user_info = get_user_from_auth(authorization)
-        
         logger.info(f"🔐 Creating personalized agent for authenticated user: {user_info['email']}")
         
         agent_id = str(uuid.uuid4())[:8]  # Short UUID
@@ -279,19 +305,14 @@ async def get_agent(agent_id: str):
         logger.error(f"Failed to get agent {agent_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve agent: {str(e)}")
 
-@router.post("/{agent_id}/execute")
+@router.post("/{agent_id}/execute", status_code=202)
 async def execute_workflow(
     agent_id: str, 
     workflow_request: WorkflowExecuteRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    authorization: str = Header(None)
+    user_info: Dict[str, Any] = Depends(get_authenticated_user)
 ):
-    """Execute workflow using AI agent with real Portia SDK integration (Authentication Required)"""
+    """Queue a workflow for the AI agent and return its execution id immediately (Authentication Required)"""
     try:
-        # Verify authentication
-        verify_auth(credentials)
-        user_info = get_user_from_auth(authorization)
-        
         logger.info(f"🔐 Executing workflow for authenticated user: {user_info['email']}")
         
         if agent_id not in agents_storage:
@@ -303,7 +324,7 @@ async def execute_workflow(
         if agent.get('organization_id') != user_info['organization_id']:
             raise HTTPException(status_code=403, detail="Access denied: Agent belongs to different organization")
         
-        execution_id = str(uuid4())[:8]
+        execution_id = str(uuid4())
         
         # Prepare execution context with user information
         execution_context = {
@@ -313,8 +334,8 @@ async def execute_workflow(
             "executed_by_email": user_info['email'],
             "organization_id": user_info['organization_id'],
             "agent_name": agent.get("name", "Unknown Agent"),
-            "started_at": datetime.now(timezone.utc).isoformat(),
-            "status": "initializing",
+            "queued_at": datetime.now(timezone.utc).isoformat(),
+            "status": "queued",
             "workflow_request": workflow_request.dict(),
             "organization_id": workflow_request.organization_id or agent.get("organization_id", "default-org")
         }
@@ -322,106 +343,25 @@ async def execute_workflow(
         # Store initial execution state
         execution_storage[execution_id] = execution_context
         
-        # Execute with real AI if Portia is available
-        if PORTIA_AVAILABLE and agent.get("portia_integration", False):
-            try:
-                logger.info(f"🤖 Executing workflow with real AI agent {agent_id}")
-                
-                portia_result = await execute_real_workflow(
-                    agent_id=agent_id,
-                    workflow_request=workflow_request.dict()
-                )
-                
-                # Update execution with real results
-                execution_context.update({
-                    "status": portia_result.get("status", "completed"),
-                    "portia_plan_id": portia_result.get("plan_id"),
-                    "steps_completed": portia_result.get("steps_completed", 0),
-                    "total_steps": portia_result.get("total_steps", 1),
-                    "execution_time": portia_result.get("execution_time", 0),
-                    "ai_reasoning": portia_result.get("ai_reasoning", "AI reasoning available"),
-                    "confidence_score": portia_result.get("confidence_score", 0.85),
-                    "results": portia_result.get("results", {}),
-                    "requires_approval": portia_result.get("requires_approval", True),
-                    "risk_assessment": portia_result.get("risk_assessment", {"level": "medium"}),
-                    "real_ai_execution": True,
-                    "completed_at": datetime.now(timezone.utc).isoformat()
-                })
-                
-                logger.info(f"✅ Real AI execution completed for {execution_id}")
-                
-            except Exception as portia_error:
-                logger.warning(f"⚠️  Portia execution error, using mock result: {portia_error}")
-                execution_context.update({
-                    "status": "completed",
-                    "portia_error": str(portia_error),
-                    "real_ai_execution": False
-                })
-        
-        # Mock execution for development/fallback
-        if not execution_context.get("real_ai_execution", False):
-            logger.info(f"📝 Executing workflow with mock AI agent {agent_id}")
-            
-            # Simulate AI processing
-            await asyncio.sleep(0.1)  # Brief delay to simulate processing
-            
-            mock_results = {
-                "status": "completed",
-                "steps_completed": 3,
-                "total_steps": 3,
-                "execution_time": 2.5,
-                "ai_reasoning": f"Analyzed workflow request: '{workflow_request.description}'. Determined appropriate actions based on agent configuration and available tools. Confidence level is high due to clear requirements and available context.",
-                "confidence_score": 0.87,
-                "results": {
-                    "workflow_analysis": {
-                        "complexity": "medium",
-                        "estimated_impact": "positive",
-                        "resource_requirements": ["api_access", "data_processing"]
-                    },
-                    "recommended_actions": [
-                        "Validate input parameters",
-                        "Execute core workflow logic", 
-                        "Generate comprehensive report"
-                    ],
-                    "output": f"Successfully processed: {workflow_request.description}",
-                    "metadata": {
-                        "processing_time": "2.5 seconds",
-                        "tokens_used": 1247,
-                        "model_version": agent.get("llm_model", "gemini-2.5-flash")
-                    }
-                },
-                "requires_approval": workflow_request.parameters.get("requires_approval", True),
-                "risk_assessment": {
-                    "level": "medium",
-                    "factors": ["automated_execution", "standard_workflow"],
-                    "mitigation": "Standard approval process recommended"
-                },
-                "real_ai_execution": False,
-                "completed_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            execution_context.update(mock_results)
-        
-        # Update agent statistics
-        agent["execution_count"] = agent.get("execution_count", 0) + 1
-        agent["last_executed"] = datetime.now(timezone.utc).isoformat()
-        
-        # Update success rate if completed successfully
-        if execution_context.get("status") == "completed":
-            current_successes = agent.get("success_count", 0) + 1
-            total_executions = agent["execution_count"]
-            agent["success_count"] = current_successes
-            agent["success_rate"] = round((current_successes / total_executions) * 100, 2)
-        
-        # Store final execution state
-        execution_storage[execution_id] = execution_context
-        agents_storage[agent_id] = agent
-        
-        # Prepare response
-        response = {
+        # Agent runs take as long as the model does; a queue worker runs them
+        await execution_queue.enqueue({
+            "kind": AGENT_EXECUTION_JOB,
+            "execution_id": execution_id,
+            "agent_id": agent_id,
+            "agent": agent,
+            "execution_context": execution_context,
+            # Plan execution calls tools with side effects, so it is not retried
+            "max_retries": 0,
+            "timeout_seconds": agent.get("max_execution_time", 300)
+        })
+        
+        logger.info(f"Workflow execution queued: {execution_id} for agent {agent_id}")
+        return {
             "success": True,
+            "message": "Workflow execution queued",
             "execution_id": execution_id,
-            **execution_context,
+            "status": "queued",
+            "status_url": f"/api/v1/agents/executions/{execution_id}/status",
             "agent_info": {
                 "id": agent_id,
                 "name": agent.get("name"),
@@ -430,15 +370,127 @@ async def execute_workflow(
             }
         }
         
-        logger.info(f"Workflow execution completed: {execution_id} - Status: {execution_context.get('status')}")
-        return response
-        
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Workflow execution failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Workflow execution failed: {str(e)}")
 
+async def run_agent_execution_job(job: Dict[str, Any]):
+    """Execution queue handler: run a queued agent workflow with Portia, or the mock agent"""
+    agent = job["agent"]
+    agent_id = job["agent_id"]
+    execution_id = job["execution_id"]
+    execution_context = {
+        **job["execution_context"],
+        "status": "running",
+        "started_at": datetime.now(timezone.utc).isoformat()
+    }
+    workflow_request = execution_context["workflow_request"]
+    execution_storage[execution_id] = execution_context
+    
+    # Execute with real AI if Portia is available
+    if PORTIA_AVAILABLE and agent.get("portia_integration", False):
+        try:
+            logger.info(f"🤖 Executing workflow with real AI agent {agent_id}")
+            
+            portia_result = await execute_real_workflow(
+                agent_id=agent_id,
+                workflow_request=workflow_request
+            )
+            
+            # Update execution with real results
+            execution_context.update({
+                "status": portia_result.get("status", "completed"),
+                "portia_plan_id": portia_result.get("plan_id"),
+                "steps_completed": portia_result.get("steps_completed", 0),
+                "total_steps": portia_result.get("total_steps", 1),
+                "execution_time": portia_result.get("execution_time", 0),
+                "ai_reasoning": portia_result.get("ai_reasoning", "AI reasoning available"),
+                "confidence_score": portia_result.get("confidence_score", 0.85),
+                "results": portia_result.get("results", {}),
+                "requires_approval": portia_result.get("requires_approval", True),
+                "risk_assessment": portia_result.get("risk_assessment", {"level": "medium"}),
+                "real_ai_execution": True,
+                "completed_at": datetime.now(timezone.utc).isoformat()
+            })
+            
+            logger.info(f"✅ Real AI execution completed for {execution_id}")
+            
+        except Exception as portia_error:
+            logger.warning(f"⚠️  Portia execution error, using mock result: {portia_error}")
+            execution_context.update({
+                "status": "completed",
+                "portia_error": str(portia_error),
+                "real_ai_execution": False
+            })
+    
+    # Mock execution for development/fallback
+    if not execution_context.get("real_ai_execution", False):
+        logger.info(f"📝 Executing workflow with mock AI agent {agent_id}")
+        
+        # Simulate AI processing
+        await asyncio.sleep(0.1)  # Brief delay to simulate processing
+        
+        mock_results = {
+            "status": "completed",
+            "steps_completed": 3,
+            "total_steps": 3,
+            "execution_time": 2.5,
+            "ai_reasoning": f"Analyzed workflow request: '{workflow_request['description']}'. Determined appropriate actions based on agent configuration and available tools. Confidence level is high due to clear requirements and available context.",
+            "confidence_score": 0.87,
+            "results": {
+                "workflow_analysis": {
+                    "complexity": "medium",
+                    "estimated_impact": "positive",
+                    "resource_requirements": ["api_access", "data_processing"]
+                },
+                "recommended_actions": [
+                    "Validate input parameters",
+                    "Execute core workflow logic", 
+                    "Generate comprehensive report"
+                ],
+                "output": f"Successfully processed: {workflow_request['description']}",
+                "metadata": {
+                    "processing_time": "2.5 seconds",
+                    "tokens_used": 1247,
+                    "model_version": agent.get("llm_model", "gemini-2.5-flash")
+                }
+            },
+            "requires_approval": (workflow_request.get("parameters") or {}).get("requires_approval", True),
+            "risk_assessment": {
+                "level": "medium",
+                "factors": ["automated_execution", "standard_workflow"],
+                "mitigation": "Standard approval process recommended"
+            },
+            "real_ai_execution": False,
+            "completed_at": datetime.now(timezone.utc).isoformat()
+        }
+        
+        execution_context.update(mock_results)
+    
+    # Store final execution state
+    execution_storage[execution_id] = execution_context
+    logger.info(f"Workflow execution completed: {execution_id} - Status: {execution_context.get('status')}")
+    
+    # Update agent statistics in place (on the worker that ran the job); an
+    # agent deleted while the job ran is not brought back
+    agent = agents_storage.get(agent_id)
+    if agent is None:
+        return
+    agent["execution_count"] = agent.get("execution_count", 0) + 1
+    agent["last_executed"] = datetime.now(timezone.utc).isoformat()
+    
+    # Update success rate if completed successfully
+    if execution_context.get("status") == "completed":
+        current_successes = agent.get("success_count", 0) + 1
+        total_executions = agent["execution_count"]
+        agent["success_count"] = current_successes
+        agent["success_rate"] = round((current_successes / total_executions) * 100, 2)
+
+
+execution_queue.register(AGENT_EXECUTION_JOB, run_agent_execution_job)
+
 @router.get("/{agent_id}/executions")
 async def get_agent_executions(agent_id: str):
     """Get execution history for an agent"""
@@ -476,11 +528,13 @@ async def get_agent_executions(agent_id: str):
 async def get_execution_status(execution_id: str):
     """Get detailed execution status"""
     try:
-        if execution_id not in execution_storage:
+        execution = await execution_storage.fetch(execution_id)
+        if execution is None:
+            # Running on another worker: report its queue status
+            execution = await execution_queue.get_status(execution_id)
+        if execution is None:
             raise HTTPException(status_code=404, detail="Execution not found")
         
-        execution = execution_storage[execution_id]
-        
         # Get real-time status if Portia plan exists
         if PORTIA_AVAILABLE and execution.get("portia_plan_id"):
             try:
@@ -534,8 +588,14 @@ async def delete_agent(agent_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to delete agent: {str(e)}")
 
 @router.post("/{agent_id}/chat")
-async def chat_with_agent(agent_id: str, message: Dict[str, Any]):
-    """Chat interface with AI agent"""
+async def chat_with_agent(
+    agent_id: str,
+    message: Dict[str, Any],
+    request: Request,
+    stream: Optional[str] = Query(None, description="Stream the reply as 'sse' or 'ndjson'"),
+    current_user: Dict[str, Any] = Depends(get_authenticated_user)
+):
+    """Chat interface with AI agent (Gemini-backed in both modes when configured)"""
     try:
         if agent_id not in agents_storage:
             raise HTTPException(status_code=404, detail="Agent not found")
@@ -562,12 +622,20 @@ async def chat_with_agent(agent_id: str, message: Dict[str, Any]):
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         
-        if PORTIA_AVAILABLE and agent.get("portia_integration", False):
-            chat_response["powered_by"] = "Portia SDK + Gemini"
-            chat_response["real_ai"] = True
-        else:
-            chat_response["powered_by"] = "Mock AI (Portia SDK unavailable)"
-            chat_response["real_ai"] = False
+        mode = stream_mode(request, stream)
+        if mode:
+            return _streaming_chat_response(
+                _chat_chunks(user_message, agent.get("agent_type", "planner"), chat_response["ai_response"]),
+                request,
+                mode,
+                {"agent_id": agent_id, "agent_name": chat_response["agent_name"]}
+            )
+        
+        chat_response["ai_response"], real_ai = await _chat_reply(
+            user_message, agent.get("agent_type", "planner"), chat_response["ai_response"]
+        )
+        chat_response["powered_by"] = "Portia SDK + Gemini" if real_ai else "Mock AI (Gemini unavailable)"
+        chat_response["real_ai"] = real_ai
         
         return chat_response
         
@@ -617,8 +685,7 @@ class AgentCreateRequest(BaseModel):
     tasks_completed: int = 0
     success_rate: float = 100.0
 
-# In-memory storage for demo (replace with database in production)
-agents_storage: Dict[str, Any] = {}
+# In-memory storage for demo (replace with database in production): agents_storage, defined above
 
 @router.get("/")
 async def get_agents():
@@ -809,8 +876,13 @@ async def get_gemini_status():
 
 
 @router.post("/gemini/chat")
-async def chat_with_gemini_agent(chat_request: Dict[str, Any]):
-    """Chat with Gemini-powered agent"""
+async def chat_with_gemini_agent(
+    chat_request: Dict[str, Any],
+    request: Request,
+    stream: Optional[str] = Query(None, description="Stream the reply as 'sse' or 'ndjson'"),
+    current_user: Dict[str, Any] = Depends(get_authenticated_user)
+):
+    """Chat with Gemini-powered agent (canned replies when Gemini is not configured)"""
     try:
         message = chat_request.get("message", "")
         agent_role = chat_request.get("agent_role", "planner")
@@ -818,9 +890,7 @@ async def chat_with_gemini_agent(chat_request: Dict[str, Any]):
         if not message:
             raise HTTPException(status_code=400, detail="Message is required")
         
-        # This would connect to actual GeminiService
-        # For now, return mock response
-        
+        # Canned replies for when Gemini is not configured
         responses = {
             "planner": f"As your Workflow Planner powered by Gemini 2.5 Pro, I understand you want to: '{message}'. I can help you create a detailed, step-by-step workflow plan with risk assessment and approval checkpoints. Would you like me to break this down into actionable steps?",
             "executor": f"As your Workflow Executor powered by Gemini 2.5 Pro, I can help you execute: '{message}'. I'll monitor the process in real-time, handle any errors, and ensure successful completion. Shall I proceed with the execution?",
@@ -829,16 +899,29 @@ async def chat_with_gemini_agent(chat_request: Dict[str, Any]):
         
         response = responses.get(agent_role, f"Hello! I'm an AI agent powered by Gemini 2.5 Pro. You said: '{message}'. How can I assist you today?")
         
+        mode = stream_mode(request, stream)
+        if mode:
+            return _streaming_chat_response(
+                _chat_chunks(message, agent_role, response),
+                request,
+                mode,
+                {"agent_role": agent_role, "model": "gemini-2.0-flash-exp"}
+            )
+        
+        response, real_ai = await _chat_reply(message, agent_role, response)
         return {
             "success": True,
             "data": {
                 "response": response,
                 "agent_role": agent_role,
                 "model": "gemini-2.0-flash-exp",
-                "timestamp": "2025-01-23T10:45:00Z"
+                "real_ai": real_ai,
+                "timestamp": datetime.now(timezone.utc).isoformat()
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to chat with Gemini agent: {e}")
         raise HTTPException(status_code=500, detail="Failed to chat with Gemini agent")
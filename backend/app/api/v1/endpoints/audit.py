@@ -2,39 +2,76 @@
 Audit API endpoints for OpsFlow Guardian 2.0
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
 import logging
 from datetime import datetime, timedelta
 
+from app.core.auth import authorize_company, get_authenticated_user
+from app.db.database import get_async_db
+from app.db.audit_repository import AuditRepository, audit_to_dict, MAX_PAGE_SIZE
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+def _parse_iso_date(value: Optional[str], field: str) -> Optional[datetime]:
+    """Parse an ISO date query parameter, rejecting malformed values with 400"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {field}: expected ISO format")
+
+
+def _split_event_types(event_types: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated event type filter"""
+    if not event_types:
+        return None
+    return [event_type.strip() for event_type in event_types.split(",") if event_type.strip()] or None
+
+
 @router.get("/")
 async def get_audit_logs(
-    limit: int = Query(50, description="Number of logs to retrieve"),
-    offset: int = Query(0, description="Offset for pagination"),
-    event_type: Optional[str] = Query(None, description="Filter by event type"),
-    user_id: Optional[str] = Query(None, description="Filter by user"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE, description="Number of logs to retrieve"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    company_id: Optional[int] = Query(None, description="Filter by company (admins only for other companies)"),
+    event_type: Optional[str] = Query(None, description="Filter by event type (comma-separated)"),
+    user_id: Optional[int] = Query(None, description="Filter by user"),
     start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
-    end_date: Optional[str] = Query(None, description="End date (ISO format)")
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+    current_user: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get audit logs with filtering and pagination"""
+    """Get audit logs with filtering and keyset pagination (newest first)"""
+    company_id = authorize_company(current_user, company_id)
     try:
-        # Return empty audit logs for now since no user activity exists yet
-        # TODO: Replace with actual user-specific audit data from database
-        audit_logs = []
+        entries, next_cursor = await AuditRepository(db).list_page(
+            limit=limit,
+            cursor=cursor,
+            company_id=company_id,
+            event_types=_split_event_types(event_type),
+            user_id=user_id,
+            start_date=_parse_iso_date(start_date, "start_date"),
+            end_date=_parse_iso_date(end_date, "end_date")
+        )
+        audit_logs = [audit_to_dict(entry) for entry in entries]
         
         return {
             "success": True,
             "data": audit_logs,
             "total": len(audit_logs),
             "limit": limit,
-            "offset": offset
+            "next_cursor": next_cursor
         }
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get audit logs: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve audit logs")
@@ -88,53 +125,31 @@ async def get_events_summary():
 
 
 @router.get("/workflow/{workflow_id}")
-async def get_workflow_audit_trail(workflow_id: str):
+async def get_workflow_audit_trail(
+    workflow_id: str,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Number of events to retrieve"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    current_user: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Get complete audit trail for a specific workflow"""
+    company_id = authorize_company(current_user)
     try:
-        # Mock workflow-specific audit trail
+        entries, next_cursor = await AuditRepository(db).list_page(
+            limit=limit,
+            cursor=cursor,
+            company_id=company_id,
+            resource_type="workflow",
+            resource_id=workflow_id
+        )
         audit_trail = [
             {
-                "timestamp": "2025-01-23T08:30:00Z",
-                "event": "workflow_requested",
-                "user": "hr-manager",
-                "details": "Employee onboarding workflow requested for John Doe"
-            },
-            {
-                "timestamp": "2025-01-23T08:32:00Z", 
-                "event": "plan_generated",
-                "user": "planner-agent",
-                "details": "4-step workflow plan created with medium complexity"
-            },
-            {
-                "timestamp": "2025-01-23T08:35:00Z",
-                "event": "plan_approved", 
-                "user": "hr-manager",
-                "details": "Workflow plan approved for execution"
-            },
-            {
-                "timestamp": "2025-01-23T08:36:00Z",
-                "event": "execution_started",
-                "user": "executor-agent",
-                "details": "Workflow execution initiated"
-            },
-            {
-                "timestamp": "2025-01-23T08:45:00Z",
-                "event": "step_completed",
-                "user": "executor-agent", 
-                "details": "Email account creation completed successfully"
-            },
-            {
-                "timestamp": "2025-01-23T09:00:00Z",
-                "event": "step_completed",
-                "user": "executor-agent",
-                "details": "Slack access setup completed"
-            },
-            {
-                "timestamp": "2025-01-23T09:01:00Z",
-                "event": "step_started",
-                "user": "executor-agent",
-                "details": "Development environment setup initiated"
+                "timestamp": entry.created_at.isoformat() if entry.created_at else None,
+                "event": entry.event_type,
+                "user": entry.user_id or entry.agent_id,
+                "details": entry.event_description
             }
+            for entry in entries
         ]
         
         return {
@@ -142,10 +157,13 @@ async def get_workflow_audit_trail(workflow_id: str):
             "data": {
                 "workflow_id": workflow_id,
                 "audit_trail": audit_trail,
-                "total_events": len(audit_trail)
+                "total_events": len(audit_trail),
+                "next_cursor": next_cursor
             }
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get workflow audit trail {workflow_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve workflow audit trail")
@@ -211,23 +229,33 @@ async def get_compliance_report():
 
 @router.get("/search")
 async def search_audit_logs(
-    query: str = Query(..., description="Search query"),
-    limit: int = Query(20, description="Number of results"),
-    event_types: Optional[str] = Query(None, description="Comma-separated event types")
+    query: str = Query(..., min_length=1, description="Search query (web search syntax)"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Number of results"),
+    event_types: Optional[str] = Query(None, description="Comma-separated event types"),
+    company_id: Optional[int] = Query(None, description="Filter by company (admins only for other companies)"),
+    current_user: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Search audit logs"""
+    """Full-text search audit logs, ranked by relevance"""
+    company_id = authorize_company(current_user, company_id)
     try:
-        # Mock search results
+        matches = await AuditRepository(db).search(
+            query,
+            limit=limit,
+            company_id=company_id,
+            event_types=_split_event_types(event_types)
+        )
         search_results = [
             {
-                "id": "audit-001",
-                "timestamp": "2025-01-23T10:35:00Z",
-                "event_type": "workflow_execution", 
-                "user_id": "system-executor",
-                "action": "step_completed",
-                "match_score": 0.95,
-                "highlighted_text": f"Query '{query}' found in step execution details"
+                "id": str(entry.audit_uuid),
+                "timestamp": entry.created_at.isoformat() if entry.created_at else None,
+                "event_type": entry.event_type,
+                "user_id": entry.user_id,
+                "action": (entry.audit_metadata or {}).get("action", entry.resource_type),
+                "match_score": round(rank, 4),
+                "highlighted_text": highlighted_text
             }
+            for entry, rank, highlighted_text in matches
         ]
         
         return {
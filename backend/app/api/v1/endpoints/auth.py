@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse, RedirectResponse
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 import secrets
@@ -10,14 +11,15 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import json
 import uuid
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.core.config import settings
+from app.core.auth import revoke_token, verify_token
+from app.services.http_client import HTTPClientRegistry, get_http_clients
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 import jwt
 from passlib.context import CryptContext
 from sqlalchemy import text
-import httpx
 
 router = APIRouter()
 
@@ -82,36 +84,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_user(db: Session, email: str):
-    result = db.execute(text("SELECT * FROM users WHERE email = :email"), {"email": email})
+async def get_user(db: AsyncSession, email: str):
+    result = await db.execute(text("SELECT * FROM users WHERE email = :email"), {"email": email})
     user_data = result.fetchone()
     if user_data:
         return type('User', (), dict(user_data._mapping))()
     return None
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user(db, email)
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user(db, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # bcrypt is CPU-bound; keep it off the event loop
+    if not await run_in_threadpool(verify_password, password, user.hashed_password):
         return False
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except jwt.PyJWTError:
+        # Verified claims are cached and checked against the revocation denylist
+        payload = await verify_token(token)
+    except HTTPException:
+        raise credentials_exception
+    email: str = payload.get("sub")
+    if email is None:
         raise credentials_exception
-    user = get_user(db, email=token_data.email)
+    token_data = TokenData(email=email)
+    user = await get_user(db, email=token_data.email)
     if user is None:
         raise credentials_exception
     return user
@@ -128,7 +132,7 @@ def send_reset_email(email: str, reset_code: str, background_tasks: BackgroundTa
     print(f"Reset code for {email}: {reset_code}")
 
 @router.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     try:
         # Validate input
         if not user_data.email or not user_data.name or not user_data.password:
@@ -139,7 +143,7 @@ async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db:
         
         # Check if user already exists
         try:
-            existing_user = db.execute(text("SELECT id FROM users WHERE email = :email"), {"email": user_data.email}).fetchone()
+            existing_user = (await db.execute(text("SELECT id FROM users WHERE email = :email"), {"email": user_data.email})).fetchone()
             if existing_user:
                 raise HTTPException(
                     status_code=400,
@@ -150,7 +154,7 @@ async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db:
             print(f"Database query error (might be first user): {e}")
         
         # Hash password
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
         
         # Generate UUID and username
         user_uuid = str(uuid.uuid4())
@@ -158,7 +162,7 @@ async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db:
         
         # Create new user - try insert, if fails try with different approach
         try:
-            result = db.execute(text("""
+            result = await db.execute(text("""
                 INSERT INTO users (user_uuid, email, username, full_name, hashed_password, is_active, created_at) 
                 VALUES (:user_uuid, :email, :username, :full_name, :hashed_password, :is_active, :created_at)
                 RETURNING id, email, full_name, is_active
@@ -172,7 +176,7 @@ async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db:
                 "created_at": datetime.utcnow()
             })
             
-            db.commit()
+            await db.commit()
             user = result.fetchone()
             
             if not user:
@@ -186,13 +190,13 @@ async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db:
             )
             
         except Exception as db_error:
-            db.rollback()
+            await db.rollback()
             print(f"Database error: {db_error}")
             
             # Try alternative approach - maybe table structure is different
             try:
                 # Simple insert without RETURNING clause
-                db.execute(text("""
+                await db.execute(text("""
                     INSERT INTO users (user_uuid, email, username, full_name, hashed_password, is_active, created_at) 
                     VALUES (:user_uuid, :email, :username, :full_name, :hashed_password, :is_active, :created_at)
                 """), {
@@ -205,10 +209,10 @@ async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db:
                     "created_at": datetime.utcnow()
                 })
                 
-                db.commit()
+                await db.commit()
                 
                 # Get the user back
-                user_result = db.execute(text("SELECT id, email, full_name, is_active FROM users WHERE email = :email"), {"email": user_data.email}).fetchone()
+                user_result = (await db.execute(text("SELECT id, email, full_name, is_active FROM users WHERE email = :email"), {"email": user_data.email})).fetchone()
                 
                 if user_result:
                     return UserResponse(
@@ -221,7 +225,7 @@ async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db:
                     raise HTTPException(status_code=400, detail="User created but could not retrieve")
                     
             except Exception as final_error:
-                db.rollback()
+                await db.rollback()
                 print(f"Final database error: {final_error}")
                 raise HTTPException(
                     status_code=400,
@@ -238,8 +242,8 @@ async def register(user_data: UserCreate, background_tasks: BackgroundTasks, db:
         )
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -259,7 +263,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login-json")
-async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login_json(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     # Validate input
     if not user_data.email or not user_data.password:
         raise HTTPException(
@@ -267,7 +271,7 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="Email and password are required"
         )
     
-    user = authenticate_user(db, user_data.email, user_data.password)
+    user = await authenticate_user(db, user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -285,8 +289,8 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/verify-email")
-async def verify_email(verification_data: EmailVerification, db: Session = Depends(get_db)):
-    result = db.execute(text("SELECT * FROM users WHERE email = :email"), {"email": verification_data.email})
+async def verify_email(verification_data: EmailVerification, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(text("SELECT * FROM users WHERE email = :email"), {"email": verification_data.email})
     user_data = result.fetchone()
     
     if not user_data:
@@ -301,7 +305,7 @@ async def verify_email(verification_data: EmailVerification, db: Session = Depen
             detail="Invalid verification code"
         )
     
-    db.execute(text("""
+    await db.execute(text("""
         UPDATE users 
         SET is_active = :is_active, verification_code = NULL, verified_at = :verified_at 
         WHERE email = :email
@@ -311,13 +315,13 @@ async def verify_email(verification_data: EmailVerification, db: Session = Depen
         "email": verification_data.email
     })
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Email verified successfully"}
 
 @router.post("/forgot-password")
-async def forgot_password(password_data: PasswordReset, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    result = db.execute(text("SELECT * FROM users WHERE email = :email"), {"email": password_data.email})
+async def forgot_password(password_data: PasswordReset, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(text("SELECT * FROM users WHERE email = :email"), {"email": password_data.email})
     user_data = result.fetchone()
     
     if not user_data:
@@ -329,7 +333,7 @@ async def forgot_password(password_data: PasswordReset, background_tasks: Backgr
     # Generate reset code
     reset_code = generate_verification_code()
     
-    db.execute(text("""
+    await db.execute(text("""
         UPDATE users 
         SET reset_code = :reset_code, reset_code_expires = :expires 
         WHERE email = :email
@@ -339,7 +343,7 @@ async def forgot_password(password_data: PasswordReset, background_tasks: Backgr
         "email": password_data.email
     })
     
-    db.commit()
+    await db.commit()
     
     # Send reset email
     send_reset_email(password_data.email, reset_code, background_tasks)
@@ -347,14 +351,14 @@ async def forgot_password(password_data: PasswordReset, background_tasks: Backgr
     return {"message": "Password reset code sent to your email"}
 
 @router.post("/reset-password")
-async def reset_password(reset_data: PasswordResetConfirm, db: Session = Depends(get_db)):
+async def reset_password(reset_data: PasswordResetConfirm, db: AsyncSession = Depends(get_async_db)):
     if reset_data.new_password != reset_data.confirm_password:
         raise HTTPException(
             status_code=400,
             detail="Passwords do not match"
         )
     
-    result = db.execute(text("SELECT * FROM users WHERE reset_code = :reset_code"), {"reset_code": reset_data.reset_code})
+    result = await db.execute(text("SELECT * FROM users WHERE reset_code = :reset_code"), {"reset_code": reset_data.reset_code})
     user_data = result.fetchone()
     
     if not user_data:
@@ -370,8 +374,8 @@ async def reset_password(reset_data: PasswordResetConfirm, db: Session = Depends
         )
     
     # Update password
-    hashed_password = get_password_hash(reset_data.new_password)
-    db.execute(text("""
+    hashed_password = await run_in_threadpool(get_password_hash, reset_data.new_password)
+    await db.execute(text("""
         UPDATE users 
         SET hashed_password = :hashed_password, reset_code = NULL, reset_code_expires = NULL 
         WHERE reset_code = :reset_code
@@ -380,7 +384,7 @@ async def reset_password(reset_data: PasswordResetConfirm, db: Session = Depends
         "reset_code": reset_data.reset_code
     })
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Password reset successfully"}
 
@@ -394,13 +398,13 @@ async def read_users_me(current_user = Depends(get_current_user)):
     )
 
 @router.get("/dashboard")
-async def get_user_dashboard(current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_user_dashboard(current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     # Get user's workflows
-    workflows_result = db.execute(text("SELECT * FROM workflows WHERE created_by = :user_id"), {"user_id": current_user.id})
+    workflows_result = await db.execute(text("SELECT * FROM workflows WHERE created_by = :user_id"), {"user_id": current_user.id})
     workflows = workflows_result.fetchall()
     
     # Get user's agents
-    agents_result = db.execute(text("SELECT * FROM agents WHERE created_by = :user_id"), {"user_id": current_user.id})
+    agents_result = await db.execute(text("SELECT * FROM agents WHERE created_by = :user_id"), {"user_id": current_user.id})
     agents = agents_result.fetchall()
     
     dashboard_data = {
@@ -456,7 +460,11 @@ async def google_oauth():
     return RedirectResponse(url=auth_url)
 
 @router.get("/oauth/google/callback")
-async def google_oauth_callback(code: str, db: Session = Depends(get_db)):
+async def google_oauth_callback(
+    code: str,
+    db: AsyncSession = Depends(get_async_db),
+    http: HTTPClientRegistry = Depends(get_http_clients)
+):
     """Handle Google OAuth callback"""
     google_client_id = "872245858233-fuvfnftodd3fat983nh1sv47o55fvd0u.apps.googleusercontent.com"
     google_client_secret = "GOCSPX-your-google-client-secret"  # You need to get this from Google Console
@@ -472,26 +480,27 @@ async def google_oauth_callback(code: str, db: Session = Depends(get_db)):
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post("https://oauth2.googleapis.com/token", data=token_data)
-            token_info = token_response.json()
-            
-            if "access_token" not in token_info:
-                raise HTTPException(status_code=400, detail="Failed to get access token")
-            
-            # Get user info from Google
-            user_response = await client.get(
-                "https://www.googleapis.com/oauth2/v2/userinfo",
-                headers={"Authorization": f"Bearer {token_info['access_token']}"}
-            )
-            user_info = user_response.json()
+        token_url = "https://oauth2.googleapis.com/token"
+        token_response = await http.get(token_url).post(token_url, data=token_data)
+        token_info = token_response.json()
+        
+        if "access_token" not in token_info:
+            raise HTTPException(status_code=400, detail="Failed to get access token")
+        
+        # Get user info from Google
+        user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
+        user_response = await http.get(user_info_url).get(
+            user_info_url,
+            headers={"Authorization": f"Bearer {token_info['access_token']}"}
+        )
+        user_info = user_response.json()
         
         # Check if user exists
-        existing_user = db.execute(text("SELECT * FROM users WHERE email = :email"), {"email": user_info["email"]}).fetchone()
+        existing_user = (await db.execute(text("SELECT * FROM users WHERE email = :email"), {"email": user_info["email"]})).fetchone()
         
         if not existing_user:
             # Create new user
-            result = db.execute(text("""
+            result = await db.execute(text("""
                 INSERT INTO users (user_uuid, email, username, full_name, is_active, created_at) 
                 VALUES (:user_uuid, :email, :username, :full_name, :is_active, :created_at)
                 RETURNING id, email, full_name, is_active
@@ -503,7 +512,7 @@ async def google_oauth_callback(code: str, db: Session = Depends(get_db)):
                 "is_active": True,
                 "created_at": datetime.utcnow()
             })
-            db.commit()
+            await db.commit()
             user_data = result.fetchone()
             user = type('User', (), dict(user_data._mapping))()
         else:
@@ -523,6 +532,7 @@ async def google_oauth_callback(code: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=f"OAuth authentication failed: {str(e)}")
 
 @router.post("/logout")
-async def logout(current_user = Depends(get_current_user)):
-    """Logout user (invalidate token on client side)"""
+async def logout(token: str = Depends(oauth2_scheme), current_user = Depends(get_current_user)):
+    """Logout user and revoke the token server-side"""
+    await revoke_token(token)
     return {"message": "Successfully logged out"}
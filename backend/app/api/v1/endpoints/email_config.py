@@ -4,8 +4,9 @@ Allows users to configure their own email settings
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.models.user_email_config import UserEmailConfig
 from app.models.user import User
 from app.services.user_email_service import get_user_email_service
@@ -57,11 +58,12 @@ class EmailTestResult(BaseModel):
     tested_at: str
 
 # Dependency to get current user (mock for now)
-def get_current_user(db: Session = Depends(get_db)) -> User:
+async def get_current_user(db: AsyncSession = Depends(get_async_db)) -> User:
     """Get current authenticated user - mock implementation"""
     # In a real app, this would decode JWT token and get user
     # For demo purposes, return user with ID 1
-    user = db.query(User).filter(User.id == 1).first()
+    result = await db.execute(select(User).where(User.id == 1))
+    user = result.scalars().first()
     if not user:
         # Create demo user if doesn't exist
         user = User(
@@ -73,8 +75,8 @@ def get_current_user(db: Session = Depends(get_db)) -> User:
             is_verified=True
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     
     return user
 
@@ -82,7 +84,7 @@ def get_current_user(db: Session = Depends(get_db)) -> User:
 async def configure_user_email(
     config_data: EmailConfigCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Configure email settings for the current user.
@@ -92,9 +94,10 @@ async def configure_user_email(
     """
     try:
         # Check if user already has email config
-        existing_config = db.query(UserEmailConfig).filter(
-            UserEmailConfig.user_id == current_user.id
-        ).first()
+        result = await db.execute(
+            select(UserEmailConfig).where(UserEmailConfig.user_id == current_user.id)
+        )
+        existing_config = result.scalars().first()
         
         if existing_config:
             # Update existing configuration
@@ -123,8 +126,8 @@ async def configure_user_email(
             db.add(email_config)
             logger.info(f"Created new email config for user {current_user.id}")
         
-        db.commit()
-        db.refresh(email_config)
+        await db.commit()
+        await db.refresh(email_config)
         
         return EmailConfigResponse(
             id=email_config.id,
@@ -149,7 +152,7 @@ async def configure_user_email(
 @router.post("/test", response_model=EmailTestResult)
 async def test_user_email(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Test the user's email configuration by sending a test email.
@@ -158,7 +161,10 @@ async def test_user_email(
     to verify that their Gmail SMTP configuration is working.
     """
     try:
-        email_service = get_user_email_service(current_user.id, db)
+        # UserEmailService works on a sync Session; run its loading on the async session's greenlet
+        email_service = await db.run_sync(
+            lambda session: get_user_email_service(current_user.id, session)
+        )
         
         if not email_service.is_configured():
             raise HTTPException(
@@ -167,9 +173,10 @@ async def test_user_email(
             )
         
         # Test the connection
-        success = await email_service.test_connection()
+        success = await email_service.test_connection(commit=False)
         
         if success:
+            await db.commit()
             return EmailTestResult(
                 success=True,
                 message="✅ Test email sent successfully! Check your inbox. Your email configuration is working perfectly.",
@@ -192,7 +199,7 @@ async def test_user_email(
 @router.get("/status", response_model=Optional[EmailConfigResponse])
 async def get_email_config_status(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get the current user's email configuration status.
@@ -200,10 +207,13 @@ async def get_email_config_status(
     Returns the user's email configuration details (excluding sensitive data)
     or null if no configuration exists.
     """
-    email_config = db.query(UserEmailConfig).filter(
-        UserEmailConfig.user_id == current_user.id,
-        UserEmailConfig.is_active == True
-    ).first()
+    result = await db.execute(
+        select(UserEmailConfig).where(
+            UserEmailConfig.user_id == current_user.id,
+            UserEmailConfig.is_active == True
+        )
+    )
+    email_config = result.scalars().first()
     
     if not email_config:
         return None
@@ -224,7 +234,7 @@ async def get_email_config_status(
 @router.delete("/remove", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_email_config(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Remove the user's email configuration.
@@ -232,15 +242,18 @@ async def remove_email_config(
     This deactivates the user's email configuration, preventing
     email notifications from being sent.
     """
-    email_config = db.query(UserEmailConfig).filter(
-        UserEmailConfig.user_id == current_user.id,
-        UserEmailConfig.is_active == True
-    ).first()
+    result = await db.execute(
+        select(UserEmailConfig).where(
+            UserEmailConfig.user_id == current_user.id,
+            UserEmailConfig.is_active == True
+        )
+    )
+    email_config = result.scalars().first()
     
     if email_config:
         email_config.is_active = False
         email_config.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
         logger.info(f"Removed email config for user {current_user.id}")
     
     return None
@@ -2,50 +2,33 @@
 Workflows API endpoints for OpsFlow Guardian 2.0
 """
 
-from fastapi import APIRouter, HTTPException, Body, Depends, Header
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 import logging
 from datetime import datetime
 import uuid
 
-logger = logging.getLogger(__name__)
-
-# Authentication setup
-security = HTTPBearer()
-
-class AuthenticationError(HTTPException):
-    def __init__(self, detail: str = "Authentication required to create or manage workflows"):
-        super().__init__(status_code=401, detail=detail)
-
-def verify_auth(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify authentication token for workflow operations"""
-    if not credentials or not credentials.credentials:
-        raise AuthenticationError("Valid authentication token required")
-    
-    # In production, validate the JWT token here
-    # For now, we'll accept any non-empty token
-    token = credentials.credentials
-    if len(token) < 10:  # Basic validation
-        raise AuthenticationError("Invalid authentication token")
-    
-    return token
+from app.core.auth import authorize_company, get_authenticated_user
+from app.core.config import settings
+from app.db.database import get_async_db
+from app.db.execution_repository import ExecutionRepository
+from app.db.workflow_repository import (
+    WorkflowRepository,
+    WorkflowVersionConflict,
+    parse_workflow_uuid,
+    workflow_to_dict,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+)
+from app.services.execution_queue import execution_queue
+from app.services.redis_service import redis_service
+from app.websocket.manager import workflow_visible_to
+from app.websocket.sse import workflow_event_stream
 
-def get_user_from_auth(authorization: str = Header(None)):
-    """Extract user information from authorization header"""
-    if not authorization or not authorization.startswith("Bearer "):
-        raise AuthenticationError("Bearer token required for user identification")
-    
-    token = authorization.replace("Bearer ", "")
-    # In production, decode JWT to get user info
-    # For now, return mock user info
-    return {
-        "user_id": str(uuid.uuid4()),
-        "email": "user@company.com",
-        "organization_id": str(uuid.uuid4()),
-        "role": "admin"
-    }
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -56,67 +39,87 @@ class WorkflowCreateRequest(BaseModel):
     status: str = "pending"
     estimated_duration: int = 300
 
-# In-memory storage for demo (replace with database in production)
-workflows_storage: Dict[str, Any] = {}
+
+def _get_workflow_uuid(workflow_id: str) -> uuid.UUID:
+    """Parse a workflow id path parameter, treating malformed ids as not found"""
+    workflow_uuid = parse_workflow_uuid(workflow_id)
+    if workflow_uuid is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return workflow_uuid
+
+
+def _visible_to(user_info: Dict[str, Any], row) -> bool:
+    """Callers see their own company's workflows/executions (their own if it has none); admins see all"""
+    if user_info.get("is_admin"):
+        return True
+    if row.company_id is not None:
+        return row.company_id == user_info.get("company_id")
+    return row.user_id == user_info.get("user_id")
+
+
+async def _get_visible_workflow(repository: WorkflowRepository, workflow_id: str,
+                                user_info: Dict[str, Any]):
+    """Workflow row by id, 404 if unknown or another company's"""
+    workflow = await repository.get(_get_workflow_uuid(workflow_id))
+    if not workflow or not _visible_to(user_info, workflow):
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return workflow
+
 
 @router.post("/")
 async def create_workflow_direct(
     workflow_data: WorkflowCreateRequest,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    authorization: str = Header(None)
+    user_info: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new workflow directly (Authentication Required)"""
     try:
-        # Verify authentication
-        verify_auth(credentials)
-        user_info = get_user_from_auth(authorization)
-        
         logger.info(f"🔐 Creating workflow for authenticated user: {user_info['email']}")
         
-        workflow_id = str(uuid.uuid4())[:8]  # Short UUID
+        repository = WorkflowRepository(db)
         
         # Generate workflow name if not provided
         workflow_name = workflow_data.name or f"Workflow: {workflow_data.description[:50]}"
         
-        new_workflow = {
-            "id": workflow_id,
-            "name": workflow_name,
-            "description": workflow_data.description,
-            "status": workflow_data.status,
-            "created_at": datetime.now().isoformat(),
-            "created_by": user_info['user_id'],
-            "created_by_email": user_info['email'],
-            "organization_id": user_info['organization_id'],
-            "risk_level": "medium",
-            "estimated_duration": workflow_data.estimated_duration,
-            "steps": [
-                {
-                    "id": f"step-{uuid.uuid4()}",
-                    "name": "Initialize workflow",
-                    "status": "pending",
-                    "description": "Setting up workflow environment"
-                },
-                {
-                    "id": f"step-{uuid.uuid4()}",
-                    "name": "Process automation",
-                    "status": "pending", 
-                    "description": workflow_data.description
-                },
-                {
-                    "id": f"step-{uuid.uuid4()}",
-                    "name": "Finalize results",
-                    "status": "pending",
-                    "description": "Completing workflow execution"
-                }
-            ],
-            "integrations_used": ["automation", "processing"],
-            "approval_required": False
-        }
+        steps = [
+            {
+                "id": f"step-{uuid.uuid4()}",
+                "name": "Initialize workflow",
+                "status": "pending",
+                "description": "Setting up workflow environment"
+            },
+            {
+                "id": f"step-{uuid.uuid4()}",
+                "name": "Process automation",
+                "status": "pending", 
+                "description": workflow_data.description
+            },
+            {
+                "id": f"step-{uuid.uuid4()}",
+                "name": "Finalize results",
+                "status": "pending",
+                "description": "Completing workflow execution"
+            }
+        ]
         
-        # Store the workflow
-        workflows_storage[workflow_id] = new_workflow
+        workflow = await repository.create(
+            user_id=user_info["user_id"],
+            company_id=user_info["company_id"],
+            name=workflow_name,
+            description=workflow_data.description,
+            status=workflow_data.status,
+            steps=steps,
+            metadata={
+                "created_by_email": user_info['email'],
+                "estimated_duration": workflow_data.estimated_duration,
+                "integrations_used": ["automation", "processing"]
+            },
+            risk_level="medium",
+            requires_approval=False
+        )
+        new_workflow = workflow_to_dict(workflow)
         
-        logger.info(f"Created new workflow: {workflow_name} (ID: {workflow_id})")
+        logger.info(f"Created new workflow: {workflow_name} (ID: {new_workflow['id']})")
         
         return {
             "success": True,
@@ -124,68 +127,94 @@ async def create_workflow_direct(
             "message": f"Workflow '{workflow_name}' created successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to create workflow: {e}")
         raise HTTPException(status_code=500, detail="Failed to create workflow")
 
 
 @router.patch("/{workflow_id}")
-async def update_workflow_status(workflow_id: str, update_data: Dict[str, Any] = Body(...)):
-    """Update workflow status"""
+async def update_workflow_status(
+    workflow_id: str,
+    update_data: Dict[str, Any] = Body(...),
+    user_info: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Update workflow status.
+    Pass "version" from a previous read to guard against concurrent updates;
+    a stale version returns 409 Conflict.
+    """
     try:
-        if workflow_id not in workflows_storage:
-            raise HTTPException(status_code=404, detail="Workflow not found")
+        workflow_uuid = _get_workflow_uuid(workflow_id)
+        repository = WorkflowRepository(db)
+        workflow = await _get_visible_workflow(repository, workflow_id, user_info)
         
-        workflow = workflows_storage[workflow_id]
+        expected_version = update_data.get("version", workflow.lock_version)
+        if isinstance(expected_version, bool) or not isinstance(expected_version, int):
+            raise HTTPException(status_code=422, detail="version must be an integer")
+        values: Dict[str, Any] = {}
         
         # Update status if provided
         if "status" in update_data:
             new_status = update_data["status"]
-            old_status = workflow["status"]
+            old_status = workflow.status
+            steps = [dict(step) for step in (workflow.workflow_steps or [])]
+            metadata = dict(workflow.workflow_metadata or {})
+            now = datetime.now().isoformat()
             
             # Handle workflow control actions
             if new_status == "running" and old_status == "pending":
-                # Starting workflow
-                workflow["status"] = "running"
-                workflow["started_at"] = datetime.now().isoformat()
-                # Update first step to running
-                if workflow.get("steps") and len(workflow["steps"]) > 0:
-                    workflow["steps"][0]["status"] = "running"
-                logger.info(f"Started workflow {workflow_id}")
+                # Starting or resuming workflow
+                values["status"] = "running"
+                if "started_at" not in metadata:
+                    metadata["started_at"] = now
+                    # Update first step to running
+                    if steps:
+                        steps[0]["status"] = "running"
+                    logger.info(f"Started workflow {workflow_id}")
+                else:
+                    metadata["resumed_at"] = now
+                    # Resume first pending step
+                    for step in steps:
+                        if step.get("status") == "pending":
+                            step["status"] = "running"
+                            break
+                    logger.info(f"Resumed workflow {workflow_id}")
                 
             elif new_status == "paused" and old_status == "running":
                 # Pausing workflow
-                workflow["status"] = "pending"  # Using pending as paused state
-                workflow["paused_at"] = datetime.now().isoformat()
+                values["status"] = "pending"  # Using pending as paused state
+                metadata["paused_at"] = now
                 # Update running steps to pending
-                for step in workflow.get("steps", []):
-                    if step["status"] == "running":
+                for step in steps:
+                    if step.get("status") == "running":
                         step["status"] = "pending"
                 logger.info(f"Paused workflow {workflow_id}")
                 
-            elif new_status == "running" and old_status == "pending":
-                # Resuming workflow
-                workflow["status"] = "running"
-                workflow["resumed_at"] = datetime.now().isoformat()
-                # Resume first pending step
-                for step in workflow.get("steps", []):
-                    if step["status"] == "pending":
-                        step["status"] = "running"
-                        break
-                logger.info(f"Resumed workflow {workflow_id}")
-                
             else:
                 # Standard status update
-                workflow["status"] = new_status
+                values["status"] = new_status
             
-            workflow["updated_at"] = datetime.now().isoformat()
+            values["workflow_steps"] = steps
+            values["workflow_metadata"] = metadata
+        
+        if values:
+            workflow = await repository.update_with_version(workflow_uuid, expected_version, values)
         
         return {
             "success": True,
-            "data": workflow,
+            "data": workflow_to_dict(workflow),
             "message": f"Workflow status updated successfully"
         }
         
+    except WorkflowVersionConflict as e:
+        logger.warning(f"⚠️ {e}")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Workflow was modified concurrently (current version: {e.current_version})"
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -194,19 +223,24 @@ async def update_workflow_status(workflow_id: str, update_data: Dict[str, Any] =
 
 
 @router.delete("/{workflow_id}")
-async def delete_workflow(workflow_id: str):
+async def delete_workflow(
+    workflow_id: str,
+    user_info: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Delete a workflow"""
     try:
-        if workflow_id not in workflows_storage:
+        repository = WorkflowRepository(db)
+        workflow = await _get_visible_workflow(repository, workflow_id, user_info)
+        deleted_name = await repository.delete(workflow.workflow_uuid)
+        if deleted_name is None:
             raise HTTPException(status_code=404, detail="Workflow not found")
         
-        deleted_workflow = workflows_storage.pop(workflow_id)
-        
-        logger.info(f"Deleted workflow: {deleted_workflow['name']} (ID: {workflow_id})")
+        logger.info(f"Deleted workflow: {deleted_name} (ID: {workflow_id})")
         
         return {
             "success": True,
-            "message": f"Workflow '{deleted_workflow['name']}' deleted successfully"
+            "message": f"Workflow '{deleted_name}' deleted successfully"
         }
         
     except HTTPException:
@@ -215,7 +249,6 @@ async def delete_workflow(workflow_id: str):
         logger.error(f"Failed to delete workflow {workflow_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to delete workflow")
 
-
 @router.post("/create")
 async def create_workflow(request: Dict[str, Any] = Body(...)):
     """Create a new workflow from natural language description"""
@@ -293,18 +326,38 @@ async def create_workflow(request: Dict[str, Any] = Body(...)):
 
 
 @router.get("/")
-async def get_workflows():
-    """Get all workflows"""
+async def get_workflows(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    company_id: Optional[int] = Query(None, description="Filter by company (admins only for other companies)"),
+    user_info: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get workflows, newest first. Pass next_cursor back as cursor for the next page."""
+    user_id = None
+    if user_info.get("company_id") is None and not user_info.get("is_admin"):
+        # Users without a company only see the workflows they created
+        if company_id is not None:
+            raise HTTPException(status_code=403, detail="Not allowed to access another company's data")
+        user_id = user_info["user_id"]
+    else:
+        company_id = authorize_company(user_info, company_id)
     try:
-        # Convert storage to list format
-        workflows_data = list(workflows_storage.values())
+        workflows, next_cursor = await WorkflowRepository(db).list_page(
+            limit=limit, cursor=cursor, status=status, company_id=company_id, user_id=user_id
+        )
+        workflows_data = [workflow_to_dict(workflow) for workflow in workflows]
         
         return {
             "success": True,
             "data": workflows_data,
-            "total": len(workflows_data)
+            "total": len(workflows_data),
+            "next_cursor": next_cursor
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get workflows: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve workflows")
@@ -375,9 +428,19 @@ async def get_workflow_templates():
 
 
 @router.get("/{workflow_id}")
-async def get_workflow(workflow_id: str):
+async def get_workflow(
+    workflow_id: str,
+    user_info: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Get specific workflow details"""
     try:
+        workflow_uuid = parse_workflow_uuid(workflow_id)
+        if workflow_uuid is not None:
+            workflow = await WorkflowRepository(db).get(workflow_uuid)
+            if workflow and _visible_to(user_info, workflow):
+                return {"success": True, "data": workflow_to_dict(workflow)}
+        
         # Mock workflow detail
         if workflow_id == "workflow-001":
             workflow_data = {
@@ -455,30 +518,177 @@ async def get_workflow(workflow_id: str):
         raise HTTPException(status_code=500, detail="Failed to retrieve workflow")
 
 
-@router.post("/{workflow_id}/execute")
-async def execute_workflow(workflow_id: str):
-    """Execute an approved workflow"""
+async def _claim_idempotency_key(key: str, execution_id: str) -> Optional[str]:
+    """Claim key for execution_id; returns the execution that already holds it, if any"""
+    for _ in range(2):
+        if await redis_service.redis_client.set(key, execution_id, nx=True, ex=settings.EXECUTION_STATUS_TTL):
+            return None
+        existing_id = await redis_service.redis_client.get(key)
+        if existing_id is not None:
+            return existing_id
+        # Expired between SET and GET: claim it again
+    return None
+
+
+async def _release_idempotency_key(key: str, execution_id: str):
+    """Delete the key if this request still holds it"""
     try:
-        # Mock execution start
-        execution_data = {
-            "workflow_id": workflow_id,
-            "execution_id": str(uuid.uuid4()),
-            "status": "started",
-            "started_at": datetime.utcnow().isoformat(),
-            "message": "Workflow execution started successfully"
+        if await redis_service.redis_client.get(key) == execution_id:
+            await redis_service.redis_client.delete(key)
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to release idempotency key {key}: {e}")
+
+
+async def _get_visible_execution(repository: ExecutionRepository, execution_id: str,
+                                 user_info: Dict[str, Any]):
+    """Execution row by id, 404 if unknown or another company's"""
+    try:
+        execution_uuid = uuid.UUID(execution_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    execution = await repository.get(execution_uuid)
+    if not execution or not _visible_to(user_info, execution):
+        raise HTTPException(status_code=404, detail="Execution not found")
+    return execution
+
+
+@router.post("/{workflow_id}/execute", status_code=202)
+async def execute_workflow(
+    workflow_id: str,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    user_info: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue a workflow for execution and return its execution id immediately"""
+    try:
+        workflow = await _get_visible_workflow(WorkflowRepository(db), workflow_id, user_info)
+        
+        execution_id = str(uuid.uuid4())
+        idempotency_redis_key = None
+        if idempotency_key and redis_service.connected:
+            # A retried request returns the execution the first one queued
+            idempotency_redis_key = f"idempotency:execute:{user_info['user_id']}:{idempotency_key}"
+            existing_id = await _claim_idempotency_key(idempotency_redis_key, execution_id)
+            if existing_id is not None:
+                return {
+                    "success": True,
+                    "message": "Workflow execution already queued",
+                    "data": {
+                        "workflow_id": workflow_id,
+                        "execution_id": existing_id,
+                        "status": "duplicate"
+                    }
+                }
+        
+        job = {
+            "execution_id": execution_id,
+            "workflow_id": str(workflow.workflow_uuid),
+            "name": workflow.name,
+            "description": workflow.description,
+            "steps": workflow.workflow_steps or [],
+            "max_retries": workflow.max_retries if workflow.max_retries is not None else 3,
+            "timeout_seconds": (workflow.timeout_minutes or 60) * 60,
+            "requested_by": user_info["user_id"]
         }
+        repository = ExecutionRepository(db)
+        try:
+            # Durable record first, so the execution can be resumed even if Redis loses the job
+            await repository.create(
+                uuid.UUID(execution_id), workflow.id, user_info["user_id"], user_info.get("company_id"),
+                job, len(job["steps"])
+            )
+            try:
+                await execution_queue.enqueue(job)
+            except Exception as e:
+                # Don't leave a QUEUED row for the recovery sweeper to run behind the caller's back
+                await repository.set_status(uuid.UUID(execution_id), "FAILED", error_details=f"Enqueue failed: {e}")
+                raise
+        except Exception:
+            # Let the client's retry start over instead of pointing at an execution that never ran
+            if idempotency_redis_key:
+                await _release_idempotency_key(idempotency_redis_key, execution_id)
+            raise
         
         return {
             "success": True,
-            "message": "Workflow execution started",
-            "data": execution_data
+            "message": "Workflow execution queued",
+            "data": {
+                "workflow_id": workflow_id,
+                "execution_id": execution_id,
+                "status": "queued",
+                "queued_at": datetime.utcnow().isoformat()
+            }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to execute workflow {workflow_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to execute workflow")
 
 
+@router.get("/executions/{execution_id}")
+async def get_execution_status(
+    execution_id: str,
+    user_info: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the queue status of a workflow execution"""
+    execution = await _get_visible_execution(ExecutionRepository(db), execution_id, user_info)
+    status = await execution_queue.get_status(execution_id)
+    if not status:
+        # Queue status expired or Redis is down: report the durable record
+        status = {
+            "execution_id": execution_id,
+            "status": (execution.status or "pending").lower(),
+            "current_step": execution.current_step,
+            "total_steps": execution.total_steps
+        }
+    return {"success": True, "data": status}
+
+
+@router.post("/executions/{execution_id}/resume", status_code=202)
+async def resume_execution(
+    execution_id: str,
+    user_info: Dict[str, Any] = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Re-queue an interrupted or failed execution; checkpointed steps are skipped"""
+    try:
+        repository = ExecutionRepository(db)
+        execution = await _get_visible_execution(repository, execution_id, user_info)
+        if not execution.input_data:
+            raise HTTPException(status_code=404, detail="Execution not found")
+        execution_uuid = execution.execution_uuid
+        if execution.status == "COMPLETED":
+            raise HTTPException(status_code=409, detail="Execution already completed")
+        
+        queue_status = await execution_queue.get_status(execution_id)
+        if queue_status and queue_status.get("status") in ("queued", "running", "retrying"):
+            raise HTTPException(status_code=409, detail="Execution is already in progress")
+        
+        job = {**execution.input_data, "execution_id": execution_id, "attempt": 0}
+        completed_steps = len(execution.step_details or [])
+        await repository.set_status(execution_uuid, "QUEUED", error_details=None)
+        await execution_queue.enqueue(job)
+        
+        return {
+            "success": True,
+            "message": "Workflow execution resumed",
+            "data": {
+                "execution_id": execution_id,
+                "status": "queued",
+                "completed_steps": completed_steps
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to resume execution {execution_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to resume execution")
+
+
 @router.get("/{workflow_id}/status")
 async def get_workflow_status(workflow_id: str):
     """Get real-time workflow status"""
@@ -498,3 +708,30 @@ async def get_workflow_status(workflow_id: str):
     except Exception as e:
         logger.error(f"Failed to get workflow status {workflow_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to get workflow status")
+
+
+@router.get("/{workflow_id}/events")
+async def stream_workflow_events(
+    workflow_id: str,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    since: Optional[int] = Query(None, description="Resume after this event id (for clients that cannot set Last-Event-ID)"),
+    user_info: Dict[str, Any] = Depends(get_authenticated_user)
+):
+    """Server-Sent Events stream of workflow execution progress"""
+    if not await workflow_visible_to(user_info, workflow_id):
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    last_seq = since
+    if last_event_id:
+        try:
+            last_seq = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be an integer")
+    
+    return StreamingResponse(
+        workflow_event_stream(workflow_id, user_info, last_seq),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx)
+        }
+    )
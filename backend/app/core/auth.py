@@ -0,0 +1,191 @@
+"""
+Shared authentication dependencies for OpsFlow Guardian 2.0
+Verifies bearer JWTs once, caches the verified claims and the user row,
+and honours a Redis revocation denylist
+"""
+
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal, get_async_db
+from app.models.database_models import User, UserCompany
+from app.services.google_oauth_service import google_oauth
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+# Authentication setup
+security = HTTPBearer(auto_error=False)
+
+DENYLIST_PREFIX = "auth:denylist:"
+
+# token hash -> {"claims": ..., "exp": ..., "denylist_checked_at": ...}
+_token_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.AUTH_TOKEN_CACHE_TTL)
+# email -> user context resolved from the database
+_user_cache = TTLCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL)
+
+
+class AuthenticationError(HTTPException):
+    def __init__(self, detail: str = "Authentication required"):
+        super().__init__(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+def hash_token(token: str) -> str:
+    """Cache and denylist key for a token (raw tokens are never stored)"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def _is_revoked(token_hash: str) -> bool:
+    """Check the Redis denylist; fail open if Redis is unavailable"""
+    if redis_service.redis_client is None:
+        return False
+    try:
+        return bool(await redis_service.redis_client.exists(f"{DENYLIST_PREFIX}{token_hash}"))
+    except Exception as e:
+        logger.warning(f"⚠️ Token denylist check failed: {e}")
+        return False
+
+
+async def verify_token(token: str) -> Dict[str, Any]:
+    """
+    Verify a JWT and return its claims.
+    Verified claims are cached until the earlier of the cache TTL and the token's
+    exp; the denylist is re-checked every AUTH_DENYLIST_CHECK_INTERVAL seconds.
+    """
+    token_hash = hash_token(token)
+    now = time.time()
+
+    entry = _token_cache.get(token_hash)
+    if entry is None:
+        claims = google_oauth.verify_jwt_token(token)
+        exp = claims.get("exp")
+        ttl = settings.AUTH_TOKEN_CACHE_TTL
+        if exp is not None:
+            ttl = min(ttl, float(exp) - now)
+        entry = {"claims": claims, "exp": exp, "denylist_checked_at": 0.0}
+        if ttl > 0:
+            _token_cache.set(token_hash, entry, ttl=ttl)
+    elif entry["exp"] is not None and entry["exp"] <= now:
+        _token_cache.pop(token_hash)
+        raise AuthenticationError("Token has expired")
+
+    if now - entry["denylist_checked_at"] >= settings.AUTH_DENYLIST_CHECK_INTERVAL:
+        if await _is_revoked(token_hash):
+            _token_cache.pop(token_hash)
+            raise AuthenticationError("Token has been revoked")
+        entry["denylist_checked_at"] = now
+
+    return entry["claims"]
+
+
+async def revoke_token(token: str):
+    """Add a token to the denylist until it would have expired anyway"""
+    token_hash = hash_token(token)
+    _token_cache.pop(token_hash)
+    try:
+        claims = google_oauth.verify_jwt_token(token)
+    except HTTPException:
+        return  # Already invalid, nothing to revoke
+
+    remaining = int(claims.get("exp", time.time() + settings.AUTH_TOKEN_CACHE_TTL) - time.time())
+    if remaining > 0 and redis_service.redis_client is not None:
+        await redis_service.set(f"{DENYLIST_PREFIX}{token_hash}", "1", expire=remaining)
+
+
+async def _load_user(db: AsyncSession, email: str) -> Optional[Dict[str, Any]]:
+    """Look up the active user and their primary company by email"""
+    result = await db.execute(
+        select(User.id, User.email, User.is_admin, User.is_active, UserCompany.company_id, UserCompany.role)
+        .outerjoin(
+            UserCompany,
+            and_(UserCompany.user_id == User.id, UserCompany.is_active.is_(True))
+        )
+        .where(User.email == email)
+        .order_by(UserCompany.is_primary.desc().nulls_last())
+        .limit(1)
+    )
+    row = result.first()
+    if not row or row.is_active is False:
+        return None
+    return {
+        "user_id": row.id,
+        "email": row.email,
+        "role": row.role or ("admin" if row.is_admin else "member"),
+        "company_id": row.company_id,
+        "organization_id": row.company_id,
+        "is_admin": bool(row.is_admin)
+    }
+
+
+async def get_authenticated_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> Dict[str, Any]:
+    """FastAPI dependency: verified caller with their database user id and company"""
+    if not credentials or not credentials.credentials:
+        raise AuthenticationError("Valid authentication token required")
+    return await get_token_user(credentials.credentials, db)
+
+
+async def get_token_user(token: str, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+    """Verified user context for an access token (also used where no Depends is available, e.g. WebSockets)"""
+    claims = await verify_token(token)
+    if claims.get("type") == "refresh":
+        raise AuthenticationError("Refresh tokens cannot be used for API access")
+    email = claims.get("email") or claims.get("sub")
+    if not email:
+        raise AuthenticationError("Token does not identify a user")
+
+    user = await get_cached_user(email, db)
+    if user is None:
+        raise AuthenticationError("Authenticated user not found")
+    return user
+
+
+async def get_cached_user(email: str, db: Optional[AsyncSession] = None) -> Optional[Dict[str, Any]]:
+    """User context by email from the cache, loading it (in its own session if none given) on a miss"""
+    user = _user_cache.get(email)
+    if user is None:
+        if db is None:
+            async with AsyncSessionLocal() as session:
+                user = await _load_user(session, email)
+        else:
+            user = await _load_user(db, email)
+        if user is not None:
+            _user_cache.set(email, user)
+    return user
+
+
+def authorize_company(user: Dict[str, Any], company_id: Optional[int] = None) -> Optional[int]:
+    """
+    Company a caller may read: their own by default; another company only
+    for platform admins (403 otherwise)
+    """
+    if user.get("is_admin"):
+        return company_id if company_id is not None else user.get("company_id")
+    if user.get("company_id") is None:
+        raise HTTPException(status_code=403, detail="User is not a member of any company")
+    if company_id is None or company_id == user.get("company_id"):
+        return user.get("company_id")
+    raise HTTPException(status_code=403, detail="Not allowed to access another company's data")
+
+
+def invalidate_user_cache(email: str):
+    """Drop a cached user row (call after changing a user's role or company)"""
+    _user_cache.pop(email)
+
+
+def get_auth_cache_stats() -> Dict[str, Any]:
+    return {
+        "tokens": _token_cache.get_stats(),
+        "users": _user_cache.get_stats()
+    }
@@ -3,7 +3,7 @@ Configuration management for OpsFlow Guardian 2.0
 """
 
 from pydantic_settings import BaseSettings
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 import os
 
 
@@ -22,6 +22,13 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # Verified-token and user caches for the shared auth dependency
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL: float = 300.0
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL: float = 60.0
+    AUTH_DENYLIST_CHECK_INTERVAL: float = 5.0
+    
     # CORS Configuration
     ALLOWED_ORIGINS: List[str] = [
         "http://localhost:5173",
@@ -33,9 +40,59 @@ class Settings(BaseSettings):
     # Database Configuration
     DATABASE_URL: str = "sqlite:///./opsflow_guardian.db"
     
+    # Raw asyncpg pool used by execute_raw_query
+    # (set the statement cache size to 0 behind PgBouncer in transaction mode)
+    DB_RAW_POOL_MIN_SIZE: int = 2
+    DB_RAW_POOL_MAX_SIZE: int = 10
+    DB_RAW_POOL_STATEMENT_CACHE_SIZE: int = 100
+    DB_RAW_QUERY_TIMEOUT: float = 30.0
+    
+    # Buffered audit writer (events are bulk-inserted on size or time thresholds)
+    AUDIT_BUFFER_MAX_SIZE: int = 10000
+    AUDIT_BUFFER_BATCH_SIZE: int = 500
+    AUDIT_BUFFER_FLUSH_INTERVAL: float = 1.0
+    AUDIT_BUFFER_ENQUEUE_TIMEOUT: float = 0.05
+    AUDIT_BUFFER_RETRY_DELAY: float = 1.0  # Backoff before a failed batch's single retry
+    
+    # Shared outbound HTTP clients (one pooled client per upstream host)
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 50
+    HTTP_MAX_KEEPALIVE_PER_HOST: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_TIMEOUT: float = 15.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    
     # Redis Configuration
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # WebSocket Configuration (per-connection outbound queues)
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: Literal["drop_oldest", "coalesce", "disconnect"] = "coalesce"
+    WS_SEND_TIMEOUT: float = 10.0
+    WS_MAX_TOPICS_PER_CONNECTION: int = 100
+    
+    # Workflow progress events (replay buffer for reconnecting clients)
+    WORKFLOW_EVENT_REPLAY_SIZE: int = 500
+    WORKFLOW_EVENT_MAX_WORKFLOWS: int = 1000
+    WORKFLOW_EVENT_RETENTION_SECONDS: int = 3600
+    
+    # Durable workflow execution queue (Redis Streams consumer group)
+    EXECUTION_QUEUE_STREAM: str = "opsflow:executions"
+    EXECUTION_QUEUE_MAXLEN: int = 100000
+    EXECUTION_WORKER_CONCURRENCY: int = 4
+    EXECUTION_VISIBILITY_TIMEOUT: int = 300  # seconds before an unacked job is reclaimed
+    EXECUTION_RETRY_BACKOFF_MAX: float = 30.0
+    EXECUTION_STATUS_TTL: int = 86400
+    EXECUTION_SHUTDOWN_GRACE: float = 10.0  # seconds shutdown waits for detached jobs before cancelling them
+    
+    # In-process state stores (finished entries are evicted after offload)
+    STATE_STORE_MAX_LIVE: int = 10000
+    STATE_STORE_MAX_TERMINAL: int = 1000
+    STATE_STORE_TERMINAL_TTL: int = 3600
+    
+    # Server-Sent Events
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+    SSE_RETRY_MS: int = 5000
+    
     # API Keys for LLM Providers
     OPENAI_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
@@ -55,6 +112,32 @@ class Settings(BaseSettings):
     MAX_TOKENS: int = 2000
     TEMPERATURE: float = 0.1
     
+    GEMINI_MAX_CONCURRENCY: int = 16  # In-flight Gemini requests per process
+    
+    # LLM call resilience (per provider/model: AIMD concurrency, rate limits, retries, circuit breaker)
+    LLM_INITIAL_CONCURRENCY: int = 4  # Grows toward the provider max while calls succeed
+    LLM_MIN_CONCURRENCY: int = 1
+    LLM_REQUESTS_PER_MINUTE: int = 300
+    LLM_TOKENS_PER_MINUTE: int = 1000000
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5  # Seconds; full jitter over base * 2^attempt
+    LLM_RETRY_MAX_DELAY: float = 20.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive failed calls before the circuit opens
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    
+    # Prompt budgets (estimated tokens) for audit summaries and agent chat context
+    AUDIT_SUMMARY_TOKEN_BUDGET: int = 24000  # Larger event sets are summarized in chunks, then merged
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 4000
+    PROMPT_MAX_FIELD_CHARS: int = 500
+    PROMPT_MAX_LIST_ITEMS: int = 50
+    
+    # Workflow plan cache (exact + embedding-similarity reuse of Gemini plans)
+    PLAN_CACHE_ENABLED: bool = True
+    PLAN_CACHE_TTL: int = 86400
+    PLAN_CACHE_SIMILARITY_THRESHOLD: float = 0.93
+    PLAN_CACHE_MAX_INDEX_ENTRIES: int = 500  # Embeddings scanned per user lookup
+    PLAN_CACHE_EMBEDDING_MODEL: str = "models/text-embedding-004"
+    
     # Integration API Keys
     SLACK_BOT_TOKEN: Optional[str] = None
     SLACK_SIGNING_SECRET: Optional[str] = None
@@ -84,9 +167,28 @@ class Settings(BaseSettings):
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     UPLOAD_FOLDER: str = "./uploads"
     
-    # Rate Limiting Configuration
-    RATE_LIMIT_REQUESTS: int = 100
-    RATE_LIMIT_WINDOW: int = 3600
+    # Rate Limiting Configuration (default quota per caller)
+    RATE_LIMIT_REQUESTS: int = 60
+    RATE_LIMIT_WINDOW: int = 60
+    # Never rate limited (exact paths, or prefixes of sub-paths)
+    RATE_LIMIT_EXEMPT_PATHS: List[str] = ["/", "/health", "/docs", "/redoc", "/openapi.json"]
+    # "<requests>/<seconds>" quotas; route keys are path prefixes, tenant keys
+    # are company ids whose users then share one bucket with that quota
+    RATE_LIMIT_ROUTE_QUOTAS: Dict[str, str] = {
+        "/api/v1/auth/login": "10/60",
+        "/api/v1/auth/register": "5/60",
+        "/api/v1/agents/gemini/chat": "30/60"
+    }
+    RATE_LIMIT_TENANT_QUOTAS: Dict[str, str] = {}
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 10000
+    RATE_LIMIT_REDIS_RETRY_SECONDS: float = 5.0
+    
+    # Workflow Configuration
+    MAX_WORKFLOW_STEPS: int = 50
+    MAX_EXECUTION_TIME_MINUTES: int = 60
+    MAX_CONCURRENT_WORKFLOWS: int = 10
+    WORKFLOW_MAX_PARALLEL_STEPS: int = 4  # Concurrent steps within one execution
+    WORKFLOW_GLOBAL_STEP_CONCURRENCY: int = 32  # Concurrent steps across all executions in a process
     
     # Monitoring Configuration
     ENABLE_MONITORING: bool = True
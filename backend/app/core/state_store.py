@@ -0,0 +1,176 @@
+"""
+Bounded in-process state for OpsFlow Guardian 2.0
+Replaces ever-growing module and service dicts of execution state: in-flight
+entries are kept, finished ones are evicted by TTL + LRU after being offloaded
+to durable storage
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Set, Tuple
+
+from app.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TerminalCheck = Callable[[Any], bool]
+Offloader = Callable[[Hashable, Any], Awaitable[None]]
+Loader = Callable[[Hashable], Awaitable[Any]]
+
+# Every store, by name, for the /health memory gauges
+_stores: Dict[str, "StateStore"] = {}
+
+
+class StateStore:
+    """
+    Dict-like store split into two bounded tiers.
+    - live: entries for work still in progress; LRU-bounded by max_live only
+      so a leak cannot grow without limit
+    - terminal: entries is_terminal() accepts; TTL + LRU evicted
+    Assigning a terminal value hands it to the optional offload hook, and
+    fetch() falls back to the optional loader once it has been evicted.
+    Values mutated in place must be assigned again to move between tiers.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        is_terminal: TerminalCheck,
+        max_live: int = 10000,
+        max_terminal: int = 1000,
+        terminal_ttl: Optional[float] = 3600,
+        offload: Optional[Offloader] = None,
+        loader: Optional[Loader] = None,
+    ):
+        self.name = name
+        self.is_terminal = is_terminal
+        self.live = TTLCache(maxsize=max_live)
+        self.terminal = TTLCache(maxsize=max_terminal, ttl=terminal_ttl)
+        self.offload = offload
+        self.loader = loader
+        self._pending_offloads: Set[asyncio.Task] = set()
+        self._stats = {"offloaded": 0, "offload_errors": 0, "loaded": 0}
+        _stores[name] = self
+
+    def set(self, key: Hashable, value: Any):
+        if self.is_terminal(value):
+            self.live.pop(key)
+            self.terminal.set(key, value)
+            self._schedule_offload(key, value)
+        else:
+            self.terminal.pop(key)
+            self.live.set(key, value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.live.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.terminal.get(key, _MISSING)
+        return default if value is _MISSING else value
+
+    async def fetch(self, key: Hashable) -> Any:
+        """get(), falling back to the loader for evicted entries"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.loader is None:
+            return None
+        value = await self.loader(key)
+        if value is not None:
+            self._stats["loaded"] += 1
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        value = self.live.pop(key, _MISSING)
+        if value is _MISSING:
+            value = self.terminal.pop(key, _MISSING)
+        return default if value is _MISSING else value
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        yield from self.live.items()
+        yield from self.terminal.items()
+
+    def values(self) -> Iterator[Any]:
+        for _, value in self.items():
+            yield value
+
+    def keys(self) -> Iterator[Hashable]:
+        for key, _ in self.items():
+            yield key
+
+    def _schedule_offload(self, key: Hashable, value: Any):
+        if self.offload is None:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._run_offload(key, value))
+        except RuntimeError:
+            logger.warning(f"⚠️ No event loop to offload {self.name} entry {key}")
+            return
+        # Hold a reference so the task is not garbage collected mid-flight
+        self._pending_offloads.add(task)
+        task.add_done_callback(self._pending_offloads.discard)
+
+    async def _run_offload(self, key: Hashable, value: Any):
+        try:
+            await self.offload(key, value)
+            self._stats["offloaded"] += 1
+        except Exception as e:
+            self._stats["offload_errors"] += 1
+            logger.error(f"Failed to offload {self.name} entry {key}: {e}")
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.set(key, value)
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __delitem__(self, key: Hashable):
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.live or key in self.terminal
+
+    def __len__(self) -> int:
+        return len(self.live) + len(self.terminal)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return self.keys()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "live": self.live.get_stats(),
+            "terminal": self.terminal.get_stats(),
+            "pending_offloads": len(self._pending_offloads),
+            **self._stats,
+        }
+
+
+def process_memory() -> Dict[str, Any]:
+    """Current resident set size of this process, where the platform exposes it"""
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return {"rss_bytes": resident_pages * os.sysconf("SC_PAGE_SIZE")}
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS; KiB on Linux, bytes on macOS
+        return {"max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    except ImportError:
+        return {}
+
+
+def get_memory_stats() -> Dict[str, Any]:
+    """Process RSS plus the size of every registered state store"""
+    return {
+        **process_memory(),
+        "state_stores": {name: store.get_stats() for name, store in _stores.items()},
+    }
+
+
+_MISSING = object()
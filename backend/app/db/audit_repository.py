@@ -0,0 +1,156 @@
+"""
+Audit trail repository for OpsFlow Guardian 2.0
+Read queries over audit_trail with keyset pagination
+"""
+
+import html
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.pagination import encode_cursor, keyset_before
+from app.models.database_models import AuditTrail
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Must match the configuration used by AUDIT_SEARCH_VECTOR_SQL so the GIN index applies
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+# ts_headline marks matches with private-use sentinels rather than <mark>: the
+# description is user-controlled text, so it is HTML-escaped first and only
+# then are the sentinels turned into <mark> tags (see safe_highlight)
+HIGHLIGHT_START, HIGHLIGHT_STOP = "\ue000", "\ue001"
+HEADLINE_OPTIONS = (
+    f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", MaxFragments=2, MaxWords=30, MinWords=10'
+)
+
+
+def safe_highlight(headline: Optional[str]) -> Optional[str]:
+    """HTML-escaped ts_headline fragment whose only markup is <mark> around matches"""
+    if headline is None:
+        return None
+    escaped = html.escape(headline)
+    return escaped.replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+
+def audit_to_dict(entry: AuditTrail) -> Dict[str, Any]:
+    """Serialize an AuditTrail row into the API response shape"""
+    return {
+        "id": str(entry.audit_uuid),
+        "timestamp": entry.created_at.isoformat() if entry.created_at else None,
+        "company_id": entry.company_id,
+        "event_type": entry.event_type,
+        "resource_type": entry.resource_type,
+        "resource_id": entry.resource_id,
+        "user_id": entry.user_id,
+        "agent_id": entry.agent_id,
+        "description": entry.event_description,
+        "old_values": entry.old_values,
+        "new_values": entry.new_values,
+        "metadata": entry.audit_metadata,
+        "ip_address": str(entry.ip_address) if entry.ip_address else None,
+        "success": entry.success,
+        "error_message": entry.error_message,
+    }
+
+
+class AuditRepository:
+    """Async read repository over the audit_trail table"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_page(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        company_id: Optional[int] = None,
+        event_types: Optional[List[str]] = None,
+        user_id: Optional[int] = None,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Tuple[List[AuditTrail], Optional[str]]:
+        """
+        List audit entries newest first using keyset pagination on (created_at, id).
+        With company_id (and optionally one event type) set, the query is served by the
+        (company_id, [event_type,] created_at, id) indexes, so deep pages cost the same
+        as the first page.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = select(AuditTrail)
+
+        if company_id is not None:
+            query = query.where(AuditTrail.company_id == company_id)
+        if event_types:
+            if len(event_types) == 1:
+                query = query.where(AuditTrail.event_type == event_types[0])
+            else:
+                query = query.where(AuditTrail.event_type.in_(event_types))
+        if user_id is not None:
+            query = query.where(AuditTrail.user_id == user_id)
+        if resource_type:
+            query = query.where(AuditTrail.resource_type == resource_type)
+        if resource_id:
+            query = query.where(AuditTrail.resource_id == resource_id)
+        if start_date:
+            query = query.where(AuditTrail.created_at >= start_date)
+        if end_date:
+            query = query.where(AuditTrail.created_at <= end_date)
+        if cursor:
+            query = query.where(keyset_before(AuditTrail.created_at, AuditTrail.id, cursor))
+
+        # Fetch one extra row to know whether another page exists
+        query = query.order_by(AuditTrail.created_at.desc(), AuditTrail.id.desc()).limit(limit + 1)
+        rows = list((await self.db.execute(query)).scalars().all())
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return rows, next_cursor
+
+    async def search(
+        self,
+        text: str,
+        limit: int = 20,
+        company_id: Optional[int] = None,
+        event_types: Optional[List[str]] = None,
+    ) -> List[Tuple[AuditTrail, float, str]]:
+        """
+        Full-text search over audit_trail.search_vector, best matches first.
+        Filters are applied in the same query as the GIN match; ts_headline only
+        runs on the final page of rows because it re-parses each document.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+        rank = func.ts_rank_cd(AuditTrail.search_vector, ts_query)
+
+        matches = select(AuditTrail.id, rank.label("rank")).where(
+            AuditTrail.search_vector.op("@@")(ts_query)
+        )
+        if company_id is not None:
+            matches = matches.where(AuditTrail.company_id == company_id)
+        if event_types:
+            matches = matches.where(AuditTrail.event_type.in_(event_types))
+        matches = (
+            matches.order_by(rank.desc(), AuditTrail.created_at.desc(), AuditTrail.id.desc())
+            .limit(limit)
+            .subquery()
+        )
+
+        headline = func.ts_headline(SEARCH_CONFIG, AuditTrail.event_description, ts_query, HEADLINE_OPTIONS)
+        query = (
+            select(AuditTrail, matches.c.rank, headline.label("highlighted_text"))
+            .join(matches, matches.c.id == AuditTrail.id)
+            .order_by(matches.c.rank.desc(), AuditTrail.created_at.desc(), AuditTrail.id.desc())
+        )
+        result = await self.db.execute(query)
+        return [(row.AuditTrail, float(row.rank), safe_highlight(row.highlighted_text)) for row in result]
@@ -5,10 +5,12 @@ Handles connection pooling, session management, and health checks
 
 import os
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
-from typing import Generator
+from typing import Any, AsyncGenerator, Dict, Generator, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,6 +51,73 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# libpq query options asyncpg has no keyword for; dropped from the async URL
+_LIBPQ_ONLY_PARAMS = {
+    "sslcert", "sslkey", "sslrootcert", "sslcrl", "sslpassword", "sslcompression",
+    "options", "target_session_attrs", "gssencmode", "channel_binding",
+    "keepalives", "keepalives_idle", "keepalives_interval", "keepalives_count",
+    "client_encoding", "fallback_application_name",
+}
+
+
+def _build_async_database_url(url: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Rewrite a psycopg2-style DATABASE_URL to use the asyncpg driver.
+    asyncpg rejects libpq query options (e.g. ?sslmode=require), so they are
+    stripped from the URL; sslmode, connect_timeout and application_name come
+    back as the equivalent asyncpg connect_args.
+    """
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            url = "postgresql+asyncpg://" + url[len(prefix):]
+            break
+    
+    parts = urlsplit(url)
+    query, connect_args = [], {}
+    for key, value in parse_qsl(parts.query, keep_blank_values=True):
+        if key == "sslmode":
+            connect_args["ssl"] = value  # asyncpg takes the libpq sslmode names
+        elif key == "connect_timeout":
+            connect_args["timeout"] = float(value)
+        elif key == "application_name":
+            connect_args["server_settings"] = {"application_name": value}
+        elif key not in _LIBPQ_ONLY_PARAMS:
+            query.append((key, value))
+    return urlunsplit(parts._replace(query=urlencode(query))), connect_args
+
+
+async_database_url, url_connection_args = _build_async_database_url(DATABASE_URL)
+async_connection_args = {}
+
+if is_supabase:
+    async_connection_args = {
+        "ssl": "require",
+        "timeout": 10,
+        "server_settings": {"application_name": "OpsFlow Guardian 2.0"}
+    }
+# Options given in the URL win over the Supabase defaults
+async_connection_args.update(url_connection_args)
+
+# Async engine used by request handlers so DB round trips don't block the event loop
+async_engine = create_async_engine(
+    async_database_url,
+    pool_size=5,  # Mirrors the sync pool - Supabase free tier
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    connect_args=async_connection_args,
+    echo=False
+)
+
+# Async session factory; expire_on_commit=False keeps ORM objects usable after commit
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Import all database models to ensure they're registered with SQLAlchemy
 try:
     from app.models.database_models import (
@@ -72,6 +141,19 @@ def get_database_session() -> Generator:
     finally:
         db.close()
 
+async def get_async_database_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get async database session with proper cleanup
+    Use this as a dependency in async FastAPI endpoints
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+async def close_async_database():
+    """Dispose of the async engine's pooled connections"""
+    await async_engine.dispose()
+    logger.info("✅ Async database connections closed")
+
 def create_tables():
     """Create all database tables"""
     try:
@@ -127,6 +209,7 @@ def get_database_health() -> dict:
                     "checked_out": engine.pool.checkedout(),
                     "overflow": engine.pool.overflow(),
                 },
+                "raw_query_pool": get_raw_pool_stats(),
                 "database_info": {
                     "version": db_version.split(" ")[1] if " " in db_version else db_version,
                     "active_connections": active_connections,
@@ -152,7 +235,8 @@ def get_database_health() -> dict:
                 "checked_in": 0,
                 "checked_out": 0,
                 "overflow": 0,
-            }
+            },
+            "raw_query_pool": get_raw_pool_stats()
         }
 
 def initialize_database():
@@ -187,12 +271,17 @@ def get_db():
     """FastAPI dependency to get database session"""
     return get_database_session()
 
+# Async dependency for FastAPI route handlers
+get_async_db = get_async_database_session
+
 # For backwards compatibility with existing code
 get_database = get_database_session
 
 import os
 import logging
-from typing import Generator
+import time
+from contextlib import asynccontextmanager
+from typing import Generator, Optional
 from sqlalchemy import create_engine, text, inspect, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
@@ -202,6 +291,8 @@ from dotenv import load_dotenv
 import asyncio
 import asyncpg
 
+from app.core.config import settings
+
 # Load environment variables
 load_dotenv()
 
@@ -237,27 +328,128 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+# Process-wide asyncpg pool for raw queries (created at startup, closed on shutdown)
+_raw_pool: Optional[asyncpg.Pool] = None
+_raw_pool_lock = asyncio.Lock()
+_raw_pool_stats = {
+    "acquisitions": 0,
+    "waiting": 0,
+    "acquire_wait_total_ms": 0.0,
+    "acquire_wait_max_ms": 0.0,
+}
+
+
+def _raw_pool_connect_kwargs() -> dict:
+    """Build asyncpg connection arguments from DATABASE_URL"""
+    import urllib.parse as urlparse
+    url = urlparse.urlparse(DATABASE_URL)
+    
+    connect_kwargs = {
+        "host": url.hostname,
+        "port": url.port or 5432,
+        "user": url.username,
+        "password": url.password,
+        "database": url.path[1:]  # Remove leading slash
+    }
+    if "supabase.co" in DATABASE_URL:
+        connect_kwargs["ssl"] = "require"
+    return connect_kwargs
+
+
+async def init_raw_pool() -> asyncpg.Pool:
+    """Create the shared asyncpg pool if it doesn't exist yet"""
+    global _raw_pool
+    
+    if _raw_pool is not None:
+        return _raw_pool
+    
+    async with _raw_pool_lock:
+        if _raw_pool is None:
+            _raw_pool = await asyncpg.create_pool(
+                min_size=settings.DB_RAW_POOL_MIN_SIZE,
+                max_size=settings.DB_RAW_POOL_MAX_SIZE,
+                statement_cache_size=settings.DB_RAW_POOL_STATEMENT_CACHE_SIZE,
+                command_timeout=settings.DB_RAW_QUERY_TIMEOUT,
+                max_inactive_connection_lifetime=300,
+                **_raw_pool_connect_kwargs()
+            )
+            logger.info(
+                f"✅ Raw query pool ready (min={settings.DB_RAW_POOL_MIN_SIZE}, "
+                f"max={settings.DB_RAW_POOL_MAX_SIZE})"
+            )
+    return _raw_pool
+
+
+async def close_raw_pool():
+    """Close the shared asyncpg pool"""
+    global _raw_pool
+    
+    if _raw_pool is None:
+        return
+    
+    pool, _raw_pool = _raw_pool, None
+    try:
+        await asyncio.wait_for(pool.close(), timeout=10)
+    except asyncio.TimeoutError:
+        logger.warning("⚠️ Raw query pool did not close in time, terminating connections")
+        pool.terminate()
+    logger.info("✅ Raw query pool closed")
+
+
+@asynccontextmanager
+async def acquire_raw_connection():
+    """Acquire a pooled asyncpg connection, recording how long we waited for it"""
+    pool = await init_raw_pool()
+    
+    _raw_pool_stats["waiting"] += 1
+    wait_start = time.perf_counter()
+    try:
+        connection = await pool.acquire(timeout=settings.DB_RAW_QUERY_TIMEOUT)
+    finally:
+        _raw_pool_stats["waiting"] -= 1
+    
+    wait_ms = (time.perf_counter() - wait_start) * 1000
+    _raw_pool_stats["acquisitions"] += 1
+    _raw_pool_stats["acquire_wait_total_ms"] += wait_ms
+    _raw_pool_stats["acquire_wait_max_ms"] = max(_raw_pool_stats["acquire_wait_max_ms"], wait_ms)
+    
+    try:
+        yield connection
+    finally:
+        await pool.release(connection)
+
+
+def get_raw_pool_stats() -> dict:
+    """Snapshot of the raw query pool for health reporting"""
+    acquisitions = _raw_pool_stats["acquisitions"]
+    stats = {
+        "initialized": _raw_pool is not None,
+        "min_size": settings.DB_RAW_POOL_MIN_SIZE,
+        "max_size": settings.DB_RAW_POOL_MAX_SIZE,
+        "size": 0,
+        "in_use": 0,
+        "idle": 0,
+        "waiting": _raw_pool_stats["waiting"],
+        "acquisitions": acquisitions,
+        "acquire_wait_avg_ms": round(_raw_pool_stats["acquire_wait_total_ms"] / acquisitions, 3) if acquisitions else 0.0,
+        "acquire_wait_max_ms": round(_raw_pool_stats["acquire_wait_max_ms"], 3),
+    }
+    
+    if _raw_pool is not None:
+        size = _raw_pool.get_size()
+        idle = _raw_pool.get_idle_size()
+        stats.update({"size": size, "idle": idle, "in_use": size - idle})
+    
+    return stats
+
+
 async def test_connection():
     """Test database connection"""
     try:
-        # Parse DATABASE_URL for asyncpg connection
-        import urllib.parse as urlparse
-        url = urlparse.urlparse(DATABASE_URL)
-        
-        # Connect using asyncpg for testing
-        conn = await asyncpg.connect(
-            host=url.hostname,
-            port=url.port or 5432,
-            user=url.username,
-            password=url.password,
-            database=url.path[1:]  # Remove leading slash
-        )
+        async with acquire_raw_connection() as conn:
+            result = await conn.fetchval("SELECT version()")
         
-        # Test query
-        result = await conn.fetchval("SELECT version()")
         logger.info(f"✅ Database connected successfully: {result}")
-        
-        await conn.close()
         return True
         
     except Exception as e:
@@ -338,6 +530,7 @@ async def close_db():
     try:
         logger.info("🔒 Closing database connections...")
         engine.dispose()
+        await close_raw_pool()
         logger.info("✅ Database connections closed")
         
     except Exception as e:
@@ -345,27 +538,14 @@ async def close_db():
 
 
 # Utility functions for raw SQL queries
-async def execute_raw_query(query: str, params: dict = None):
-    """Execute raw SQL query with asyncpg"""
+async def execute_raw_query(query: str, params: dict = None, timeout: Optional[float] = None):
+    """Execute raw SQL query on the shared asyncpg pool"""
     try:
-        import urllib.parse as urlparse
-        url = urlparse.urlparse(DATABASE_URL)
-        
-        conn = await asyncpg.connect(
-            host=url.hostname,
-            port=url.port or 5432,
-            user=url.username,
-            password=url.password,
-            database=url.path[1:]
-        )
-        
-        if params:
-            result = await conn.fetch(query, *params.values())
-        else:
-            result = await conn.fetch(query)
-            
-        await conn.close()
-        return result
+        async with acquire_raw_connection() as conn:
+            query_timeout = timeout or settings.DB_RAW_QUERY_TIMEOUT
+            if params:
+                return await conn.fetch(query, *params.values(), timeout=query_timeout)
+            return await conn.fetch(query, timeout=query_timeout)
         
     except Exception as e:
         logger.error(f"Error executing raw query: {e}")
@@ -0,0 +1,93 @@
+"""
+Workflow execution repository for OpsFlow Guardian 2.0
+Durable execution records: the queued job spec and per-step checkpoints
+"""
+
+import logging
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database_models import WorkflowExecution
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED_STATUSES = ("QUEUED", "RUNNING")
+
+
+class ExecutionRepository:
+    """Async repository over the workflow_executions table"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create(
+        self,
+        execution_uuid: uuid.UUID,
+        workflow_id: int,
+        user_id: int,
+        company_id: Optional[int],
+        job: Dict[str, Any],
+        total_steps: int,
+    ) -> WorkflowExecution:
+        """Record a queued execution; the job spec is kept so it can be resumed"""
+        execution = WorkflowExecution(
+            execution_uuid=execution_uuid,
+            workflow_id=workflow_id,
+            user_id=user_id,
+            company_id=company_id,
+            status="QUEUED",
+            input_data=job,
+            current_step=0,
+            total_steps=total_steps,
+            step_details=[],
+        )
+        self.db.add(execution)
+        await self.db.commit()
+        await self.db.refresh(execution)
+        return execution
+
+    async def get(self, execution_uuid: uuid.UUID) -> Optional[WorkflowExecution]:
+        result = await self.db.execute(
+            select(WorkflowExecution).where(WorkflowExecution.execution_uuid == execution_uuid)
+        )
+        return result.scalar_one_or_none()
+
+    async def record_step(self, execution_uuid: uuid.UUID, step_result: Dict[str, Any]):
+        """Append a completed step's checkpoint to step_details"""
+        await self.db.execute(
+            update(WorkflowExecution)
+            .where(WorkflowExecution.execution_uuid == execution_uuid)
+            .values(
+                step_details=func.coalesce(WorkflowExecution.step_details, bindparam("empty", [], type_=JSONB))
+                .op("||")(bindparam("step", [step_result], type_=JSONB)),
+                current_step=func.coalesce(WorkflowExecution.current_step, 0) + 1,
+            )
+        )
+        await self.db.commit()
+
+    async def set_status(self, execution_uuid: uuid.UUID, status: str, **values):
+        """Update status; start and finish times are stamped by the database"""
+        if status == "RUNNING":
+            values.setdefault("started_at", func.now())
+        elif status in ("COMPLETED", "FAILED"):
+            values.setdefault("completed_at", func.now())
+        await self.db.execute(
+            update(WorkflowExecution)
+            .where(WorkflowExecution.execution_uuid == execution_uuid)
+            .values(status=status, **values)
+        )
+        await self.db.commit()
+
+    async def list_unfinished(self, limit: int = 500) -> List[WorkflowExecution]:
+        """Executions that were queued or running, oldest first"""
+        result = await self.db.execute(
+            select(WorkflowExecution)
+            .where(WorkflowExecution.status.in_(UNFINISHED_STATUSES))
+            .order_by(WorkflowExecution.created_at)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
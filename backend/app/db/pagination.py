@@ -0,0 +1,37 @@
+"""
+Keyset pagination helpers for OpsFlow Guardian 2.0
+Pages are ordered newest first on (created_at, id) and addressed by an opaque cursor
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque cursor"""
+    payload = json.dumps({"c": created_at.isoformat(), "i": row_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode an opaque cursor back into a (created_at, id) keyset position"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_before(created_at_column, id_column, cursor: str):
+    """
+    Build the WHERE clause for the page after a cursor.
+    Uses a row comparison so Postgres can seek straight into a
+    (..., created_at, id) btree index instead of scanning past earlier pages.
+    """
+    cursor_created_at, cursor_id = decode_cursor(cursor)
+    return tuple_(created_at_column, id_column) < tuple_(cursor_created_at, cursor_id)
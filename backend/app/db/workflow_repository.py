@@ -0,0 +1,181 @@
+"""
+Workflow repository for OpsFlow Guardian 2.0
+Database-backed workflow store with keyset pagination and optimistic concurrency
+"""
+
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.pagination import encode_cursor, keyset_before
+from app.models.database_models import Workflow
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class WorkflowVersionConflict(Exception):
+    """Raised when a workflow was modified by another request since it was read"""
+
+    def __init__(self, workflow_id: str, expected_version: int, current_version: Optional[int] = None):
+        self.workflow_id = workflow_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+        super().__init__(
+            f"Workflow {workflow_id} version conflict: expected {expected_version}, current {current_version}"
+        )
+
+
+def parse_workflow_uuid(workflow_id: str) -> Optional[uuid.UUID]:
+    """Parse a public workflow id, returning None if it is not a valid UUID"""
+    try:
+        return uuid.UUID(workflow_id)
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+def workflow_to_dict(workflow: Workflow) -> Dict[str, Any]:
+    """Serialize a Workflow row into the API response shape"""
+    metadata = workflow.workflow_metadata or {}
+    return {
+        "id": str(workflow.workflow_uuid),
+        "name": workflow.name,
+        "description": workflow.description,
+        "status": workflow.status,
+        "version": workflow.lock_version,
+        "created_at": workflow.created_at.isoformat() if workflow.created_at else None,
+        "updated_at": workflow.updated_at.isoformat() if workflow.updated_at else None,
+        "created_by": workflow.user_id,
+        "company_id": workflow.company_id,
+        "risk_level": workflow.risk_level,
+        "approval_required": workflow.requires_approval,
+        "steps": workflow.workflow_steps or [],
+        # Nested so free-form metadata can never shadow the columns above
+        "metadata": metadata,
+        "estimated_duration": metadata.get("estimated_duration"),
+        "integrations_used": metadata.get("integrations_used", []),
+    }
+
+
+class WorkflowRepository:
+    """Async repository over the workflows table"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create(
+        self,
+        user_id: int,
+        company_id: Optional[int],
+        name: str,
+        description: str,
+        status: str,
+        steps: List[Dict[str, Any]],
+        metadata: Dict[str, Any],
+        risk_level: str = "medium",
+        requires_approval: bool = False,
+    ) -> Workflow:
+        """Insert a new workflow and return the persisted row"""
+        workflow = Workflow(
+            user_id=user_id,
+            company_id=company_id,
+            name=name,
+            description=description,
+            status=status,
+            workflow_steps=steps,
+            workflow_metadata=metadata,
+            risk_level=risk_level,
+            requires_approval=requires_approval,
+        )
+        self.db.add(workflow)
+        await self.db.commit()
+        await self.db.refresh(workflow)
+        return workflow
+
+    async def get(self, workflow_uuid: uuid.UUID) -> Optional[Workflow]:
+        """Fetch a workflow by its public UUID"""
+        result = await self.db.execute(
+            select(Workflow).where(Workflow.workflow_uuid == workflow_uuid)
+        )
+        return result.scalar_one_or_none()
+
+    async def list_page(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        company_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> Tuple[List[Workflow], Optional[str]]:
+        """
+        List workflows newest first using keyset pagination on (created_at, id).
+        Returns the page and the cursor for the next page (None when exhausted).
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = select(Workflow)
+
+        if company_id is not None:
+            query = query.where(Workflow.company_id == company_id)
+        if user_id is not None:
+            query = query.where(Workflow.user_id == user_id)
+        if status:
+            query = query.where(Workflow.status == status)
+        if cursor:
+            query = query.where(keyset_before(Workflow.created_at, Workflow.id, cursor))
+
+        # Fetch one extra row to know whether another page exists
+        query = query.order_by(Workflow.created_at.desc(), Workflow.id.desc()).limit(limit + 1)
+        rows = list((await self.db.execute(query)).scalars().all())
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return rows, next_cursor
+
+    async def update_with_version(
+        self,
+        workflow_uuid: uuid.UUID,
+        expected_version: int,
+        values: Dict[str, Any],
+    ) -> Workflow:
+        """
+        Apply an update only if the row still has the expected lock_version.
+        Raises WorkflowVersionConflict if another writer got there first.
+        """
+        result = await self.db.execute(
+            update(Workflow)
+            .where(
+                Workflow.workflow_uuid == workflow_uuid,
+                Workflow.lock_version == expected_version
+            )
+            .values(**values, lock_version=Workflow.lock_version + 1)
+            .returning(Workflow)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        workflow = result.scalar_one_or_none()
+        if workflow is None:
+            await self.db.rollback()
+            current = await self.get(workflow_uuid)
+            raise WorkflowVersionConflict(
+                str(workflow_uuid), expected_version, current.lock_version if current else None
+            )
+        await self.db.commit()
+        return workflow
+
+    async def delete(self, workflow_uuid: uuid.UUID) -> Optional[str]:
+        """Delete a workflow, returning its name if it existed"""
+        result = await self.db.execute(
+            delete(Workflow)
+            .where(Workflow.workflow_uuid == workflow_uuid)
+            .returning(Workflow.name)
+        )
+        name = result.scalar_one_or_none()
+        await self.db.commit()
+        return name
@@ -2,24 +2,37 @@
 Error handling middleware for OpsFlow Guardian 2.0
 """
 
-from fastapi import Request, HTTPException
+from fastapi import HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
 import traceback
 
 logger = logging.getLogger(__name__)
 
 
-class ErrorHandlingMiddleware(BaseHTTPMiddleware):
-    """Global error handling middleware"""
+class ErrorHandlingMiddleware:
+    """Global error handling middleware (pure ASGI)"""
     
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Process request with error handling"""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        response_started = False
+        
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
         
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_wrapper)
             
         except HTTPException:
             # Re-raise HTTP exceptions as they are handled by FastAPI
@@ -27,11 +40,15 @@ class ErrorHandlingMiddleware(BaseHTTPMiddleware):
             
         except Exception as e:
             # Log the error
-            logger.error(f"Unhandled exception in {request.method} {request.url}: {e}")
+            logger.error(f"Unhandled exception in {scope['method']} {scope['path']}: {e}")
             logger.error(f"Traceback: {traceback.format_exc()}")
             
+            # Too late to replace a response that is already streaming
+            if response_started:
+                raise
+            
             # Return generic error response
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=500,
                 content={
                     "success": False,
@@ -39,3 +56,4 @@ class ErrorHandlingMiddleware(BaseHTTPMiddleware):
                     "detail": "An unexpected error occurred"
                 }
             )
+            await response(scope, receive, send)
@@ -2,56 +2,117 @@
 Rate limiting middleware for OpsFlow Guardian 2.0
 """
 
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-import time
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
-from collections import defaultdict, deque
+
+from app.core.auth import get_cached_user, verify_token
+from app.core.config import settings
+from app.services.rate_limiter import RateLimiter, parse_quota, rate_limiter
 
 logger = logging.getLogger(__name__)
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware"""
+class RateLimitMiddleware:
+    """
+    Rate limiting middleware (pure ASGI) backed by the shared Redis GCRA limiter.
+    Requests are keyed by route quota and caller: the authenticated user when a
+    valid bearer token is present (their company when it has a tenant quota),
+    otherwise the client IP. Health and docs paths are exempt.
+    """
     
-    def __init__(self, app):
-        super().__init__(app)
-        # Store request timestamps per IP
-        self.requests = defaultdict(deque)
-        self.rate_limit = 60  # requests per minute
-        self.window_size = 60  # seconds
+    def __init__(self, app: ASGIApp, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+        self.default_quota = (settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW)
+        # Longest prefix first so the most specific route quota wins
+        self.route_quotas = sorted(
+            ((prefix, quota) for prefix, quota in
+             ((prefix, parse_quota(value)) for prefix, value in settings.RATE_LIMIT_ROUTE_QUOTAS.items())
+             if quota),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self.exempt_paths = tuple(settings.RATE_LIMIT_EXEMPT_PATHS)
+        self.tenant_quotas = {
+            f"company:{tenant}": quota for tenant, quota in
+            ((tenant, parse_quota(value)) for tenant, value in settings.RATE_LIMIT_TENANT_QUOTAS.items())
+            if quota
+        }
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Process request with rate limiting"""
         
-        # Skip rate limiting in development
-        from app.core.config import settings
-        if settings.DEBUG:
-            return await call_next(request)
+        # Skip rate limiting for non-HTTP traffic and in development
+        if scope["type"] != "http" or settings.DEBUG or self._exempt(scope["path"]):
+            await self.app(scope, receive, send)
+            return
         
-        # Get client IP
-        client_ip = request.client.host
-        current_time = time.time()
+        route, quota = self._route_quota(scope["path"])
+        tenant = await self._tenant(scope)
+        limit, period = self.tenant_quotas.get(tenant, quota)
         
-        # Clean old requests
-        self._clean_old_requests(client_ip, current_time)
+        decision = await self.limiter.check(f"{route}:{tenant}", limit, period)
+        headers = {
+            "X-RateLimit-Limit": str(decision["limit"]),
+            "X-RateLimit-Remaining": str(decision["remaining"]),
+            "X-RateLimit-Reset": str(decision["reset"])
+        }
         
         # Check rate limit
-        if len(self.requests[client_ip]) >= self.rate_limit:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            raise HTTPException(
+        if not decision["allowed"]:
+            logger.warning(f"Rate limit exceeded for {tenant} on {route}")
+            headers["Retry-After"] = str(decision["retry_after"])
+            response = JSONResponse(
                 status_code=429,
-                detail="Rate limit exceeded. Please try again later."
+                content={"detail": "Rate limit exceeded. Please try again later."},
+                headers=headers
             )
+            await response(scope, receive, send)
+            return
         
-        # Add current request
-        self.requests[client_ip].append(current_time)
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
         
-        return await call_next(request)
+        await self.app(scope, receive, send_with_headers)
+    
+    def _route_quota(self, path: str):
+        """Find the most specific configured quota for a path"""
+        for prefix, quota in self.route_quotas:
+            if path.startswith(prefix):
+                return prefix, quota
+        return "*", self.default_quota
+    
+    def _exempt(self, path: str) -> bool:
+        """Exempt paths match exactly or as a parent of the request path ("/" only exactly)"""
+        return any(
+            path == prefix or (prefix != "/" and path.startswith(prefix + "/"))
+            for prefix in self.exempt_paths
+        )
     
-    def _clean_old_requests(self, client_ip: str, current_time: float):
-        """Remove old requests outside the time window"""
-        cutoff_time = current_time - self.window_size
-        while (self.requests[client_ip] and 
-               self.requests[client_ip][0] < cutoff_time):
-            self.requests[client_ip].popleft()
+    async def _tenant(self, scope: Scope) -> str:
+        """
+        Identify the caller from the cached token claims and user context:
+        their company if it has a tenant quota, else the user, else the client IP
+        """
+        auth_header = Headers(scope=scope).get("authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            try:
+                claims = await verify_token(auth_header[7:])
+                email = claims.get("email") or claims.get("sub")
+                user = await get_cached_user(email) if email else None
+                if user:
+                    company = f"company:{user['company_id']}"
+                    return company if company in self.tenant_quotas else f"user:{user['user_id']}"
+                if email:
+                    return f"user:{email}"
+            except HTTPException:
+                pass
+            except Exception as e:
+                logger.warning(f"⚠️ Could not resolve rate limit tenant: {e}")
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
@@ -3,15 +3,25 @@ SQLAlchemy database models for OpsFlow Guardian 2.0 - Supabase compatible
 These models match the Supabase schema defined in supabase_setup.sql
 """
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Numeric, JSON, ForeignKey, BigInteger
-from sqlalchemy.dialects.postgresql import UUID, INET, JSONB
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Numeric, JSON, ForeignKey, BigInteger, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, INET, JSONB, TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import uuid
 
 Base = declarative_base()
 
+# Full-text search document for audit_trail: description ranks highest, then
+# resource type, then the free-text metadata keys written by the audit helpers
+AUDIT_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english'::regconfig, coalesce(event_description, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(resource_type, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, "
+    "coalesce(metadata->>'action', '') || ' ' || coalesce(metadata->>'workflow_name', '') || ' ' || "
+    "coalesce(metadata->>'agent_name', '') || ' ' || coalesce(metadata->>'details', '')), 'C')"
+)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -258,10 +268,12 @@ class Workflow(Base):
     requires_approval = Column(Boolean, default=False)
     
     # Status
+    status = Column(String(50), nullable=False, default="pending", server_default="pending")
     is_active = Column(Boolean, default=True, index=True)
     is_template = Column(Boolean, default=False)
     is_public = Column(Boolean, default=False)
     version = Column(Integer, default=1)
+    lock_version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency token
     
     # Metadata
     tags = Column(JSONB)
@@ -282,6 +294,14 @@ class Workflow(Base):
     user = relationship("User", back_populates="workflows")
     company = relationship("Company", back_populates="workflows")
     executions = relationship("WorkflowExecution", back_populates="workflow")
+    
+    # Keyset pagination indexes for list/filter queries (newest first)
+    __table_args__ = (
+        Index("idx_workflows_created_id", "created_at", "id"),
+        Index("idx_workflows_company_created_id", "company_id", "created_at", "id"),
+        Index("idx_workflows_status_created_id", "status", "created_at", "id"),
+        Index("idx_workflows_company_status_created_id", "company_id", "status", "created_at", "id"),
+    )
 
 
 class WorkflowExecution(Base):
@@ -508,10 +528,20 @@ class AuditTrail(Base):
     # Timestamp
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
+    # Full-text search (generated by Postgres, never loaded unless asked for)
+    search_vector = deferred(Column(TSVECTOR, Computed(AUDIT_SEARCH_VECTOR_SQL, persisted=True)))
+    
     # Relationships
     user = relationship("User")
     agent = relationship("Agent")
     company = relationship("Company")
+    
+    # Keyset pagination indexes for per-company audit queries (newest first)
+    __table_args__ = (
+        Index("idx_audit_trail_company_created_id", "company_id", "created_at", "id"),
+        Index("idx_audit_trail_company_event_created_id", "company_id", "event_type", "created_at", "id"),
+        Index("idx_audit_trail_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
 
 class SystemSettings(Base):
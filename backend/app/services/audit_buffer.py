@@ -0,0 +1,173 @@
+"""
+Buffered audit event writer for OpsFlow Guardian 2.0
+Coalesces audit events in memory and hands them to a bulk flush callback
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FlushCallback = Callable[[List[Dict[str, Any]]], Awaitable[bool]]
+
+
+class AuditEventBuffer:
+    """
+    Bounded in-process queue of audit events drained by a single background task.
+    A batch is flushed when it reaches batch_size or when flush_interval seconds
+    have passed since its first event. A failed batch is retried once after
+    retry_delay seconds before it is discarded. When the queue is full, producers wait up
+    to enqueue_timeout before the event is dropped, so a slow sink throttles
+    callers briefly instead of growing memory without bound.
+    """
+
+    def __init__(
+        self,
+        flush_callback: FlushCallback,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 0.05,
+        retry_delay: float = 1.0,
+    ):
+        self.flush_callback = flush_callback
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.retry_delay = retry_delay
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self._stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "flushed_events": 0,
+            "flushed_batches": 0,
+            "failed_events": 0,
+            "retried_batches": 0,
+            "flush_total_ms": 0.0,
+            "flush_max_ms": 0.0,
+            "last_flush_ms": 0.0,
+        }
+
+    def _ensure_worker(self):
+        """Create the queue and worker lazily inside the running event loop"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def enqueue(self, event: Dict[str, Any]) -> bool:
+        """Queue an event for the next flush. Returns False if it had to be dropped."""
+        if self._closing:
+            self._stats["dropped"] += 1
+            return False
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(event), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self._stats["dropped"] += 1
+                if self._stats["dropped"] % 1000 == 1:
+                    logger.warning(f"⚠️ Audit buffer full ({self.max_size}), dropped {self._stats['dropped']} events so far")
+                return False
+
+        self._stats["enqueued"] += 1
+        return True
+
+    async def _run(self):
+        """Drain the queue in batches until closed and empty"""
+        while True:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                if self._closing:
+                    return
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                # Take whatever is already queued without waiting
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closing:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _send(self, batch: List[Dict[str, Any]]) -> bool:
+        try:
+            return await self.flush_callback(batch)
+        except Exception as e:
+            logger.error(f"Error flushing audit batch of {len(batch)} events: {e}")
+            return False
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        """Send one batch to the sink (one retry after a backoff) and record latency"""
+        start = time.perf_counter()
+        ok = await self._send(batch)
+        if not ok:
+            self._stats["retried_batches"] += 1
+            await asyncio.sleep(self.retry_delay)
+            ok = await self._send(batch)
+            if not ok:
+                logger.error(f"❌ Discarding audit batch of {len(batch)} events after retry")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self._stats["flushed_batches"] += 1
+        self._stats["flush_total_ms"] += elapsed_ms
+        self._stats["flush_max_ms"] = max(self._stats["flush_max_ms"], elapsed_ms)
+        self._stats["last_flush_ms"] = elapsed_ms
+        if ok:
+            self._stats["flushed_events"] += len(batch)
+        else:
+            self._stats["failed_events"] += len(batch)
+
+    async def close(self, timeout: float = 10.0):
+        """Stop accepting events and flush everything still queued"""
+        self._closing = True
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._worker, timeout=timeout)
+            logger.info("✅ Audit buffer flushed")
+        except asyncio.TimeoutError:
+            self._worker.cancel()
+            logger.warning(f"⚠️ Audit buffer flush timed out, {self.queue_depth} events lost")
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and flush latency counters"""
+        batches = self._stats["flushed_batches"]
+        return {
+            "queue_depth": self.queue_depth,
+            "max_size": self.max_size,
+            "enqueued": self._stats["enqueued"],
+            "dropped": self._stats["dropped"],
+            "flushed_events": self._stats["flushed_events"],
+            "flushed_batches": batches,
+            "failed_events": self._stats["failed_events"],
+            "flush_avg_ms": round(self._stats["flush_total_ms"] / batches, 2) if batches else 0.0,
+            "flush_max_ms": round(self._stats["flush_max_ms"], 2),
+            "last_flush_ms": round(self._stats["last_flush_ms"], 2),
+        }
@@ -0,0 +1,143 @@
+"""
+Token-streaming chat responses for OpsFlow Guardian 2.0
+Relays an LLM chunk generator to the client as Server-Sent Events or NDJSON,
+records time-to-first-token and tokens/sec per request, and stops the
+upstream generation as soon as the client goes away
+"""
+
+import asyncio
+import json
+import logging
+import time
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+
+from fastapi import Request
+
+from app.websocket.sse import format_sse
+
+logger = logging.getLogger(__name__)
+
+STREAM_MODES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def stream_mode(request: Request, requested: Optional[str]) -> Optional[str]:
+    """Streaming mode from ?stream=sse|ndjson or the Accept header; None for a plain JSON reply"""
+    if requested in STREAM_MODES:
+        return requested
+    accept = request.headers.get("accept", "")
+    for mode, media_type in STREAM_MODES.items():
+        if media_type in accept:
+            return mode
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); chunks carry no usage data"""
+    return max(1, len(text) // 4) if text else 0
+
+
+class ChatStreamMetrics:
+    """Aggregate TTFT and throughput of streamed chat responses"""
+
+    def __init__(self):
+        self._stats = {
+            "streams": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "errors": 0,
+            "ttft_samples": 0,
+            "ttft_ms_total": 0.0,
+            "ttft_ms_max": 0.0,
+            "tokens": 0,
+            "generation_seconds": 0.0,
+        }
+
+    def record(self, outcome: str, ttft_ms: Optional[float], tokens: int, generation_seconds: float):
+        self._stats["streams"] += 1
+        self._stats[outcome] += 1
+        self._stats["tokens"] += tokens
+        self._stats["generation_seconds"] += generation_seconds
+        if ttft_ms is not None:
+            self._stats["ttft_samples"] += 1
+            self._stats["ttft_ms_total"] += ttft_ms
+            self._stats["ttft_ms_max"] = max(self._stats["ttft_ms_max"], ttft_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        samples = stats.pop("ttft_samples")
+        stats["avg_ttft_ms"] = round(stats.pop("ttft_ms_total") / samples, 1) if samples else 0.0
+        stats["ttft_ms_max"] = round(stats["ttft_ms_max"], 1)
+        seconds = stats.pop("generation_seconds")
+        stats["avg_tokens_per_second"] = round(stats["tokens"] / seconds, 1) if seconds else 0.0
+        return stats
+
+
+def _frame(mode: str, event: str, data: Dict[str, Any]) -> str:
+    if mode == "sse":
+        return format_sse(json.dumps(data), event=event)
+    return json.dumps({"type": event, **data}) + "\n"
+
+
+async def stream_chat(chunks: AsyncGenerator[str, None], request: Request, mode: str,
+                      meta: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Relay chunks as "token" frames, then a "done" frame with timing
+    (or an "error" frame). A client disconnect closes the chunk generator,
+    which cancels the upstream request.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    outcome = "completed"
+    try:
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                if await request.is_disconnected():
+                    outcome = "cancelled"
+                    break
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens += estimate_tokens(chunk)
+                yield _frame(mode, "token", {"text": chunk})
+
+        if outcome == "completed":
+            elapsed = time.perf_counter() - start
+            generation = time.perf_counter() - (first_token_at or start)
+            yield _frame(mode, "done", {
+                **meta,
+                "ttft_ms": round((first_token_at - start) * 1000, 1) if first_token_at else None,
+                "tokens": tokens,
+                "tokens_per_second": round(tokens / generation, 1) if generation > 0 else None,
+                "total_ms": round(elapsed * 1000, 1)
+            })
+    except (asyncio.CancelledError, GeneratorExit):
+        # The server cancels or closes the response stream when the client disconnects
+        outcome = "cancelled"
+        raise
+    except Exception as e:
+        outcome = "errors"
+        logger.error(f"Chat stream failed: {e}")
+        yield _frame(mode, "error", {"error": "Chat generation failed"})
+    finally:
+        ttft_ms = (first_token_at - start) * 1000 if first_token_at else None
+        generation = time.perf_counter() - (first_token_at or start)
+        chat_stream_metrics.record(outcome, ttft_ms, tokens, generation if tokens else 0.0)
+        logger.info(
+            f"💬 Chat stream {outcome}: ttft={ttft_ms or 0:.0f}ms tokens={tokens} "
+            f"({tokens / generation if generation > 0 else 0:.1f} tok/s)"
+        )
+
+
+async def mock_chunks(text: str, delay: float = 0.02) -> AsyncGenerator[str, None]:
+    """Stream canned text word by word (development mode without Gemini)"""
+    for word in text.split(" "):
+        await asyncio.sleep(delay)
+        yield word + " "
+
+
+# Global chat stream metrics
+chat_stream_metrics = ChatStreamMetrics()
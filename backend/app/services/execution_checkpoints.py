@@ -0,0 +1,148 @@
+"""
+Workflow execution checkpoints for OpsFlow Guardian 2.0
+Completed step results are saved under an idempotency key per (execution,
+step) in Redis and appended to workflow_executions.step_details, so a resumed
+execution skips steps that already ran
+"""
+
+import json
+import logging
+import uuid
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.execution_repository import ExecutionRepository
+from app.services.redis_service import RedisService, redis_service
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY_PREFIX = "execution:"
+SWEEPER_LOCK_KEY = "execution:sweeper:lock"
+
+
+def step_idempotency_key(execution_id: str, step_id: str) -> str:
+    """Stable key for one step of one execution; pass it to side-effecting integrations"""
+    return f"{execution_id}:{step_id}"
+
+
+def _execution_uuid(execution_id: str) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(execution_id)
+    except (ValueError, TypeError):
+        return None
+
+
+class ExecutionCheckpoints:
+    """Per-step checkpoints: Redis for fast resume, Postgres for durability"""
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self._stats = {"saved": 0, "resumed_steps": 0, "db_errors": 0, "recovered": 0}
+
+    async def load(self, execution_id: str) -> Dict[str, Dict[str, Any]]:
+        """Completed step results for an execution, keyed by step id"""
+        if self.redis.redis_client is not None:
+            try:
+                raw = await self.redis.redis_client.hgetall(f"{CHECKPOINT_KEY_PREFIX}{execution_id}:checkpoints")
+                if raw:
+                    return {step_id: json.loads(value) for step_id, value in raw.items()}
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to load checkpoints from Redis: {e}")
+
+        execution_uuid = _execution_uuid(execution_id)
+        if execution_uuid is None:
+            return {}
+        try:
+            async with AsyncSessionLocal() as db:
+                execution = await ExecutionRepository(db).get(execution_uuid)
+            if execution is None:
+                return {}
+            return {
+                step["step_id"]: step for step in (execution.step_details or [])
+                if step.get("status") == "completed" and step.get("step_id")
+            }
+        except Exception as e:
+            self._stats["db_errors"] += 1
+            logger.warning(f"⚠️ Failed to load checkpoints from the database: {e}")
+            return {}
+
+    async def save(self, execution_id: str, step_id: str, step_result: Dict[str, Any]):
+        """Checkpoint a completed step"""
+        checkpoint = {
+            **step_result,
+            "step_id": step_id,
+            "idempotency_key": step_idempotency_key(execution_id, step_id),
+        }
+        if self.redis.redis_client is not None:
+            key = f"{CHECKPOINT_KEY_PREFIX}{execution_id}:checkpoints"
+            try:
+                async with self.redis.redis_client.pipeline(transaction=False) as pipe:
+                    pipe.hset(key, step_id, json.dumps(checkpoint, default=str))
+                    pipe.expire(key, settings.EXECUTION_STATUS_TTL)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to checkpoint step {step_id} in Redis: {e}")
+
+        execution_uuid = _execution_uuid(execution_id)
+        if execution_uuid is not None:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await ExecutionRepository(db).record_step(execution_uuid, checkpoint)
+            except Exception as e:
+                self._stats["db_errors"] += 1
+                logger.warning(f"⚠️ Failed to checkpoint step {step_id} in the database: {e}")
+        self._stats["saved"] += 1
+
+    def record_resumed(self, skipped_steps: int):
+        self._stats["resumed_steps"] += skipped_steps
+
+    async def mark(self, execution_id: str, status: str, **values):
+        """Update the durable execution record's status"""
+        execution_uuid = _execution_uuid(execution_id)
+        if execution_uuid is None:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await ExecutionRepository(db).set_status(execution_uuid, status, **values)
+        except Exception as e:
+            self._stats["db_errors"] += 1
+            logger.warning(f"⚠️ Failed to mark execution {execution_id} {status}: {e}")
+
+    async def recover_unfinished(self, queue) -> int:
+        """
+        Startup sweeper: re-queue executions recorded as queued/running whose
+        queue state is gone (Redis lost it, or they ran in-process when the
+        worker died). Jobs still in the stream are left to its own reclaimer.
+        """
+        if self.redis.redis_client is not None:
+            # One sweeper across all workers starting at once
+            acquired = await self.redis.redis_client.set(
+                SWEEPER_LOCK_KEY, queue.consumer, nx=True, ex=settings.EXECUTION_VISIBILITY_TIMEOUT
+            )
+            if not acquired:
+                return 0
+
+        async with AsyncSessionLocal() as db:
+            executions = await ExecutionRepository(db).list_unfinished()
+
+        recovered = 0
+        for execution in executions:
+            execution_id = str(execution.execution_uuid)
+            if await queue.get_status(execution_id) is not None or not execution.input_data:
+                continue
+            await queue.enqueue({**execution.input_data, "execution_id": execution_id, "attempt": 0})
+            await self.mark(execution_id, "QUEUED")
+            recovered += 1
+
+        if recovered:
+            logger.warning(f"♻️ Re-queued {recovered} interrupted workflow executions")
+        self._stats["recovered"] += recovered
+        return recovered
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+
+# Global checkpoint store
+execution_checkpoints = ExecutionCheckpoints()
@@ -0,0 +1,357 @@
+"""
+Durable workflow execution queue for OpsFlow Guardian 2.0
+Jobs are entries in a Redis Stream read through a consumer group, so they
+survive worker restarts: a job that is not acknowledged within the visibility
+timeout is reclaimed by another consumer
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.services.redis_service import RedisService, redis_service
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_GROUP = "executors"
+STATUS_KEY_PREFIX = "execution:"
+
+# Move retries whose backoff has elapsed from the delayed set back onto the stream
+PROMOTE_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, job in ipairs(due) do
+    redis.call('XADD', KEYS[2], '*', 'job', job)
+    redis.call('ZREM', KEYS[1], job)
+end
+return #due
+"""
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class ExecutionQueue:
+    """
+    Redis Streams job queue with at-least-once delivery.
+    - enqueue() adds a job and returns its execution id immediately
+    - consumers XREADGROUP jobs; a running job's idle time is reset periodically
+      so it stays invisible to other consumers while it makes progress
+    - jobs left unacknowledged past the visibility timeout (the worker died)
+      are reclaimed with XAUTOCLAIM and retried
+    - failed jobs are retried up to the job's max_retries with capped
+      exponential backoff, then moved to a dead-letter stream; a retry waits
+      in a sorted set scored by its due time, so no consumer sleeps on it
+    Without Redis, jobs run in-process (not durable) so development still works.
+    Jobs that do not run inside a consumer loop (reclaimed or in-process) are
+    tracked tasks, drained on stop().
+    """
+
+    def __init__(self, redis: RedisService = redis_service, stream: Optional[str] = None):
+        self.redis = redis
+        self.stream = stream or settings.EXECUTION_QUEUE_STREAM
+        self.dead_letter_stream = f"{self.stream}:dead"
+        self.delayed_key = f"{self.stream}:delayed"
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.visibility_timeout = settings.EXECUTION_VISIBILITY_TIMEOUT
+        self._handler: Optional[JobHandler] = None
+        # Handlers for jobs with a "kind"; jobs without one go to the default handler
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        # Reclaimed and in-process jobs, run outside the consumer loops
+        self._jobs: Set[asyncio.Task] = set()
+        self._reclaimed_running = 0
+        self._concurrency = settings.EXECUTION_WORKER_CONCURRENCY
+        self._running = 0
+        self._promote_script = None
+        self._stats = {
+            "enqueued": 0,
+            "completed": 0,
+            "failed": 0,
+            "retried": 0,
+            "reclaimed": 0,
+            "dead_lettered": 0,
+        }
+
+    @property
+    def durable(self) -> bool:
+        return self.redis.connected
+
+    async def enqueue(self, job: Dict[str, Any]) -> str:
+        """Queue a job and return its execution id"""
+        job = {
+            **job,
+            "execution_id": job.get("execution_id") or str(uuid.uuid4()),
+            "attempt": job.get("attempt", 0),
+            "enqueued_at": time.time(),
+        }
+        if not self.durable and self._handlers.get(job.get("kind"), self._handler) is None:
+            raise RuntimeError("No durable queue and no local executor available")
+        await self._set_job_status(job, "queued", enqueued_at=job["enqueued_at"])
+        self._stats["enqueued"] += 1
+
+        if not self.durable:
+            logger.warning("⚠️ Redis not available - running workflow execution in-process (not durable)")
+            self._spawn(self._run(job, message_id=None))
+            return job["execution_id"]
+
+        await self.redis.redis_client.xadd(
+            self.stream,
+            {"job": json.dumps(job, default=str)},
+            maxlen=settings.EXECUTION_QUEUE_MAXLEN,
+            approximate=True,
+        )
+        return job["execution_id"]
+
+    async def start(self, handler: JobHandler, concurrency: Optional[int] = None):
+        """Start consuming jobs with `concurrency` parallel consumers"""
+        self._handler = handler
+        if not self.durable:
+            return
+        try:
+            await self.redis.redis_client.xgroup_create(self.stream, CONSUMER_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                logger.error(f"Failed to create execution consumer group: {e}")
+                return
+
+        concurrency = self._concurrency = concurrency or settings.EXECUTION_WORKER_CONCURRENCY
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(concurrency)]
+        self._tasks.append(asyncio.create_task(self._reclaim()))
+        self._tasks.append(asyncio.create_task(self._promote_delayed()))
+        logger.info(f"🧵 Execution queue consumer {self.consumer} started ({concurrency} workers)")
+
+    def register(self, kind: str, handler: JobHandler):
+        """Route jobs enqueued with {"kind": kind} to handler"""
+        self._handlers[kind] = handler
+
+    async def stop(self):
+        """
+        Stop consuming and give detached jobs EXECUTION_SHUTDOWN_GRACE seconds
+        to finish; unfinished durable jobs stay pending and are reclaimed elsewhere
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        jobs = list(self._jobs)
+        if jobs:
+            _, pending = await asyncio.wait(jobs, timeout=settings.EXECUTION_SHUTDOWN_GRACE)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if pending:
+                logger.warning(f"⚠️ Cancelled {len(pending)} execution(s) still running at shutdown")
+    
+    def _spawn(self, job_run: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Run a job outside the consumer loops, keeping a reference until it finishes"""
+        task = asyncio.create_task(job_run)
+        self._jobs.add(task)
+        task.add_done_callback(self._job_done)
+        return task
+    
+    def _job_done(self, task: asyncio.Task):
+        self._jobs.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # Consumer loops log these themselves; detached jobs have no one else to
+            logger.error(f"Execution queue job error: {task.exception()}")
+
+    async def set_status(self, execution_id: str, status: str, extra: Optional[Dict[str, Any]] = None):
+        await self.redis.set_json(
+            f"{STATUS_KEY_PREFIX}{execution_id}:job",
+            {**(extra or {}), "execution_id": execution_id, "status": status, "updated_at": time.time()},
+            expire=settings.EXECUTION_STATUS_TTL,
+        )
+
+    async def _set_job_status(self, job: Dict[str, Any], status: str, **extra):
+        await self.set_status(job["execution_id"], status, {
+            "workflow_id": job.get("workflow_id"),
+            "attempt": job.get("attempt", 0),
+            "max_retries": job.get("max_retries", 3),
+            **extra
+        })
+
+    async def get_status(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        return await self.redis.get_json(f"{STATUS_KEY_PREFIX}{execution_id}:job")
+
+    async def _consume(self):
+        while True:
+            try:
+                response = await self.redis.redis_client.xreadgroup(
+                    CONSUMER_GROUP, self.consumer, {self.stream: ">"}, count=1, block=5000
+                )
+                for _, messages in response or []:
+                    for message_id, fields in messages:
+                        await self._run(json.loads(fields["job"]), message_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Execution queue consumer error: {e}")
+                await asyncio.sleep(1)
+
+    async def _reclaim(self):
+        """
+        Take over jobs whose consumer stopped heartbeating. Reclaimed jobs run as
+        tracked tasks so a long one does not hold up later sweeps; each sweep
+        claims at most as many as there are free slots (the consumer concurrency).
+        """
+        min_idle_ms = self.visibility_timeout * 1000
+        while True:
+            try:
+                await asyncio.sleep(self.visibility_timeout / 2)
+                capacity = min(10, self._concurrency - self._reclaimed_running)
+                if capacity <= 0:
+                    continue  # Still busy with earlier reclaims; their jobs stay claimable
+                result = await self.redis.redis_client.xautoclaim(
+                    self.stream, CONSUMER_GROUP, self.consumer, min_idle_time=min_idle_ms, count=capacity
+                )
+                for message_id, fields in result[1]:
+                    if not fields:
+                        continue  # Entry was trimmed from the stream
+                    self._stats["reclaimed"] += 1
+                    job = json.loads(fields["job"])
+                    # Each delivery that never finished was a crashed attempt
+                    pending = await self.redis.redis_client.xpending_range(
+                        self.stream, CONSUMER_GROUP, min=message_id, max=message_id, count=1
+                    )
+                    deliveries = pending[0]["times_delivered"] if pending else 2
+                    job["attempt"] = job.get("attempt", 0) + deliveries - 1
+                    logger.warning(f"⚠️ Reclaimed execution {job['execution_id']} after visibility timeout")
+                    self._spawn(self._run_reclaimed(job, message_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Execution queue reclaim error: {e}")
+
+    async def _run_reclaimed(self, job: Dict[str, Any], message_id: str):
+        self._reclaimed_running += 1
+        try:
+            await self._run(job, message_id)
+        finally:
+            self._reclaimed_running -= 1
+    
+    async def _run_later(self, delay: float, job: Dict[str, Any]):
+        await asyncio.sleep(delay)
+        await self._run(job, message_id=None)
+    
+    async def _promote_delayed(self):
+        """Re-queue retries whose backoff has elapsed"""
+        while True:
+            try:
+                await asyncio.sleep(1)
+                if self._promote_script is None:
+                    self._promote_script = self.redis.redis_client.register_script(PROMOTE_DUE_LUA)
+                await self._promote_script(keys=[self.delayed_key, self.stream], args=[time.time(), 100])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Execution queue retry promotion error: {e}")
+
+    async def _run(self, job: Dict[str, Any], message_id: Optional[str]):
+        execution_id = job["execution_id"]
+        max_retries = job.get("max_retries", 3)
+        if job.get("attempt", 0) > max_retries:
+            await self._dead_letter(job, message_id, "Retries exhausted")
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(message_id)) if message_id else None
+        self._running += 1
+        try:
+            await self._set_job_status(job, "running", started_at=time.time())
+            handler = self._handlers.get(job.get("kind"), self._handler)
+            await asyncio.wait_for(handler(job), timeout=job.get("timeout_seconds"))
+            await self._set_job_status(job, "completed", completed_at=time.time())
+            self._stats["completed"] += 1
+            await self._ack(message_id)
+        except asyncio.CancelledError:
+            raise  # Shutting down: leave the job pending so it is reclaimed
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.error(f"Execution {execution_id} failed (attempt {job.get('attempt', 0)}): {error}")
+            self._stats["failed"] += 1
+            await self._retry(job, message_id, error)
+        finally:
+            self._running -= 1
+            if heartbeat:
+                heartbeat.cancel()
+
+    async def _retry(self, job: Dict[str, Any], message_id: Optional[str], error: str):
+        attempt = job.get("attempt", 0) + 1
+        if attempt > job.get("max_retries", 3):
+            await self._dead_letter(job, message_id, error)
+            return
+
+        self._stats["retried"] += 1
+        backoff = min(2 ** attempt, settings.EXECUTION_RETRY_BACKOFF_MAX)
+        retry_job = {**job, "attempt": attempt, "not_before": time.time() + backoff}
+        await self._set_job_status(retry_job, "retrying", error=error, not_before=retry_job["not_before"])
+        if message_id is None:
+            # In-process retry: a tracked task sleeping out the backoff
+            self._spawn(self._run_later(backoff, retry_job))
+            return
+        # Schedule before acking so a crash in between duplicates rather than loses the job
+        await self.redis.redis_client.zadd(
+            self.delayed_key, {json.dumps(retry_job, default=str): retry_job["not_before"]}
+        )
+        await self._ack(message_id)
+
+    async def _dead_letter(self, job: Dict[str, Any], message_id: Optional[str], error: str):
+        self._stats["dead_lettered"] += 1
+        await self._set_job_status(job, "failed", error=error)
+        if message_id is not None:
+            await self.redis.redis_client.xadd(
+                self.dead_letter_stream,
+                {"job": json.dumps(job, default=str), "error": error},
+                maxlen=settings.EXECUTION_QUEUE_MAXLEN,
+                approximate=True,
+            )
+            await self._ack(message_id)
+
+    async def _ack(self, message_id: Optional[str]):
+        if message_id is None:
+            return
+        async with self.redis.redis_client.pipeline(transaction=False) as pipe:
+            pipe.xack(self.stream, CONSUMER_GROUP, message_id)
+            pipe.xdel(self.stream, message_id)
+            await pipe.execute()
+
+    async def _heartbeat(self, message_id: str):
+        """Reset the job's idle time so it is not reclaimed while still running"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await self.redis.redis_client.xclaim(
+                    self.stream, CONSUMER_GROUP, self.consumer, min_idle_time=0,
+                    message_ids=[message_id], justid=True
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Execution heartbeat failed for {message_id}: {e}")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            **self._stats,
+            "running": self._running,
+            "detached_jobs": len(self._jobs),
+            "durable": self.durable,
+            "consumer": self.consumer
+        }
+        if self.durable:
+            try:
+                stats["delayed"] = await self.redis.redis_client.zcard(self.delayed_key)
+                groups = await self.redis.redis_client.xinfo_groups(self.stream)
+                for group in groups:
+                    if group["name"] == CONSUMER_GROUP:
+                        stats["pending"] = group["pending"]
+                        stats["lag"] = group.get("lag")
+            except Exception:
+                pass  # Stream not created yet
+        return stats
+
+
+# Global execution queue
+execution_queue = ExecutionQueue()
@@ -4,8 +4,10 @@ Handles direct integration with Google's Gemini API for multi-agent workflows
 """
 
 import asyncio
+import hashlib
 import logging
 import json
+from contextlib import aclosing
 from typing import Dict, List, Any, Optional, AsyncGenerator
 from datetime import datetime
 import uuid
@@ -13,8 +15,12 @@ import uuid
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.models.workflow import WorkflowRequest, WorkflowPlan, WorkflowStep
+from app.services.llm_resilience import CircuitOpenError, get_guard, is_retryable
+from app.services.plan_cache import plan_cache
+from app.services.prompt_budget import chunk_events, compact_context, compact_events, compact_json, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +32,24 @@ class GeminiService:
         self.client = None
         self.model = None
         self._initialized = False
+        # Plan cache lookups and stores embed the same request template back to back
+        self._embeddings = TTLCache(maxsize=256, ttl=300)
+        # Native async calls hold no thread; this is the hard cap on in-flight requests
+        self._semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+        self._in_flight = 0
+        self._stats = {"requests": 0, "streams": 0, "errors": 0, "deduplicated": 0}
+        # Single-flight: identical concurrent prompts share one upstream request
+        self._shared_requests: Dict[str, asyncio.Task] = {}
+        self.model_name = "gemini-1.5-flash"
+        self.generation_config = {
+            "candidate_count": 1,
+            "temperature": 0.7,
+            "top_p": 0.8,
+            "top_k": 40,
+            "max_output_tokens": 8192,
+        }
+        # Adaptive concurrency, rate limits, retries and circuit breaking for this model
+        self._guard = get_guard("gemini", self.model_name, settings.GEMINI_MAX_CONCURRENCY)
     
     async def initialize(self):
         """Initialize Gemini service"""
@@ -46,20 +70,14 @@ class GeminiService:
             
             # Initialize the model
             self.model = genai.GenerativeModel(
-                model_name="gemini-1.5-flash",  # Use base model name for direct API
+                model_name=self.model_name,  # Use base model name for direct API
                 safety_settings={
                     HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
                     HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
                     HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
                     HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
                 },
-                generation_config=genai.types.GenerationConfig(
-                    candidate_count=1,
-                    temperature=0.7,
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=8192,
-                )
+                generation_config=genai.types.GenerationConfig(**self.generation_config)
             )
             
             self._initialized = True
@@ -84,12 +102,25 @@ class GeminiService:
             
             # Generate response with Gemini
             if self.model:
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: self.model.generate_content(prompt)
-                )
+                cached_plan = await plan_cache.lookup(request, embed=self._embed_text)
+                if cached_plan:
+                    logger.info(f"♻️ Reusing cached workflow plan ({cached_plan['cache']['hit']} match)")
+                    return cached_plan
+                
+                try:
+                    response = await self._generate(prompt)
+                except Exception as e:
+                    if not (isinstance(e, CircuitOpenError) or is_retryable(e)):
+                        raise
+                    logger.warning(f"⚠️ Gemini unavailable ({e}); returning a degraded workflow plan")
+                    return self._degraded_plan(request)
                 
                 # Parse the response
                 plan_data = await self._parse_gemini_response(response, request)
+                if not plan_data.get("fallback"):
+                    await plan_cache.store(
+                        request, plan_data, tokens=self._token_count(prompt, response), embed=self._embed_text
+                    )
             else:
                 # Fallback to mock if model not available
                 plan_data = self._generate_mock_plan(request)
@@ -126,9 +157,7 @@ Provide a detailed execution strategy including:
 Format as structured JSON with clear sections.
             """
             
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: self.model.generate_content(prompt)
-            )
+            response = await self._generate(prompt)
             
             # Parse execution strategy
             strategy = await self._parse_execution_strategy(response.text)
@@ -140,12 +169,48 @@ Format as structured JSON with clear sections.
             return {"error": str(e)}
     
     async def generate_audit_summary(self, events: List[Dict[str, Any]]) -> str:
-        """Generate audit summary using Gemini"""
+        """
+        Generate audit summary using Gemini. Events are compacted first; if they
+        still exceed the prompt budget, chunks are summarized in parallel and the
+        partial summaries merged in a final call.
+        """
         try:
-            prompt = f"""
-As an AI auditor, analyze these workflow events and generate a comprehensive audit summary:
+            compacted = compact_events(events)
+            budget = settings.AUDIT_SUMMARY_TOKEN_BUDGET
+            payload = compact_json(compacted)
+            if estimate_tokens(payload) <= budget:
+                response = await self._generate(self._create_audit_prompt(f"EVENTS: {payload}", len(events)))
+                return response.text
+            
+            chunks = chunk_events(compacted, budget)
+            logger.info(
+                f"Audit events (~{estimate_tokens(payload)} tokens) exceed the {budget} token budget; "
+                f"summarizing {len(chunks)} chunks"
+            )
+            partials = await asyncio.gather(*(
+                self._generate(
+                    f"Summarize audit events (part {index + 1} of {len(chunks)}). List notable actions, "
+                    f"failures, risk and compliance concerns and anomalies, with counts. Be brief.\n\n"
+                    f"EVENTS: {compact_json(chunk)}"
+                )
+                for index, chunk in enumerate(chunks)
+            ))
+            notes = "\n\n".join(f"PART {index + 1}: {response.text}" for index, response in enumerate(partials))
+            response = await self._generate(
+                self._create_audit_prompt(f"PARTIAL SUMMARIES:\n{notes[:budget * 4]}", len(events))
+            )
+            return response.text
+            
+        except Exception as e:
+            logger.error(f"Failed to generate audit summary: {e}")
+            return f"Audit summary generation failed: {str(e)}"
+    
+    def _create_audit_prompt(self, material: str, event_count: int) -> str:
+        return f"""
+As an AI auditor, analyze these {event_count} workflow events and generate a comprehensive audit summary.
+Repeated events are listed once with a count.
 
-EVENTS: {json.dumps(events, indent=2)}
+{material}
 
 Provide:
 1. Executive summary of activities
@@ -156,47 +221,175 @@ Provide:
 
 Keep the summary concise but comprehensive.
             """
-            
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: self.model.generate_content(prompt)
-            )
-            
-            return response.text
-            
-        except Exception as e:
-            logger.error(f"Failed to generate audit summary: {e}")
-            return f"Audit summary generation failed: {str(e)}"
     
     async def chat_with_agent(self, message: str, agent_role: str, context: Dict[str, Any]) -> str:
         """Interactive chat with specific agent using Gemini"""
         try:
-            role_prompts = {
-                "planner": "You are the Planner Agent. Help users understand and optimize their workflows.",
-                "executor": "You are the Executor Agent. Help users with workflow execution and troubleshooting.",
-                "auditor": "You are the Auditor Agent. Help users with compliance and audit-related questions."
-            }
+            prompt = self._create_chat_prompt(message, agent_role, context)
             
-            system_prompt = role_prompts.get(agent_role, "You are an AI assistant.")
+            response = await self._generate(prompt)
             
-            prompt = f"""
+            return response.text
+            
+        except Exception as e:
+            logger.error(f"Failed to chat with agent: {e}")
+            return f"Sorry, I encountered an error: {str(e)}"
+    
+    async def chat_with_agent_stream(self, message: str, agent_role: str,
+                                     context: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        """Interactive chat that yields the response as Gemini produces it"""
+        if not self.model:
+            # Mock mode: stream a canned reply word by word
+            reply = f"[{agent_role}] Gemini is not configured, so this is a mock reply to: {message}"
+            for word in reply.split(" "):
+                yield word + " "
+            return
+        
+        prompt = self._create_chat_prompt(message, agent_role, context)
+        # aclosing: a consumer that stops early releases the upstream stream right away
+        async with aclosing(self._stream(prompt)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+    
+    def _create_chat_prompt(self, message: str, agent_role: str, context: Dict[str, Any]) -> str:
+        role_prompts = {
+            "planner": "You are the Planner Agent. Help users understand and optimize their workflows.",
+            "executor": "You are the Executor Agent. Help users with workflow execution and troubleshooting.",
+            "auditor": "You are the Auditor Agent. Help users with compliance and audit-related questions."
+        }
+        
+        system_prompt = role_prompts.get(agent_role, "You are an AI assistant.")
+        
+        return f"""
 {system_prompt}
 
-CONTEXT: {json.dumps(context, indent=2)}
+CONTEXT: {compact_context(context)}
 
 USER MESSAGE: {message}
 
 Provide a helpful, accurate, and role-appropriate response.
             """
-            
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: self.model.generate_content(prompt)
+    
+    def _request_key(self, prompt: str) -> str:
+        """Identity of a completion request: model, generation config and rendered prompt"""
+        material = json.dumps([self.model_name, self.generation_config, prompt], sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+    
+    async def _generate(self, prompt: str):
+        """
+        One completion, shared by every concurrent caller with the same prompt.
+        The upstream call runs as its own task, so a caller that is cancelled
+        does not cancel the request for the others.
+        """
+        key = self._request_key(prompt)
+        shared = self._shared_requests.get(key)
+        if shared is not None:
+            self._stats["deduplicated"] += 1
+            return await asyncio.shield(shared)
+        
+        shared = asyncio.create_task(self._call_model(prompt))
+        self._shared_requests[key] = shared
+        shared.add_done_callback(lambda task: self._finish_shared(key, task))
+        return await asyncio.shield(shared)
+    
+    def _finish_shared(self, key: str, task: asyncio.Task):
+        self._shared_requests.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller was cancelled
+    
+    async def _call_model(self, prompt: str):
+        """One completion through the resilience guard (rate limits, retries, circuit breaker)"""
+        return await self._guard.call(
+            lambda: self._request(prompt),
+            estimated_tokens=len(prompt) // 4,
+            usage=lambda response: self._token_count(prompt, response)
+        )
+    
+    async def _request(self, prompt: str):
+        """One attempt via the SDK's native async API, bounded by the concurrency semaphore"""
+        async with self._semaphore:
+            self._in_flight += 1
+            self._stats["requests"] += 1
+            try:
+                return await self.model.generate_content_async(prompt)
+            except Exception:
+                self._stats["errors"] += 1
+                raise
+            finally:
+                self._in_flight -= 1
+    
+    async def _stream(self, prompt: str) -> AsyncGenerator[str, None]:
+        """
+        Yield completion text chunks as they arrive. Like _request, the
+        semaphore is taken inside the guarded call, so both paths lock the
+        guard's limiter before the semaphore. The slot is held until the stream
+        ends or the consumer closes the generator, which also abandons the
+        upstream response.
+        """
+        held = False
+        
+        async def open_stream():
+            nonlocal held
+            await self._semaphore.acquire()
+            try:
+                response = await self.model.generate_content_async(prompt, stream=True)
+            except BaseException:
+                self._semaphore.release()
+                raise
+            held = True
+            self._in_flight += 1
+            return response
+        
+        self._stats["streams"] += 1
+        try:
+            # Opening the stream goes through the guard; a stream that fails midway is not retried
+            response = await self._guard.call(open_stream, estimated_tokens=len(prompt) // 4)
+            async for chunk in response:
+                text = getattr(chunk, "text", "")
+                if text:
+                    yield text
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            if held:
+                self._in_flight -= 1
+                self._semaphore.release()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "shared_requests": len(self._shared_requests),
+            "concurrency_limit": settings.GEMINI_MAX_CONCURRENCY,
+            "resilience": self._guard.get_stats()
+        }
+    
+    async def _embed_text(self, text: str) -> Optional[List[float]]:
+        """Embedding for plan cache similarity lookups; None if unavailable"""
+        embedding = self._embeddings.get(text)
+        if embedding is not None:
+            return embedding
+        try:
+            result = await genai.embed_content_async(
+                model=settings.PLAN_CACHE_EMBEDDING_MODEL,
+                content=text,
+                task_type="semantic_similarity"
             )
-            
-            return response.text
-            
+            embedding = result["embedding"]
+            self._embeddings.set(text, embedding)
+            return embedding
         except Exception as e:
-            logger.error(f"Failed to chat with agent: {e}")
-            return f"Sorry, I encountered an error: {str(e)}"
+            logger.warning(f"⚠️ Failed to embed text for plan cache: {e}")
+            return None
+    
+    @staticmethod
+    def _token_count(prompt: str, response) -> int:
+        """Tokens billed for a completion, estimated when usage metadata is missing"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "total_token_count", None):
+            return usage.total_token_count
+        return (len(prompt) + len(getattr(response, "text", "") or "")) // 4
     
     def _create_planning_prompt(self, request: WorkflowRequest) -> str:
         """Create comprehensive planning prompt for Gemini"""
@@ -323,6 +516,7 @@ OUTPUT: Respond with ONLY the JSON structure above, no additional text.
     async def _create_fallback_plan(self, response_text: str, request: WorkflowRequest) -> Dict[str, Any]:
         """Create a fallback plan when parsing fails"""
         return {
+            "fallback": True,  # Never cached
             "plan_summary": f"Basic workflow plan for: {request.description}",
             "overall_risk": "medium",
             "estimated_duration": 30,
@@ -405,8 +599,8 @@ OUTPUT: Respond with ONLY the JSON structure above, no additional text.
                 await self.initialize()
             
             # Simple test request
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: self.model.generate_content("Hello, this is a connection test. Please respond with 'Connected successfully'.")
+            response = await self._generate(
+                "Hello, this is a connection test. Please respond with 'Connected successfully'."
             )
             
             return {
@@ -441,6 +635,13 @@ OUTPUT: Respond with ONLY the JSON structure above, no additional text.
             "initialized": self._initialized
         }
     
+    def _degraded_plan(self, request: WorkflowRequest) -> Dict[str, Any]:
+        """Template plan served while Gemini is rate limited or down; never cached"""
+        plan = self._generate_mock_plan(request)
+        plan["fallback"] = True
+        plan["degraded"] = True
+        return plan
+    
     def _generate_mock_plan(self, request: WorkflowRequest) -> Dict[str, Any]:
         """Generate a mock plan for testing when API key is not available"""
         logger.info("Generating mock workflow plan for testing")
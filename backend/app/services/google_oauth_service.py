@@ -4,7 +4,6 @@ Handles Google OAuth authentication flow
 """
 
 import os
-import httpx
 import logging
 from typing import Dict, Optional
 from fastapi import HTTPException
@@ -14,14 +13,19 @@ from datetime import datetime, timedelta
 import jwt
 import secrets
 
+from app.core.config import settings
+from app.services.http_client import HTTPClientRegistry, http_clients
+
 logger = logging.getLogger(__name__)
 
 class GoogleOAuthService:
-    def __init__(self):
+    def __init__(self, http: HTTPClientRegistry = http_clients):
+        self.http = http
         self.client_id = os.getenv("GOOGLE_CLIENT_ID")
         self.client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
         self.redirect_uri = "https://opsflow-guardian.vercel.app/auth/callback"
-        self.secret_key = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
+        # Same signing key as the password login tokens so one verifier handles both
+        self.secret_key = settings.SECRET_KEY
         
         if not self.client_id or not self.client_secret:
             logger.warning("Google OAuth credentials not configured")
@@ -57,10 +61,9 @@ class GoogleOAuthService:
                 "redirect_uri": self.redirect_uri,
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(token_url, data=data)
-                response.raise_for_status()
-                return response.json()
+            response = await self.http.get(token_url).post(token_url, data=data)
+            response.raise_for_status()
+            return response.json()
                 
         except Exception as e:
             logger.error(f"Failed to exchange code for tokens: {e}")
@@ -146,10 +149,9 @@ class GoogleOAuthService:
         try:
             user_info_url = f"https://www.googleapis.com/oauth2/v1/userinfo?access_token={access_token}"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(user_info_url)
-                response.raise_for_status()
-                return response.json()
+            response = await self.http.get(user_info_url).get(user_info_url)
+            response.raise_for_status()
+            return response.json()
                 
         except Exception as e:
             logger.error(f"Failed to get user info: {e}")
@@ -0,0 +1,131 @@
+"""
+Shared outbound HTTP clients for OpsFlow Guardian 2.0
+One long-lived httpx.AsyncClient per upstream host, with keep-alive pooling,
+HTTP/2 where available and per-host latency instrumentation
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPClientRegistry:
+    """
+    Registry of pooled httpx clients keyed by origin (scheme://host:port).
+    Each host gets its own connection limits so one slow upstream cannot
+    starve the others. Clients are created on first use and closed on shutdown.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._host_stats: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url if "://" in url else f"https://{url}")
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def start(self, urls: List[Optional[str]]):
+        """Create clients for known upstreams up front (called at startup)"""
+        for url in urls:
+            if url:
+                self.get(url)
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """Get the shared client for the host of url"""
+        origin = self._origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = self._create_client(origin)
+            self._clients[origin] = client
+        return client
+
+    def _create_client(self, origin: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_PER_HOST,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+        logger.info(f"🌐 Creating pooled HTTP client for {origin} (http2={HTTP2_AVAILABLE})")
+        return httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=limits,
+            timeout=timeout,
+            event_hooks={
+                "request": [self._on_request],
+                "response": [self._on_response]
+            }
+        )
+
+    async def _on_request(self, request: httpx.Request):
+        request.extensions["opsflow_started"] = time.perf_counter()
+
+    async def _on_response(self, response: httpx.Response):
+        started = response.request.extensions.get("opsflow_started")
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        host = response.request.url.host
+        stats = self._host_stats.setdefault(host, {
+            "requests": 0,
+            "errors": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "http_versions": {}
+        })
+        stats["requests"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        if response.status_code >= 500:
+            stats["errors"] += 1
+        stats["http_versions"][response.http_version] = stats["http_versions"].get(response.http_version, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-host request counts and latency (time to response headers)"""
+        hosts = {}
+        for host, stats in self._host_stats.items():
+            hosts[host] = {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total_ms"] / stats["requests"], 2) if stats["requests"] else 0.0,
+                "max_ms": round(stats["max_ms"], 2),
+                "http_versions": dict(stats["http_versions"])
+            }
+        return {
+            "http2_available": HTTP2_AVAILABLE,
+            "open_clients": sum(1 for client in self._clients.values() if not client.is_closed),
+            "hosts": hosts
+        }
+
+    async def close(self):
+        """Close every pooled client"""
+        for origin, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP client for {origin}: {e}")
+        self._clients.clear()
+        logger.info("✅ HTTP clients closed")
+
+
+# Global registry instance
+http_clients = HTTPClientRegistry()
+
+
+def get_http_clients() -> HTTPClientRegistry:
+    """FastAPI dependency returning the shared HTTP client registry"""
+    return http_clients
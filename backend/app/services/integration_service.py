@@ -5,8 +5,8 @@ Handles connections to external tools and services
 
 import logging
 from typing import Dict, List, Any, Optional
-import httpx
 from app.core.config import settings
+from app.services.http_client import http_clients
 from app.services.gmail_service import gmail_service
 
 logger = logging.getLogger(__name__)
@@ -122,12 +122,12 @@ class IntegrationService:
     async def _test_slack_connection(self) -> bool:
         """Test Slack connection"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://slack.com/api/auth.test",
-                    headers={"Authorization": f"Bearer {settings.SLACK_BOT_TOKEN}"}
-                )
-                return response.status_code == 200 and response.json().get("ok", False)
+            url = "https://slack.com/api/auth.test"
+            response = await http_clients.get(url).get(
+                url,
+                headers={"Authorization": f"Bearer {settings.SLACK_BOT_TOKEN}"}
+            )
+            return response.status_code == 200 and response.json().get("ok", False)
         except Exception as e:
             logger.error(f"Slack connection test failed: {e}")
             return False
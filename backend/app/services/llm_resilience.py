@@ -0,0 +1,265 @@
+"""
+LLM call resilience for OpsFlow Guardian 2.0
+Per provider/model guard combining an AIMD adaptive concurrency limit,
+token-bucket request and token rate limits, jittered exponential retries and
+a circuit breaker, so provider 429s slow us down instead of failing everything
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# google.api_core exception names, matched by name so the SDK stays optional here
+_OVERLOAD_ERRORS = {"ResourceExhausted", "TooManyRequests"}
+_TRANSIENT_ERRORS = {"ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "GatewayTimeout", "Aborted"}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        self.retry_in = retry_in
+        super().__init__(f"Circuit open for {name}; retry in {retry_in:.0f}s")
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_overload(error: Exception) -> bool:
+    """The provider is asking us to slow down (429 / quota exhausted)"""
+    return type(error).__name__ in _OVERLOAD_ERRORS or _status_code(error) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    if is_overload(error) or type(error).__name__ in _TRANSIENT_ERRORS:
+        return True
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return _status_code(error) in (500, 502, 503, 504)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: +1 slot per window of successful calls,
+    halved on an overload signal, kept within [min_limit, max_limit]
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_overload(self):
+        self.limit = max(self.min_limit, self.limit / 2)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute; charge() may overdraw to settle actual usage"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Wait until `amount` units are available and take them; returns seconds waited"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:  # FIFO: later callers queue behind the one waiting
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def charge(self, amount: float):
+        """Adjust for usage known only after the call (negative refunds)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after reset_seconds"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> Tuple[bool, float]:
+        """(allowed, seconds until the next trial if not)"""
+        if self.state == "closed":
+            return True, 0.0
+        remaining = self.opened_at + self.reset_seconds - time.monotonic()
+        if remaining > 0:
+            return False, remaining
+        if self._trial_in_flight:
+            return False, self.reset_seconds
+        self.state = "half_open"
+        self._trial_in_flight = True
+        return True, 0.0
+
+    def release_trial(self):
+        """Free the half-open trial slot if its call ended without an outcome (e.g. cancelled)"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"⚠️ Circuit opened after {self.failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class LLMGuard:
+    """Everything a call to one provider/model goes through"""
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.limiter = AdaptiveLimiter(
+            settings.LLM_INITIAL_CONCURRENCY, settings.LLM_MIN_CONCURRENCY, max_concurrency
+        )
+        self.requests = TokenBucket(settings.LLM_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(settings.LLM_TOKENS_PER_MINUTE)
+        self.breaker = CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS)
+        self._stats = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "overloads": 0,
+            "short_circuited": 0,
+            "cancelled": 0,
+            "rate_limited_seconds": 0.0,
+        }
+
+    async def call(self, fn: Callable[[], Awaitable[T]], estimated_tokens: int = 0,
+                   usage: Optional[Callable[[T], Optional[int]]] = None, retries: Optional[int] = None) -> T:
+        """
+        Run fn under the guard, retrying retryable errors with full-jitter
+        exponential backoff (pass retries=0 for calls with side effects).
+        Raises CircuitOpenError without calling fn while the circuit is open.
+        `usage` reports actual tokens to settle the token budget.
+        """
+        max_retries = settings.LLM_MAX_RETRIES if retries is None else retries
+        allowed, retry_in = self.breaker.allow()
+        if not allowed:
+            self._stats["short_circuited"] += 1
+            raise CircuitOpenError(self.name, retry_in)
+
+        self._stats["calls"] += 1
+        try:
+            return await self._attempts(fn, estimated_tokens, usage, max_retries)
+        except asyncio.CancelledError:
+            self._stats["cancelled"] += 1
+            raise
+        finally:
+            # A cancelled trial records neither outcome; without this the circuit never closes
+            self.breaker.release_trial()
+
+    async def _attempts(self, fn: Callable[[], Awaitable[T]], estimated_tokens: int,
+                        usage: Optional[Callable[[T], Optional[int]]], max_retries: int) -> T:
+        attempt = 0
+        while True:
+            self._stats["rate_limited_seconds"] += await self.requests.acquire(1)
+            self._stats["rate_limited_seconds"] += await self.tokens.acquire(estimated_tokens)
+            try:
+                async with self.limiter:
+                    result = await fn()
+            except Exception as e:
+                if is_overload(e):
+                    self._stats["overloads"] += 1
+                    self.limiter.on_overload()
+                if not is_retryable(e) or attempt >= max_retries:
+                    self._stats["failed"] += 1
+                    if is_retryable(e):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()  # The provider answered; the request was bad
+                    raise
+                delay = random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt))
+                attempt += 1
+                self._stats["retries"] += 1
+                logger.warning(f"⚠️ {self.name} call failed ({type(e).__name__}); retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self.limiter.on_success()
+            self.breaker.record_success()
+            self._stats["succeeded"] += 1
+            if usage is not None:
+                actual = usage(result)
+                if actual:
+                    self.tokens.charge(actual - estimated_tokens)
+            return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "rate_limited_seconds": round(self._stats["rate_limited_seconds"], 2),
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "circuit": self.breaker.state,
+        }
+
+
+_guards: Dict[str, LLMGuard] = {}
+
+
+def get_guard(provider: str, model: str, max_concurrency: int) -> LLMGuard:
+    """Shared guard for a provider/model pair"""
+    name = f"{provider}:{model}"
+    guard = _guards.get(name)
+    if guard is None:
+        guard = _guards[name] = LLMGuard(name, max_concurrency)
+    return guard
+
+
+def get_guard_stats() -> Dict[str, Any]:
+    return {name: guard.get_stats() for name, guard in _guards.items()}
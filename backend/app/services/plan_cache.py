@@ -0,0 +1,245 @@
+"""
+Semantic workflow plan cache for OpsFlow Guardian 2.0
+Near-identical planning requests ("onboard new employee X") reuse a cached
+Gemini plan: an exact match on the normalized request template, else the most
+similar cached request by embedding. The planning prompt names the requesting
+user, so entries are scoped per user.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import math
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.workflow import WorkflowRequest
+from app.services.redis_service import RedisService, redis_service
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Awaitable[Optional[List[float]]]]
+
+# Request values that vary between otherwise identical requests. They are
+# replaced by placeholders in the cache key and substituted back on a hit.
+_QUOTED = re.compile(r"[\"']([^\"']{1,80})[\"']")
+_EMAIL = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")
+_PROPER_NOUN = re.compile(r"(?<![.!?]\s)(?<!^)\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b")
+# Capitalized tool and product names shape the plan, so they stay in the template
+_KNOWN_TERMS = {
+    "google", "workspace", "gmail", "sheets", "drive", "calendar", "docs", "slack", "notion", "jira",
+    "github", "confluence", "pagerduty", "docusign", "email", "api", "sql", "aws", "azure", "salesforce",
+}
+_NOISE = re.compile(r"[^\w<>\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def request_template(description: str) -> Tuple[str, List[List[str]]]:
+    """
+    Normalize a request description into a template and the [kind, value]
+    slots it abstracts: 'Onboard new employee Jane Doe (jane@acme.com)' becomes
+    'onboard new employee <name> <email>' with slots
+    [['name', 'Jane Doe'], ['email', 'jane@acme.com']].
+    """
+    slots: List[List[str]] = []
+
+    def capture(placeholder: str, keep_known: bool = False):
+        def replace(match: re.Match) -> str:
+            if keep_known and _KNOWN_TERMS.intersection(match.group(0).lower().split()):
+                return match.group(0)
+            slots.append([placeholder.strip("<>"), match.group(1) if match.groups() else match.group(0)])
+            return f" {placeholder} "
+        return replace
+
+    text = description.strip()
+    text = _QUOTED.sub(capture("<value>"), text)
+    text = _EMAIL.sub(capture("<email>"), text)
+    text = _PROPER_NOUN.sub(capture("<name>", keep_known=True), text)
+    text = _NOISE.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip(), slots
+
+
+def _slot_replacements(cached: Any, slots: List[List[str]]) -> Optional[Dict[str, str]]:
+    """
+    Map the cached request's slot values to the new request's, or None when
+    their slot kinds differ (the cached plan would keep the old values)
+    """
+    if not isinstance(cached, list) or not all(isinstance(slot, list) and len(slot) == 2 for slot in cached):
+        return None  # Entry written before slots carried their kind
+    if [kind for kind, _ in cached] != [kind for kind, _ in slots]:
+        return None
+    return {old: new for (_, old), (_, new) in zip(cached, slots) if old != new}
+
+
+def _substitute(value: Any, pattern: re.Pattern, replacements: Dict[str, str]) -> Any:
+    """Swap slot values in every string in one pass, so swapped values don't chain"""
+    if isinstance(value, str):
+        return pattern.sub(lambda match: replacements[match.group(0)], value)
+    if isinstance(value, list):
+        return [_substitute(item, pattern, replacements) for item in value]
+    if isinstance(value, dict):
+        return {key: _substitute(item, pattern, replacements) for key, item in value.items()}
+    return value
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class PlanCache:
+    """
+    Redis-backed plan cache.
+    - cache:plan:<user>:<fingerprint> holds the plan, the slots of the
+      request that produced it and its token cost (cache_set TTL)
+    - cache:plan_index:<user> is a hash of fingerprint -> template embedding,
+      scanned for similarity when there is no exact match
+    """
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self._stats = {
+            "exact_hits": 0,
+            "similar_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "saved_tokens": 0,
+            "errors": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return settings.PLAN_CACHE_ENABLED and self.redis.cache_client is not None
+
+    @staticmethod
+    def _scope(request: WorkflowRequest) -> str:
+        return str(request.user_id)
+
+    @staticmethod
+    def _fingerprint(template: str, request: WorkflowRequest) -> str:
+        """Everything besides the slot values that shapes the plan"""
+        key_material = json.dumps({
+            "template": template,
+            "user_id": str(request.user_id),
+            "priority": str(getattr(request.priority, "value", request.priority)),
+            "context": request.context or "",
+            "tools": sorted(request.requested_tools),
+            "model": settings.GEMINI_MODEL,
+        }, sort_keys=True)
+        return hashlib.sha256(key_material.encode()).hexdigest()[:32]
+
+    async def lookup(self, request: WorkflowRequest, embed: Optional[Embedder] = None) -> Optional[Dict[str, Any]]:
+        """Cached plan for this request with its slot values filled in, or None"""
+        if not self.enabled:
+            return None
+        try:
+            template, slots = request_template(request.description)
+            scope = self._scope(request)
+            fingerprint = self._fingerprint(template, request)
+
+            entry = await self.redis.cache_get(f"plan:{scope}:{fingerprint}")
+            kind = "exact_hits"
+            if entry is None and embed is not None:
+                entry = await self._similar_entry(scope, template, request, embed)
+                kind = "similar_hits"
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            replacements = _slot_replacements(entry.get("slots"), slots)
+            if replacements is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats[kind] += 1
+            self._stats["saved_tokens"] += entry.get("tokens", 0)
+            plan = copy.deepcopy(entry["plan"])
+            if replacements:
+                alternatives = sorted(map(re.escape, replacements), key=len, reverse=True)
+                plan = _substitute(plan, re.compile(rf"(?<!\w)(?:{'|'.join(alternatives)})(?!\w)"), replacements)
+            plan["cache"] = {"hit": kind[:-5], "cached_for": entry.get("description")}
+            return plan
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning(f"⚠️ Plan cache lookup failed: {e}")
+            return None
+
+    async def _similar_entry(self, scope: str, template: str, request: WorkflowRequest,
+                             embed: Embedder) -> Optional[Dict[str, Any]]:
+        index_key = f"cache:plan_index:{scope}"
+        index = await self.redis.cache_client.hgetall(index_key)
+        if not index:
+            return None
+        embedding = await embed(template)
+        if not embedding:
+            return None
+
+        best_fingerprint, best_score = None, settings.PLAN_CACHE_SIMILARITY_THRESHOLD
+        for fingerprint, raw in index.items():
+            candidate = json.loads(raw)
+            # Only requests that differ in wording, not in priority/context/tools
+            if candidate.get("shape") != self._fingerprint("", request):
+                continue
+            score = _cosine(embedding, candidate["embedding"])
+            if score >= best_score:
+                best_fingerprint, best_score = fingerprint, score
+        if best_fingerprint is None:
+            return None
+
+        entry = await self.redis.cache_get(f"plan:{scope}:{best_fingerprint}")
+        if entry is None:
+            await self.redis.cache_client.hdel(index_key, best_fingerprint)  # Entry expired
+        return entry
+
+    async def store(self, request: WorkflowRequest, plan: Dict[str, Any], tokens: int = 0,
+                    embed: Optional[Embedder] = None):
+        """Cache a freshly generated plan"""
+        if not self.enabled:
+            return
+        try:
+            template, slots = request_template(request.description)
+            scope = self._scope(request)
+            fingerprint = self._fingerprint(template, request)
+
+            await self.redis.cache_set(f"plan:{scope}:{fingerprint}", {
+                "plan": plan,
+                "slots": slots,
+                "description": request.description,
+                "tokens": tokens,
+            }, expire=settings.PLAN_CACHE_TTL)
+            self._stats["stores"] += 1
+
+            embedding = await embed(template) if embed is not None else None
+            if embedding:
+                index_key = f"cache:plan_index:{scope}"
+                index_entry = json.dumps({"embedding": embedding, "shape": self._fingerprint("", request)})
+                async with self.redis.cache_client.pipeline(transaction=False) as pipe:
+                    pipe.hset(index_key, fingerprint, index_entry)
+                    pipe.expire(index_key, settings.PLAN_CACHE_TTL)
+                    pipe.hlen(index_key)
+                    size = (await pipe.execute())[-1]
+                if size > settings.PLAN_CACHE_MAX_INDEX_ENTRIES:
+                    # Keep similarity scans cheap: start the index over
+                    async with self.redis.cache_client.pipeline(transaction=True) as pipe:
+                        pipe.delete(index_key)
+                        pipe.hset(index_key, fingerprint, index_entry)
+                        pipe.expire(index_key, settings.PLAN_CACHE_TTL)
+                        await pipe.execute()
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning(f"⚠️ Failed to cache workflow plan: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self._stats["exact_hits"] + self._stats["similar_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "enabled": self.enabled,
+        }
+
+
+# Global plan cache
+plan_cache = PlanCache()
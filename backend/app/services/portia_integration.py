@@ -23,9 +23,20 @@ from google.generativeai.types import GenerationConfig, SafetySetting, HarmCateg
 from pydantic import BaseModel, Field
 from fastapi import HTTPException
 
+from app.core.config import settings
+from app.core.state_store import StateStore
+from app.services.llm_resilience import CircuitOpenError, get_guard
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+TERMINAL_PLAN_STATUSES = ("completed", "complete", "failed", "cancelled")
+
+
+def _plan_finished(plan: Plan) -> bool:
+    status = getattr(plan, "status", None)
+    return str(getattr(status, "value", status)).lower() in TERMINAL_PLAN_STATUSES
+
 class OpsFlowPortiaManager:
     """
     Portia SDK manager for OpsFlow Guardian 2.0
@@ -36,7 +47,15 @@ class OpsFlowPortiaManager:
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
         self.portia_storage = MemoryStorage()  # Can be upgraded to Redis/PostgreSQL
         self.agents: Dict[str, Agent] = {}
-        self.active_plans: Dict[str, Plan] = {}
+        # Finished plans are evicted after a while instead of kept forever
+        self.active_plans = StateStore(
+            "portia_plans",
+            is_terminal=_plan_finished,
+            max_live=settings.STATE_STORE_MAX_LIVE,
+            max_terminal=settings.STATE_STORE_MAX_TERMINAL,
+            terminal_ttl=settings.STATE_STORE_TERMINAL_TTL
+        )
+        self.guard = get_guard("portia", settings.GEMINI_MODEL, settings.MAX_CONCURRENT_WORKFLOWS)
         
         # Initialize Gemini API
         if self.gemini_api_key:
@@ -158,7 +177,7 @@ class OpsFlowPortiaManager:
             )
             
             # Generate execution plan
-            plan = await agent.create_plan([user_message])
+            plan = await self.guard.call(lambda: agent.create_plan([user_message]))
             plan_id = str(uuid.uuid4())
             self.active_plans[plan_id] = plan
             
@@ -168,6 +187,8 @@ class OpsFlowPortiaManager:
                 plan=plan,
                 execution_context=execution_context
             )
+            # Re-assign so a finished plan moves to the evictable tier
+            self.active_plans[plan_id] = plan
             
             # Format response
             response = {
@@ -229,8 +250,8 @@ class OpsFlowPortiaManager:
         total_steps = len(plan.steps) if hasattr(plan, 'steps') else 1
         
         try:
-            # Execute the plan
-            result = await agent.execute_plan(plan)
+            # Execute the plan; tool calls have side effects, so it is never retried
+            result = await self.guard.call(lambda: agent.execute_plan(plan), retries=0)
             
             # Calculate execution metrics
             execution_time = (datetime.now() - start_time).total_seconds()
@@ -265,6 +286,7 @@ class OpsFlowPortiaManager:
             
         except Exception as e:
             execution_time = (datetime.now() - start_time).total_seconds()
+            reason = "provider_unavailable" if isinstance(e, CircuitOpenError) else "execution_failed"
             
             return {
                 "status": "failed",
@@ -273,7 +295,7 @@ class OpsFlowPortiaManager:
                 "execution_time": execution_time,
                 "error": str(e),
                 "requires_approval": True,  # Always require approval on error
-                "risk_assessment": {"level": "high", "reason": "execution_failed"}
+                "risk_assessment": {"level": "high", "reason": reason}
             }
     
     async def _create_portia_tools(self, tools_config: List[Dict[str, Any]]) -> List[Tool]:
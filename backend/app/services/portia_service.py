@@ -5,7 +5,8 @@ Handles multi-agent orchestration, workflow planning, and execution
 
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Callable
+from contextlib import aclosing
+from typing import Dict, List, Any, Optional, Callable, AsyncGenerator
 from datetime import datetime
 import json
 import uuid
@@ -13,14 +14,22 @@ import uuid
 from portia import Portia, Config, LLMProvider, StorageClass, DefaultToolRegistry
 
 from app.core.config import settings, get_llm_provider
+from app.core.state_store import StateStore
+from app.db.database import AsyncSessionLocal
+from app.db.execution_repository import ExecutionRepository
 from app.models.workflow import WorkflowRequest, WorkflowPlan, WorkflowExecution, WorkflowStep
 from app.models.agent import Agent, AgentRole, AgentStatus
 from app.services.redis_service import RedisService
 from app.services.integration_service import IntegrationService
 from app.services.gemini_service import GeminiService
+from app.services.execution_checkpoints import execution_checkpoints, step_idempotency_key
+from app.services.step_scheduler import build_step_graph, critical_path, step_scheduler
+from app.websocket.events import workflow_events
 
 logger = logging.getLogger(__name__)
 
+TERMINAL_EXECUTION_STATUSES = ("completed", "failed", "cancelled")
+
 
 class PortiaService:
     """Service for managing Portia SDK integration and multi-agent workflows"""
@@ -31,7 +40,15 @@ class PortiaService:
         self.redis_service = None
         self.integration_service = None
         self.agents: Dict[str, Agent] = {}
-        self.active_workflows: Dict[str, WorkflowExecution] = {}
+        # Finished executions are evicted; the full record stays in Redis/Postgres
+        self.active_workflows = StateStore(
+            "portia_executions",
+            is_terminal=lambda execution: execution.status in TERMINAL_EXECUTION_STATUSES,
+            max_live=settings.STATE_STORE_MAX_LIVE,
+            max_terminal=settings.STATE_STORE_MAX_TERMINAL,
+            terminal_ttl=settings.STATE_STORE_TERMINAL_TTL,
+            loader=self._load_execution
+        )
         self._initialized = False
     
     async def initialize(self):
@@ -265,6 +282,7 @@ class PortiaService:
                     risk_level=step_data.get("risk_level", "medium"),
                     requires_approval=step_data.get("requires_approval", False),
                     estimated_duration=step_data.get("estimated_duration", 10),
+                    dependencies=[str(dependency) for dependency in step_data.get("dependencies", [])],
                     status="pending",
                     metadata={
                         "success_criteria": step_data.get("success_criteria", "Step completes successfully"),
@@ -479,6 +497,7 @@ Be specific, actionable, and consider error scenarios with contingency plans.
                     risk_level=step_data.get("risk_level", "medium"),
                     requires_approval=step_data.get("requires_approval", False),
                     estimated_duration=step_data.get("estimated_duration", 10),
+                    dependencies=[str(dependency) for dependency in step_data.get("dependencies", [])],
                     status="pending",
                     metadata={
                         "success_criteria": step_data.get("success_criteria", "Step completes successfully"),
@@ -629,8 +648,10 @@ Be specific and actionable. Consider error scenarios and provide contingency pla
         risk_levels = {1: "low", 2: "medium", 3: "high"}
         return risk_levels[max_risk]
     
-    async def execute_workflow(self, plan: WorkflowPlan) -> WorkflowExecution:
+    async def execute_workflow(self, plan: WorkflowPlan, execution_id: Optional[str] = None) -> WorkflowExecution:
         """Execute an approved workflow plan"""
+        execution: Optional[WorkflowExecution] = None
+        workflow_id: Optional[str] = None
         try:
             logger.info(f"Starting execution of workflow plan {plan.id}")
             
@@ -641,7 +662,7 @@ Be specific and actionable. Consider error scenarios and provide contingency pla
             
             # Create workflow execution
             execution = WorkflowExecution(
-                id=str(uuid.uuid4()),
+                id=execution_id or str(uuid.uuid4()),
                 plan_id=plan.id,
                 status="running",
                 started_at=datetime.utcnow(),
@@ -650,47 +671,149 @@ Be specific and actionable. Consider error scenarios and provide contingency pla
                 step_results={}
             )
             
+            # Steps checkpointed by an earlier attempt are not run again
+            checkpoints = await execution_checkpoints.load(execution.id)
+            completed_steps = {step.id for step in plan.steps if step.id in checkpoints}
+            execution.step_results.update({step_id: checkpoints[step_id] for step_id in completed_steps})
+            execution.current_step_index = len(completed_steps)
+            if completed_steps:
+                execution_checkpoints.record_resumed(len(completed_steps))
+                logger.info(f"Resuming execution {execution.id}: {len(completed_steps)} steps already completed")
+            
             # Store execution
-            self.active_workflows[execution.id] = execution
-            await self.redis_service.set_json(f"execution:{execution.id}", execution.model_dump())
+            await self._save_execution(execution)
             
             # Update executor status
             executor.status = AgentStatus.WORKING
             await self.redis_service.set_json(f"agent:{executor.id}", executor.model_dump())
             
-            # Execute steps sequentially
-            for i, step in enumerate(plan.steps):
-                execution.current_step_index = i
-                await self._execute_step(execution, step)
-                
-                # Update progress
-                await self.redis_service.set_json(f"execution:{execution.id}", execution.model_dump())
+            workflow_id = plan.metadata.get("workflow_id", plan.id)
+            
+            # Build the step DAG up front so a cyclic plan fails before any step runs
+            step_graph = build_step_graph(plan.steps)
+            critical_minutes, critical_steps = critical_path(plan.steps, step_graph)
+            sequential_minutes = plan.calculate_total_duration()
+            logger.info(
+                f"Workflow {workflow_id}: critical path {critical_minutes}m "
+                f"vs {sequential_minutes}m sequential ({len(plan.steps)} steps)"
+            )
+            
+            await workflow_events.publish(workflow_id, "execution_started", {
+                "execution_id": execution.id,
+                "status": "running",
+                "progress": 0,
+                "total_steps": len(plan.steps),
+                "resumed_steps": len(completed_steps),
+                "critical_path_minutes": critical_minutes,
+                "critical_path": critical_steps,
+                "sequential_minutes": sequential_minutes
+            })
+            
+            async def run_step(step: WorkflowStep):
+                if step.id in completed_steps:
+                    await workflow_events.publish(workflow_id, "step_skipped", {
+                        "execution_id": execution.id,
+                        "step_id": step.id,
+                        "step_name": step.name,
+                        "step_order": step.step_order,
+                        "total_steps": len(plan.steps),
+                        "resumed": True
+                    })
+                    return
+                await self._execute_step(execution, step, workflow_id, len(plan.steps))
+                await execution_checkpoints.save(execution.id, step.id, execution.step_results[step.id])
+                await self._save_execution(execution)
+            
+            # Independent steps run concurrently as their dependencies complete
+            await step_scheduler.run(plan.steps, step_graph, run_step)
             
             # Mark execution as completed
             execution.status = "completed"
             execution.completed_at = datetime.utcnow()
+            await self._save_execution(execution)
             
             # Update executor status back to active
             executor.status = AgentStatus.ACTIVE
             await self.redis_service.set_json(f"agent:{executor.id}", executor.model_dump())
             
+            await workflow_events.publish(workflow_id, "execution_completed", {
+                "execution_id": execution.id,
+                "status": "completed",
+                "progress": 100
+            })
+            
             logger.info(f"Completed execution of workflow {execution.id}")
             return execution
             
         except Exception as e:
             logger.error(f"Failed to execute workflow: {e}")
-            if 'execution' in locals():
+            if execution is not None:
                 execution.status = "failed"
                 execution.error_message = str(e)
-                await self.redis_service.set_json(f"execution:{execution.id}", execution.model_dump())
+                await self._save_execution(execution)
+                if workflow_id is not None:
+                    await workflow_events.publish(workflow_id, "execution_failed", {
+                        "execution_id": execution.id,
+                        "status": "failed",
+                        "error": str(e)
+                    })
             raise
     
-    async def _execute_step(self, execution: WorkflowExecution, step: WorkflowStep):
-        """Execute a single workflow step"""
+    async def _save_execution(self, execution: WorkflowExecution):
+        """Track the execution in memory and snapshot it to Redis"""
+        # Re-assigned on every change so finished executions move to the evictable tier
+        self.active_workflows[execution.id] = execution
+        await self.redis_service.set_json(
+            f"execution:{execution.id}", execution.model_dump(), expire=settings.EXECUTION_STATUS_TTL
+        )
+    
+    async def _load_execution(self, execution_id: str) -> Optional[WorkflowExecution]:
+        """Rebuild an evicted execution from its Redis snapshot or its Postgres record"""
+        if self.redis_service:
+            execution_data = await self.redis_service.get_json(f"execution:{execution_id}")
+            if execution_data:
+                return WorkflowExecution(**execution_data)
+        try:
+            execution_uuid = uuid.UUID(execution_id)
+        except ValueError:
+            return None
+        async with AsyncSessionLocal() as db:
+            record = await ExecutionRepository(db).get(execution_uuid)
+        if record is None:
+            return None
+        status = (record.status or "").lower()
+        return WorkflowExecution(
+            id=execution_id,
+            plan_id=(record.input_data or {}).get("workflow_id", ""),
+            status=status if status in TERMINAL_EXECUTION_STATUSES else "running",
+            executed_by=record.executor_agent_id or "executor-001",
+            started_at=record.started_at or record.created_at,
+            completed_at=record.completed_at,
+            current_step_index=record.current_step or 0,
+            step_results={step["step_id"]: step for step in (record.step_details or []) if step.get("step_id")},
+            error_message=record.error_details
+        )
+    
+    async def _execute_step(self, execution: WorkflowExecution, step: WorkflowStep,
+                            workflow_id: str, total_steps: int):
+        """Execute a single workflow step, emitting progress events as it goes"""
+        step_event = {
+            "execution_id": execution.id,
+            "step_id": step.id,
+            "step_name": step.name,
+            "step_order": step.step_order,
+            "total_steps": total_steps
+        }
         try:
             logger.info(f"Executing step {step.name} for workflow {execution.id}")
             
             step_start_time = datetime.utcnow()
+            await workflow_events.publish(workflow_id, "step_started", {
+                **step_event,
+                "status": "running",
+                "current_step": step.name,
+                "progress": round(execution.get_progress_percentage(total_steps))
+            })
             
             # Simulate step execution (replace with actual integration calls)
             await self._simulate_step_execution(step)
@@ -701,10 +824,17 @@ Be specific and actionable. Consider error scenarios and provide contingency pla
                 "started_at": step_start_time.isoformat(),
                 "completed_at": datetime.utcnow().isoformat(),
                 "output": f"Successfully completed {step.name}",
-                "tools_used": step.tool_integrations
+                "tools_used": step.tool_integrations,
+                "idempotency_key": step_idempotency_key(execution.id, step.id)
             }
             
             execution.step_results[step.id] = step_result
+            execution.current_step_index = len(execution.step_results)
+            await workflow_events.publish(workflow_id, "step_completed", {
+                **step_event,
+                "status": "running",
+                "progress": round(execution.get_progress_percentage(total_steps))
+            })
             
         except Exception as e:
             logger.error(f"Failed to execute step {step.name}: {e}")
@@ -715,6 +845,7 @@ Be specific and actionable. Consider error scenarios and provide contingency pla
                 "failed_at": datetime.utcnow().isoformat()
             }
             execution.step_results[step.id] = step_result
+            await workflow_events.publish(workflow_id, "step_failed", {**step_event, "error": str(e)})
             raise
     
     async def _simulate_step_execution(self, step: WorkflowStep):
@@ -752,10 +883,7 @@ Be specific and actionable. Consider error scenarios and provide contingency pla
     async def get_workflow_execution(self, execution_id: str) -> Optional[WorkflowExecution]:
         """Get workflow execution details"""
         try:
-            execution_data = await self.redis_service.get_json(f"execution:{execution_id}")
-            if execution_data:
-                return WorkflowExecution(**execution_data)
-            return None
+            return await self.active_workflows.fetch(execution_id)
         except Exception as e:
             logger.error(f"Failed to get workflow execution: {e}")
             return None
@@ -776,6 +904,7 @@ Be specific and actionable. Consider error scenarios and provide contingency pla
                 "service_status": "active" if self.gemini_service._initialized else "initializing",
                 "connection_test": connection_test,
                 "model_info": model_info,
+                "requests": self.gemini_service.get_stats(),
                 "primary_ai": True
             }
         except Exception as e:
@@ -788,16 +917,75 @@ Be specific and actionable. Consider error scenarios and provide contingency pla
             if not self.gemini_service:
                 raise ValueError("Gemini service not available")
             
-            # Get context for the chat
-            context = {
-                "active_workflows": len(self.active_workflows),
-                "available_agents": list(self.agents.keys()),
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            
-            response = await self.gemini_service.chat_with_agent(message, agent_role, context)
+            response = await self.gemini_service.chat_with_agent(message, agent_role, self._chat_context())
             return response
             
         except Exception as e:
             logger.error(f"Failed to chat with Gemini agent: {e}")
             return f"Sorry, I encountered an error: {str(e)}"
+    
+    async def chat_with_gemini_agent_stream(self, message: str, agent_role: str) -> AsyncGenerator[str, None]:
+        """Chat with a Gemini-powered agent, yielding the reply as it is generated"""
+        if not self.gemini_service:
+            raise ValueError("Gemini service not available")
+        stream = self.gemini_service.chat_with_agent_stream(message, agent_role, self._chat_context())
+        async with aclosing(stream) as chunks:
+            async for chunk in chunks:
+                yield chunk
+    
+    def _chat_context(self) -> Dict[str, Any]:
+        """Context for agent chats"""
+        return {
+            "active_workflows": len(self.active_workflows.live),
+            "available_agents": list(self.agents.keys()),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+
+# Global Portia service instance
+portia_service = PortiaService()
+
+
+def plan_from_job(job: Dict[str, Any]) -> WorkflowPlan:
+    """Rebuild a WorkflowPlan from a queued execution job"""
+    plan_id = job["workflow_id"]
+    steps = [
+        WorkflowStep(
+            # Ids must be stable across attempts for checkpoints to match
+            id=step.get("id") or f"step-{index + 1}",
+            plan_id=plan_id,
+            name=step.get("name", f"Step {index + 1}"),
+            description=step.get("description", ""),
+            step_order=index + 1,
+            tool_integrations=step.get("tool_integrations", step.get("tools_used", [])),
+            dependencies=[str(dependency) for dependency in step.get("dependencies", [])],
+            estimated_duration=step.get("estimated_duration", 5)
+        )
+        for index, step in enumerate(job.get("steps", []))
+    ]
+    return WorkflowPlan(
+        id=plan_id,
+        request_id=job["execution_id"],
+        name=job.get("name", ""),
+        description=job.get("description", ""),
+        created_by=str(job.get("requested_by", "")),
+        steps=steps,
+        metadata={"workflow_id": plan_id}
+    )
+
+
+async def execute_workflow_job(job: Dict[str, Any]):
+    """Execution queue handler: run a queued workflow through the executor"""
+    execution_id = job["execution_id"]
+    await execution_checkpoints.mark(execution_id, "RUNNING")
+    try:
+        await portia_service.initialize()
+        execution = await portia_service.execute_workflow(plan_from_job(job), execution_id=execution_id)
+    except Exception as e:
+        # Earlier attempts stay RUNNING so the recovery sweeper still sees them
+        if job.get("attempt", 0) >= job.get("max_retries", 3):
+            await execution_checkpoints.mark(execution_id, "FAILED", error_details=str(e))
+        raise
+    await execution_checkpoints.mark(
+        execution_id, "COMPLETED", output_data={"step_results": execution.step_results}
+    )
@@ -0,0 +1,108 @@
+"""
+Token-budgeted prompt building for OpsFlow Guardian 2.0
+Compacts JSON payloads before they go into Gemini prompts: no indentation,
+noise fields projected away, long values truncated and repeated audit events
+collapsed into one entry with a count. Event lists that still exceed the
+budget are split into chunks for map-reduce summarization.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Identifiers and request metadata that cost tokens without informing a summary
+_EVENT_NOISE_FIELDS = {
+    "audit_uuid", "company_id", "ip_address", "user_agent", "session_id", "search_vector",
+}
+# Fields that differ between otherwise identical events
+_EVENT_VOLATILE_FIELDS = {"id", "timestamp", "created_at", "updated_at", "event_id", "request_id"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting"""
+    return (len(text) + 3) // 4
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _shrink(value: Any, max_chars: int, max_items: int) -> Any:
+    """Drop empty values, truncate long strings and cap list lengths, recursively"""
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars] + f"…(+{len(value) - max_chars} chars)"
+    if isinstance(value, dict):
+        return {
+            key: _shrink(item, max_chars, max_items)
+            for key, item in value.items()
+            if item not in (None, "", [], {})
+        }
+    if isinstance(value, (list, tuple)):
+        items = [_shrink(item, max_chars, max_items) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"…(+{len(value) - max_items} more)")
+        return items
+    return value
+
+
+def compact_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Project audit events down to the fields worth summarizing and collapse
+    repeats (same event apart from ids/timestamps) into one entry carrying
+    count, first_seen and last_seen.
+    """
+    compacted: Dict[str, Dict[str, Any]] = {}
+    for event in events:
+        projected = _shrink(
+            {key: value for key, value in event.items() if key not in _EVENT_NOISE_FIELDS},
+            settings.PROMPT_MAX_FIELD_CHARS, settings.PROMPT_MAX_LIST_ITEMS
+        )
+        timestamp = projected.get("timestamp") or projected.get("created_at")
+        signature = compact_json({k: v for k, v in projected.items() if k not in _EVENT_VOLATILE_FIELDS})
+        existing = compacted.get(signature)
+        if existing is None:
+            compacted[signature] = projected
+            continue
+        existing["count"] = existing.get("count", 1) + 1
+        existing.setdefault("first_seen", existing.get("timestamp") or existing.get("created_at"))
+        if timestamp is not None:
+            existing["last_seen"] = timestamp
+    return list(compacted.values())
+
+
+def chunk_events(events: List[Dict[str, Any]], budget: int) -> List[List[Dict[str, Any]]]:
+    """Split events into consecutive chunks whose compact JSON fits the token budget"""
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for event in events:
+        tokens = estimate_tokens(compact_json(event)) + 1
+        if current and used + tokens > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(event)
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def compact_context(context: Dict[str, Any], budget: Optional[int] = None) -> str:
+    """
+    Compact JSON for a chat context within the token budget, truncating
+    values progressively harder until it fits
+    """
+    budget = budget or settings.CHAT_CONTEXT_TOKEN_BUDGET
+    max_chars, max_items = settings.PROMPT_MAX_FIELD_CHARS, settings.PROMPT_MAX_LIST_ITEMS
+    text = compact_json(_shrink(context, max_chars, max_items))
+    while estimate_tokens(text) > budget and (max_chars > 16 or max_items > 1):
+        max_chars, max_items = max(16, max_chars // 2), max(1, max_items // 2)
+        text = compact_json(_shrink(context, max_chars, max_items))
+    if estimate_tokens(text) > budget:
+        logger.warning(f"⚠️ Chat context still ~{estimate_tokens(text)} tokens after compaction; truncating")
+        text = text[:budget * 4]
+    return text
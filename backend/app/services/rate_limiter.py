@@ -0,0 +1,139 @@
+"""
+Distributed rate limiter for OpsFlow Guardian 2.0
+GCRA (generic cell rate algorithm) evaluated atomically in Redis, with a
+bounded in-process fallback when Redis is unavailable
+"""
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.redis_service import RedisService, redis_service
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = limiter key
+# ARGV[1] = emission interval in ms (period / limit)
+# ARGV[2] = period in ms (burst tolerance: up to `limit` requests back to back)
+# Returns {allowed, remaining, retry_after_ms, reset_ms}
+GCRA_LUA = """
+if redis.replicate_commands then redis.replicate_commands() end
+local emission = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+local remaining = math.floor((period - (new_tat - now)) / emission)
+return {1, remaining, 0, math.ceil(new_tat - now)}
+"""
+
+
+class RateLimiter:
+    """
+    GCRA rate limiter. Each key may make `limit` requests per `period` seconds,
+    with bursts up to `limit`. State is a single timestamp per key, stored in
+    Redis with a TTL so idle keys expire on their own. If Redis fails, decisions
+    fall back to an LRU-bounded in-process table until Redis recovers.
+    """
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self._script = None
+        self._local_tat: "OrderedDict[str, float]" = OrderedDict()
+        self._local_max_keys = settings.RATE_LIMIT_LOCAL_MAX_KEYS
+        self._redis_retry_at = 0.0
+        self._stats = {
+            "allowed": 0,
+            "limited": 0,
+            "redis_decisions": 0,
+            "local_decisions": 0,
+            "redis_errors": 0,
+        }
+
+    async def check(self, key: str, limit: int, period: int) -> Dict[str, Any]:
+        """Consume one request for key and return the decision"""
+        emission_ms = period * 1000 / limit
+        period_ms = period * 1000
+
+        result = None
+        if self.redis.redis_client is not None and time.monotonic() >= self._redis_retry_at:
+            result = await self._check_redis(key, emission_ms, period_ms)
+        if result is None:
+            result = self._check_local(key, emission_ms, period_ms)
+            self._stats["local_decisions"] += 1
+        else:
+            self._stats["redis_decisions"] += 1
+
+        allowed, remaining, retry_after_ms, reset_ms = result
+        self._stats["allowed" if allowed else "limited"] += 1
+        return {
+            "allowed": bool(allowed),
+            "limit": limit,
+            "remaining": max(0, int(remaining)),
+            "retry_after": math.ceil(retry_after_ms / 1000),
+            "reset": math.ceil(reset_ms / 1000),
+        }
+
+    async def _check_redis(self, key: str, emission_ms: float, period_ms: int):
+        try:
+            if self._script is None:
+                self._script = self.redis.redis_client.register_script(GCRA_LUA)
+            return await self._script(keys=[f"ratelimit:{key}"], args=[emission_ms, period_ms])
+        except Exception as e:
+            self._stats["redis_errors"] += 1
+            # Don't pay a Redis timeout on every request while it is down
+            self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY_SECONDS
+            logger.warning(f"⚠️ Redis rate limiter unavailable, using in-process fallback: {e}")
+            return None
+
+    def _check_local(self, key: str, emission_ms: float, period_ms: int):
+        """Same GCRA decision against the in-process LRU table"""
+        now = time.time() * 1000
+        tat = max(self._local_tat.get(key, now), now)
+        new_tat = tat + emission_ms
+        allow_at = new_tat - period_ms
+        if now < allow_at:
+            return 0, 0, allow_at - now, tat - now
+
+        self._local_tat[key] = new_tat
+        self._local_tat.move_to_end(key)
+        while len(self._local_tat) > self._local_max_keys:
+            self._local_tat.popitem(last=False)
+        remaining = (period_ms - (new_tat - now)) // emission_ms
+        return 1, remaining, 0, new_tat - now
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "local_keys": len(self._local_tat),
+            "redis_degraded": time.monotonic() < self._redis_retry_at,
+        }
+
+
+def parse_quota(quota: str) -> Optional[tuple]:
+    """Parse a "<requests>/<seconds>" quota string"""
+    try:
+        limit, period = quota.split("/")
+        return int(limit), int(period)
+    except (ValueError, AttributeError):
+        logger.error(f"Invalid rate limit quota: {quota}")
+        return None
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter()
@@ -19,6 +19,8 @@ class RedisService:
         self.redis_client: Optional[redis.Redis] = None
         self.cache_client: Optional[redis.Redis] = None
         self._initialized = False
+        # Clients are created before the ping, so their presence doesn't mean Redis is up
+        self.connected = False
     
     async def initialize(self):
         """Initialize Redis connections"""
@@ -57,6 +59,7 @@ class RedisService:
             await self.redis_client.ping()
             await self.cache_client.ping()
             
+            self.connected = True
             self._initialized = True
             logger.info("Redis service initialized successfully")
             
@@ -66,6 +69,7 @@ class RedisService:
     
     async def close(self):
         """Close Redis connections"""
+        self.connected = False
         try:
             if self.redis_client:
                 await self.redis_client.close()
@@ -317,6 +321,14 @@ class RedisService:
             logger.error(f"Failed to publish to channel {channel}: {e}")
             return 0
     
+    async def publish_raw(self, channel: str, message: str) -> int:
+        """Publish an already-serialized message to a channel"""
+        try:
+            return await self.redis_client.publish(channel, message)
+        except Exception as e:
+            logger.error(f"Failed to publish to channel {channel}: {e}")
+            return 0
+    
     async def subscribe(self, channel: str):
         """Subscribe to a channel"""
         try:
@@ -326,3 +338,7 @@ class RedisService:
         except Exception as e:
             logger.error(f"Failed to subscribe to channel {channel}: {e}")
             return None
+
+
+# Global Redis service instance (initialized at application startup)
+redis_service = RedisService()
@@ -0,0 +1,162 @@
+"""
+DAG-aware step scheduler for OpsFlow Guardian 2.0
+Builds a dependency graph from workflow steps, rejects cycles up front and
+runs independent steps concurrently under per-workflow and global limits
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.workflow import WorkflowStep
+
+logger = logging.getLogger(__name__)
+
+StepRunner = Callable[[WorkflowStep], Awaitable[Any]]
+
+
+class WorkflowCycleError(ValueError):
+    """Raised when step dependencies form a cycle"""
+
+    def __init__(self, cycle: List[str]):
+        self.cycle = cycle
+        super().__init__(f"Workflow steps have a dependency cycle: {' -> '.join(cycle)}")
+
+
+def build_step_graph(steps: List[WorkflowStep]) -> Dict[str, List[str]]:
+    """
+    Map each step id to the ids of the steps it depends on.
+    Dependencies may name a step id or a step number (the planner emits step
+    numbers); unresolvable references are ignored with a warning.
+    """
+    by_id = {step.id: step for step in steps}
+    by_number = {str(step.step_order): step.id for step in steps}
+
+    graph: Dict[str, List[str]] = {}
+    for step in steps:
+        resolved = []
+        for dependency in step.dependencies:
+            dependency_id = dependency if dependency in by_id else by_number.get(str(dependency))
+            if dependency_id is None or dependency_id == step.id:
+                logger.warning(f"⚠️ Ignoring unknown dependency {dependency!r} of step {step.name}")
+                continue
+            if dependency_id not in resolved:
+                resolved.append(dependency_id)
+        graph[step.id] = resolved
+
+    topological_order(graph)  # Fail fast on cycles
+    return graph
+
+
+def topological_order(graph: Dict[str, List[str]]) -> List[str]:
+    """Kahn's algorithm; raises WorkflowCycleError if the graph has a cycle"""
+    remaining = {step_id: len(dependencies) for step_id, dependencies in graph.items()}
+    dependents: Dict[str, List[str]] = {step_id: [] for step_id in graph}
+    for step_id, dependencies in graph.items():
+        for dependency_id in dependencies:
+            dependents[dependency_id].append(step_id)
+
+    ready = [step_id for step_id, count in remaining.items() if count == 0]
+    order = []
+    while ready:
+        step_id = ready.pop()
+        order.append(step_id)
+        for dependent in dependents[step_id]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+
+    if len(order) < len(graph):
+        raise WorkflowCycleError(_find_cycle(graph, {step_id for step_id, count in remaining.items() if count}))
+    return order
+
+
+def _find_cycle(graph: Dict[str, List[str]], candidates: set) -> List[str]:
+    """Walk dependencies among unscheduled steps until a step repeats"""
+    path: List[str] = []
+    seen: Dict[str, int] = {}
+    step_id = next(iter(candidates))
+    while step_id not in seen:
+        seen[step_id] = len(path)
+        path.append(step_id)
+        step_id = next(dep for dep in graph[step_id] if dep in candidates)
+    return path[seen[step_id]:] + [step_id]
+
+
+def critical_path(steps: List[WorkflowStep], graph: Dict[str, List[str]]) -> Tuple[int, List[str]]:
+    """Longest chain of estimated_duration through the DAG: (minutes, step ids)"""
+    durations = {step.id: step.estimated_duration for step in steps}
+    finish: Dict[str, int] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for step_id in topological_order(graph):
+        longest = max(graph[step_id], key=lambda dep: finish[dep], default=None)
+        previous[step_id] = longest
+        finish[step_id] = (finish[longest] if longest else 0) + durations[step_id]
+
+    if not finish:
+        return 0, []
+    step_id = max(finish, key=finish.get)
+    total = finish[step_id]
+    path = []
+    while step_id is not None:
+        path.append(step_id)
+        step_id = previous[step_id]
+    return total, list(reversed(path))
+
+
+class StepScheduler:
+    """
+    Runs a workflow's steps as soon as their dependencies complete.
+    Concurrency is bounded per workflow (max_parallel) and across every
+    workflow in the process (the shared global semaphore). The first failing
+    step cancels the steps still running and its error is re-raised.
+    """
+
+    def __init__(self, global_limit: int):
+        self._global = asyncio.Semaphore(global_limit)
+        self.global_limit = global_limit
+        self._running = 0
+
+    async def run(self, steps: List[WorkflowStep], graph: Dict[str, List[str]], run_step: StepRunner,
+                  max_parallel: Optional[int] = None):
+        max_parallel = max(1, max_parallel or settings.WORKFLOW_MAX_PARALLEL_STEPS)
+        by_id = {step.id: step for step in steps}
+        waiting = {step_id: set(dependencies) for step_id, dependencies in graph.items()}
+        # Keep plan order among steps that become ready together
+        order = {step.id: index for index, step in enumerate(steps)}
+        in_flight: Dict[asyncio.Task, str] = {}
+
+        try:
+            while waiting or in_flight:
+                ready = sorted((step_id for step_id, deps in waiting.items() if not deps), key=order.get)
+                for step_id in ready[:max(0, max_parallel - len(in_flight))]:
+                    del waiting[step_id]
+                    in_flight[asyncio.create_task(self._run_one(by_id[step_id], run_step))] = step_id
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    step_id = in_flight.pop(task)
+                    task.result()  # Re-raise the step's failure
+                    for deps in waiting.values():
+                        deps.discard(step_id)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def _run_one(self, step: WorkflowStep, run_step: StepRunner):
+        async with self._global:
+            self._running += 1
+            try:
+                return await run_step(step)
+            finally:
+                self._running -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"running_steps": self._running, "global_limit": self.global_limit}
+
+
+# Shared scheduler so the global step limit applies across executions
+step_scheduler = StepScheduler(settings.WORKFLOW_GLOBAL_STEP_CONCURRENCY)
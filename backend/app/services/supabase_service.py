@@ -6,22 +6,36 @@ Provides additional utilities for working with Supabase features
 import os
 import logging
 from typing import Optional, Dict, Any, List
-import httpx
 from datetime import datetime, timedelta
 import asyncio
 
+from app.core.config import settings
+from app.services.audit_buffer import AuditEventBuffer
+from app.services.http_client import HTTPClientRegistry, http_clients
+
 logger = logging.getLogger(__name__)
 
 class SupabaseService:
     """Service for interacting with Supabase-specific features"""
     
-    def __init__(self):
+    def __init__(self, http: HTTPClientRegistry = http_clients):
+        self.http = http
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_anon_key = os.getenv("SUPABASE_ANON_KEY")
         self.supabase_service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
         
         if not all([self.supabase_url, self.supabase_anon_key]):
             logger.warning("Supabase credentials not fully configured - some features may not work")
+        
+        # Audit events are buffered and written in bulk instead of one POST each
+        self.audit_buffer = AuditEventBuffer(
+            self._write_audit_batch,
+            max_size=settings.AUDIT_BUFFER_MAX_SIZE,
+            batch_size=settings.AUDIT_BUFFER_BATCH_SIZE,
+            flush_interval=settings.AUDIT_BUFFER_FLUSH_INTERVAL,
+            enqueue_timeout=settings.AUDIT_BUFFER_ENQUEUE_TIMEOUT,
+            retry_delay=settings.AUDIT_BUFFER_RETRY_DELAY
+        )
     
     def get_headers(self, use_service_key: bool = False) -> Dict[str, str]:
         """Get headers for Supabase API requests"""
@@ -39,18 +53,18 @@ class SupabaseService:
             return None
             
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.supabase_url}/rest/v1/users",
-                    headers=self.get_headers(use_service_key=True),
-                    json=user_data
-                )
-                
-                if response.status_code == 201:
-                    return response.json()[0]
-                else:
-                    logger.error(f"Failed to create user profile: {response.text}")
-                    return None
+            client = self.http.get(self.supabase_url)
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/users",
+                headers=self.get_headers(use_service_key=True),
+                json=user_data
+            )
+
+            if response.status_code == 201:
+                return response.json()[0]
+            else:
+                logger.error(f"Failed to create user profile: {response.text}")
+                return None
                     
         except Exception as e:
             logger.error(f"Error creating user profile: {e}")
@@ -62,18 +76,18 @@ class SupabaseService:
             return None
             
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.supabase_url}/rest/v1/users?email=eq.{email}&select=*",
-                    headers=self.get_headers(use_service_key=True)
-                )
-                
-                if response.status_code == 200:
-                    users = response.json()
-                    return users[0] if users else None
-                else:
-                    logger.error(f"Failed to get user by email: {response.text}")
-                    return None
+            client = self.http.get(self.supabase_url)
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/users?email=eq.{email}&select=*",
+                headers=self.get_headers(use_service_key=True)
+            )
+
+            if response.status_code == 200:
+                users = response.json()
+                return users[0] if users else None
+            else:
+                logger.error(f"Failed to get user by email: {response.text}")
+                return None
                     
         except Exception as e:
             logger.error(f"Error getting user by email: {e}")
@@ -85,43 +99,62 @@ class SupabaseService:
             return False
             
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.patch(
-                    f"{self.supabase_url}/rest/v1/users?user_uuid=eq.{user_uuid}",
-                    headers=self.get_headers(use_service_key=True),
-                    json={"last_login": datetime.utcnow().isoformat()}
-                )
-                
-                return response.status_code == 200
+            client = self.http.get(self.supabase_url)
+            response = await client.patch(
+                f"{self.supabase_url}/rest/v1/users?user_uuid=eq.{user_uuid}",
+                headers=self.get_headers(use_service_key=True),
+                json={"last_login": datetime.utcnow().isoformat()}
+            )
+
+            return response.status_code == 200
                 
         except Exception as e:
             logger.error(f"Error updating user login: {e}")
             return False
     
     async def log_audit_event(self, event_data: Dict[str, Any]) -> bool:
-        """Log an audit event to Supabase"""
+        """Queue an audit event for the next bulk write to Supabase"""
         if not self.supabase_url:
             return False
             
+        # Ensure required fields
+        event_data.setdefault("created_at", datetime.utcnow().isoformat())
+        event_data.setdefault("severity", "info")
+        event_data.setdefault("compliance_status", "compliant")
+        
+        return await self.audit_buffer.enqueue(event_data)
+    
+    async def _write_audit_batch(self, events: List[Dict[str, Any]]) -> bool:
+        """Insert a batch of audit events with a single PostgREST array POST"""
+        # Event shapes differ: name the union of columns and let PostgREST apply
+        # column defaults to keys a row lacks (instead of padding them with NULL)
+        columns = sorted(set().union(*(event.keys() for event in events)))
+        
         try:
-            # Ensure required fields
-            event_data.setdefault("created_at", datetime.utcnow().isoformat())
-            event_data.setdefault("severity", "info")
-            event_data.setdefault("compliance_status", "compliant")
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.supabase_url}/rest/v1/audit_events",
-                    headers=self.get_headers(use_service_key=True),
-                    json=event_data
-                )
-                
-                return response.status_code == 201
+            client = self.http.get(self.supabase_url)
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/audit_events",
+                params={"columns": ",".join(columns)},
+                headers={
+                    **self.get_headers(use_service_key=True),
+                    "Prefer": "return=minimal,missing=default"
+                },
+                json=events
+            )
+
+            if response.status_code == 201:
+                return True
+            logger.error(f"Failed to write {len(events)} audit events: {response.text}")
+            return False
                 
         except Exception as e:
-            logger.error(f"Error logging audit event: {e}")
+            logger.error(f"Error writing audit batch: {e}")
             return False
     
+    async def flush_audit_events(self):
+        """Flush buffered audit events (call on shutdown)"""
+        await self.audit_buffer.close()
+    
     async def get_realtime_connection_url(self) -> Optional[str]:
         """Get WebSocket URL for Supabase Realtime"""
         if not self.supabase_url:
@@ -158,21 +191,21 @@ class SupabaseService:
             return None
             
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.supabase_url}/storage/v1/object/{bucket}/{path}",
-                    headers={
-                        **self.get_headers(use_service_key=True),
-                        "Content-Type": content_type
-                    },
-                    content=file_data
-                )
-                
-                if response.status_code == 200:
-                    return self.get_storage_url(bucket, path)
-                else:
-                    logger.error(f"Failed to upload file: {response.text}")
-                    return None
+            client = self.http.get(self.supabase_url)
+            response = await client.post(
+                f"{self.supabase_url}/storage/v1/object/{bucket}/{path}",
+                headers={
+                    **self.get_headers(use_service_key=True),
+                    "Content-Type": content_type
+                },
+                content=file_data
+            )
+
+            if response.status_code == 200:
+                return self.get_storage_url(bucket, path)
+            else:
+                logger.error(f"Failed to upload file: {response.text}")
+                return None
                     
         except Exception as e:
             logger.error(f"Error uploading file: {e}")
@@ -187,29 +220,29 @@ class SupabaseService:
             }
         
         try:
-            async with httpx.AsyncClient() as client:
-                # Test REST API
-                response = await client.get(
-                    f"{self.supabase_url}/rest/v1/",
-                    headers=self.get_headers()
-                )
-                
-                if response.status_code == 200:
-                    return {
-                        "status": "healthy",
-                        "message": "Supabase connection successful",
-                        "features": {
-                            "database": True,
-                            "auth": bool(self.supabase_anon_key),
-                            "storage": True,
-                            "realtime": True
-                        }
-                    }
-                else:
-                    return {
-                        "status": "unhealthy",
-                        "message": f"Supabase connection failed: {response.status_code}"
+            client = self.http.get(self.supabase_url)
+            # Test REST API
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/",
+                headers=self.get_headers()
+            )
+
+            if response.status_code == 200:
+                return {
+                    "status": "healthy",
+                    "message": "Supabase connection successful",
+                    "features": {
+                        "database": True,
+                        "auth": bool(self.supabase_anon_key),
+                        "storage": True,
+                        "realtime": True
                     }
+                }
+            else:
+                return {
+                    "status": "unhealthy",
+                    "message": f"Supabase connection failed: {response.status_code}"
+                }
                     
         except Exception as e:
             return {
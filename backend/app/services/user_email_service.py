@@ -140,8 +140,12 @@ class UserEmailService:
         
         return await self._send_email(recipient_email, subject, html_content)
     
-    async def test_connection(self) -> bool:
-        """Test the email connection"""
+    async def test_connection(self, commit: bool = True) -> bool:
+        """Test the email connection
+        
+        Pass commit=False when the session is owned by an AsyncSession
+        (via run_sync) so the caller can commit it asynchronously.
+        """
         if not self.is_configured():
             return False
         
@@ -158,7 +162,8 @@ class UserEmailService:
                 # Update last tested timestamp
                 self.email_config.last_tested = datetime.utcnow()
                 self.email_config.is_verified = True
-                self.db.commit()
+                if commit:
+                    self.db.commit()
                 
             return success
             
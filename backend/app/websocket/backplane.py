@@ -0,0 +1,136 @@
+"""
+Redis pub/sub backplane for OpsFlow Guardian 2.0 WebSockets
+Fans events out to every worker so clients connected anywhere receive them
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from app.services.redis_service import RedisService, redis_service
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "opsflow:ws:"
+BROADCAST_CHANNEL = "broadcast"
+EVENTS_CHANNEL = "events"  # Topic-routed events; receivers filter by subscription
+
+# deliver(channel, message_text, coalesce_key, topics)
+DeliverCallback = Callable[[str, str, Optional[str], Tuple[str, ...]], Awaitable[None]]
+
+
+class RedisBackplane:
+    """
+    Relays serialized WebSocket messages between workers over Redis pub/sub.
+    A worker only subscribes to channels it has local listeners for. Payloads
+    are "<origin worker id>|<coalesce key>|<topics>|<message>" with topics
+    comma-separated: the JSON is encoded once
+    by the publisher and forwarded verbatim, and the origin skips its own
+    messages because it has already delivered them locally.
+    """
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._deliver: Optional[DeliverCallback] = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._channel_refs: Dict[str, int] = {}
+        self._stats = {"published": 0, "received": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._pubsub is not None
+
+    async def start(self, deliver: DeliverCallback):
+        """Start relaying; deliver is called for messages from other workers"""
+        self._deliver = deliver
+        if self.redis.redis_client is None:
+            logger.warning("⚠️ Redis not available - WebSocket events stay on this worker")
+            return
+        try:
+            self._pubsub = self.redis.redis_client.pubsub()
+            # Every worker hears broadcasts and events; user channels follow local interest
+            channels = {BROADCAST_CHANNEL, EVENTS_CHANNEL, *self._channel_refs}
+            await self._pubsub.subscribe(*(CHANNEL_PREFIX + channel for channel in channels))
+            self._listener = asyncio.create_task(self._listen())
+            logger.info(f"📡 WebSocket backplane started (worker {self.worker_id})")
+        except Exception as e:
+            logger.error(f"Failed to start WebSocket backplane: {e}")
+            self._pubsub = None
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub:
+            try:
+                await self._pubsub.aclose()
+            except Exception as e:
+                logger.error(f"Error closing WebSocket backplane: {e}")
+            self._pubsub = None
+
+    async def add_interest(self, channel: str):
+        """Subscribe to a channel when the first local listener appears"""
+        self._channel_refs[channel] = self._channel_refs.get(channel, 0) + 1
+        if self._channel_refs[channel] == 1 and self._pubsub is not None:
+            try:
+                await self._pubsub.subscribe(CHANNEL_PREFIX + channel)
+            except Exception as e:
+                logger.error(f"Failed to subscribe to {channel}: {e}")
+
+    async def remove_interest(self, channel: str):
+        """Unsubscribe from a channel when its last local listener leaves"""
+        refs = self._channel_refs.get(channel, 0) - 1
+        if refs > 0:
+            self._channel_refs[channel] = refs
+            return
+        self._channel_refs.pop(channel, None)
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(CHANNEL_PREFIX + channel)
+            except Exception as e:
+                logger.error(f"Failed to unsubscribe from {channel}: {e}")
+
+    async def publish(self, channel: str, message_text: str, coalesce_key: Optional[str] = None,
+                      topics: Iterable[str] = ()):
+        """Send a serialized message to the other workers"""
+        if self._pubsub is None:
+            return
+        self._stats["published"] += 1
+        payload = f"{self.worker_id}|{coalesce_key or ''}|{','.join(topics)}|{message_text}"
+        await self.redis.publish_raw(CHANNEL_PREFIX + channel, payload)
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                origin, coalesce_key, topics, message_text = message["data"].split("|", 3)
+                if origin == self.worker_id:
+                    continue
+                self._stats["received"] += 1
+                channel = message["channel"][len(CHANNEL_PREFIX):]
+                await self._deliver(
+                    channel, message_text, coalesce_key or None, tuple(topics.split(",")) if topics else ()
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket backplane error: {e}")
+                await asyncio.sleep(1)
+
+    def get_stats(self):
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "worker_id": self.worker_id,
+            "channels": len(self._channel_refs),
+        }
@@ -0,0 +1,133 @@
+"""
+Per-connection outbound queue for OpsFlow Guardian 2.0 WebSockets
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Close code sent to clients that cannot keep up (RFC 6455 "Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ClientConnection:
+    """
+    One WebSocket with a bounded outbound queue drained by its own writer task.
+    Producers call enqueue() without awaiting the network, so a slow client only
+    delays itself. The slow-consumer policy decides what happens as it backs up:
+      - drop_oldest: when full, discard the oldest queued message
+      - coalesce: a message replaces any still-queued message with the same
+        coalesce key (e.g. the previous progress update for a workflow); when
+        full, discard the oldest
+      - disconnect: when full, close the connection
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[str] = None, max_queue: int = 256,
+                 policy: str = "coalesce", send_timeout: float = 10.0):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+
+        # Entries are [coalesce_key, message_text] so coalescing can update in place
+        self._queue: Deque[List[Any]] = deque()
+        self._pending_by_key: Dict[str, List[Any]] = {}
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        # Close started from enqueue() (disconnect policy); kept so it is not garbage collected
+        self._closer: Optional[asyncio.Task] = None
+        self.topics: Set[str] = set()
+        self.closed = False
+        self.stats = {"sent": 0, "dropped": 0, "coalesced": 0, "max_depth": 0}
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, message_text: str, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a message; returns False if the connection was closed as a slow consumer"""
+        if self.closed:
+            return False
+
+        if coalesce_key and self.policy == "coalesce":
+            pending = self._pending_by_key.get(coalesce_key)
+            if pending is not None:
+                pending[1] = message_text
+                self.stats["coalesced"] += 1
+                return True
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                logger.warning(f"⚠️ Closing slow WebSocket consumer ({self.depth} messages queued)")
+                self.stats["dropped"] += len(self._queue) + 1
+                self._shutdown()
+                self._closer = asyncio.create_task(self._close_socket(SLOW_CONSUMER_CLOSE_CODE))
+                return False
+            self._pop()
+            self.stats["dropped"] += 1
+
+        entry = [coalesce_key, message_text]
+        self._queue.append(entry)
+        if coalesce_key:
+            self._pending_by_key[coalesce_key] = entry
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._queue))
+        self._ready.set()
+        return True
+
+    def _pop(self) -> str:
+        coalesce_key, message_text = entry = self._queue.popleft()
+        if coalesce_key and self._pending_by_key.get(coalesce_key) is entry:
+            del self._pending_by_key[coalesce_key]
+        return message_text
+
+    async def _write_loop(self):
+        try:
+            while True:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                message_text = self._pop()
+                await asyncio.wait_for(self.websocket.send_text(message_text), timeout=self.send_timeout)
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ WebSocket send failed, closing connection: {e}")
+            await self.close()
+
+    async def close(self, code: int = 1000):
+        """Stop the writer, drop queued messages and close the socket"""
+        if self.closed:
+            if self._closer is not None:
+                await self._closer  # Let a slow-consumer close finish sending its frame
+            return
+        self._shutdown()
+        await self._close_socket(code)
+
+    def _shutdown(self):
+        self.closed = True
+        self._queue.clear()
+        self._pending_by_key.clear()
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._writer = None
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # Already closed by the client
@@ -0,0 +1,136 @@
+"""
+Workflow execution event bus for OpsFlow Guardian 2.0
+The executor emits progress events here; listeners (the WebSocket manager)
+push them to subscribers immediately, and a bounded per-workflow replay
+buffer lets reconnecting clients catch up from a sequence number
+"""
+
+import json
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.redis_service import RedisService, redis_service
+
+logger = logging.getLogger(__name__)
+
+EVENT_KEY_PREFIX = "workflow_events:"
+
+EventListener = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class WorkflowEventBus:
+    """
+    Sequences workflow progress events and fans them out to listeners.
+    Each workflow has its own monotonically increasing `seq` (allocated in Redis
+    when available so it survives re-executions on other workers). The last
+    WORKFLOW_EVENT_REPLAY_SIZE events are kept in memory and mirrored to a
+    capped Redis list, so a client reconnecting to any worker can resume.
+    """
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self.replay_size = settings.WORKFLOW_EVENT_REPLAY_SIZE
+        self.retention = settings.WORKFLOW_EVENT_RETENTION_SECONDS
+        # workflow_id -> recent events, oldest first
+        self._buffers = TTLCache(maxsize=settings.WORKFLOW_EVENT_MAX_WORKFLOWS, ttl=self.retention)
+        # Sequence fallback when Redis is unavailable
+        self._local_seq = TTLCache(maxsize=settings.WORKFLOW_EVENT_MAX_WORKFLOWS, ttl=self.retention)
+        self._listeners: List[EventListener] = []
+        self._stats = {"published": 0, "replayed": 0, "listener_errors": 0}
+
+    def add_listener(self, listener: EventListener):
+        self._listeners.append(listener)
+
+    async def publish(self, workflow_id: str, event: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Record an event for a workflow and push it to every listener"""
+        message = {
+            "type": "workflow_progress",
+            "workflow_id": workflow_id,
+            "seq": await self._next_seq(workflow_id),
+            "event": event,
+            **(data or {}),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+        buffer: Optional[Deque[Dict[str, Any]]] = self._buffers.get(workflow_id)
+        if buffer is None:
+            buffer = deque(maxlen=self.replay_size)
+        buffer.append(message)
+        self._buffers.set(workflow_id, buffer)  # Refresh retention
+        await self._mirror(workflow_id, message)
+
+        self._stats["published"] += 1
+        for listener in self._listeners:
+            try:
+                await listener(message)
+            except Exception as e:
+                self._stats["listener_errors"] += 1
+                logger.error(f"Workflow event listener failed: {e}")
+        return message
+
+    async def replay(self, workflow_id: str, after_seq: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Events with seq > after_seq, oldest first.
+        The flag is False when older events were already evicted, i.e. the
+        client missed events it cannot recover and should reload full state.
+        """
+        events = list(self._buffers.get(workflow_id) or ())
+        if not events or events[0]["seq"] > after_seq + 1:
+            # Not buffered here (or only partly) - the mirror may hold more
+            events = await self._load_mirror(workflow_id) or events
+
+        missed = [event for event in events if event["seq"] > after_seq]
+        complete = not missed or missed[0]["seq"] == after_seq + 1
+        self._stats["replayed"] += len(missed)
+        return missed, complete
+
+    def latest(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        buffer = self._buffers.get(workflow_id)
+        return buffer[-1] if buffer else None
+
+    async def _next_seq(self, workflow_id: str) -> int:
+        if self.redis.redis_client is not None:
+            try:
+                key = f"{EVENT_KEY_PREFIX}{workflow_id}:seq"
+                seq = await self.redis.redis_client.incr(key)
+                await self.redis.redis_client.expire(key, self.retention)
+                return seq
+            except Exception as e:
+                logger.warning(f"⚠️ Redis sequence unavailable for workflow {workflow_id}: {e}")
+        seq = self._local_seq.get(workflow_id, 0) + 1
+        self._local_seq.set(workflow_id, seq)
+        return seq
+
+    async def _mirror(self, workflow_id: str, message: Dict[str, Any]):
+        if self.redis.redis_client is None:
+            return
+        key = f"{EVENT_KEY_PREFIX}{workflow_id}"
+        try:
+            async with self.redis.redis_client.pipeline(transaction=False) as pipe:
+                pipe.rpush(key, json.dumps(message))
+                pipe.ltrim(key, -self.replay_size, -1)
+                pipe.expire(key, self.retention)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to mirror workflow event to Redis: {e}")
+
+    async def _load_mirror(self, workflow_id: str) -> List[Dict[str, Any]]:
+        if self.redis.redis_client is None:
+            return []
+        try:
+            raw_events = await self.redis.redis_client.lrange(f"{EVENT_KEY_PREFIX}{workflow_id}", 0, -1)
+            return [json.loads(raw) for raw in raw_events]
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to load workflow events from Redis: {e}")
+            return []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "buffered_workflows": len(self._buffers)}
+
+
+# Global workflow event bus
+workflow_events = WorkflowEventBus()
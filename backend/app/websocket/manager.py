@@ -2,93 +2,313 @@
 WebSocket manager for real-time updates in OpsFlow Guardian 2.0
 """
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List, Dict, Any
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
 import json
 import logging
-import asyncio
+import re
 from datetime import datetime
 
+from app.core.auth import get_token_user
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.workflow_repository import WorkflowRepository, parse_workflow_uuid
+from app.websocket.backplane import BROADCAST_CHANNEL, EVENTS_CHANNEL, RedisBackplane
+from app.websocket.connection import ClientConnection
+from app.websocket.events import workflow_events
+
 logger = logging.getLogger(__name__)
 
 websocket_router = APIRouter()
 
 
+# Message types where only the latest queued update per subject matters
+COALESCE_TYPES = {"workflow_progress", "workflow_update", "agent_update"}
+
+
+def coalesce_key(message: Dict[str, Any]) -> Optional[str]:
+    """Key under which a newer message may replace an older queued one"""
+    message_type = message.get("type")
+    if message_type not in COALESCE_TYPES:
+        return None
+    if message.get("seq") is not None:
+        return None  # Sequenced events are discrete; a gap would break last_seq resume
+    subject = message.get("workflow_id") or message.get("agent_id")
+    return f"{message_type}:{subject}" if subject else None
+
+
+# Subscription topics are "<kind>:<value>", "<kind>:*" for every value of a
+# kind, or "*" for everything. Wildcards and the agent/event kinds span
+# companies, so only admins may subscribe to them; other users get their own
+# company's topic and the workflows they can see.
+TOPIC_KINDS = ("workflow", "agent", "company", "event")
+WILDCARD_TOPIC = "*"
+_TOPIC_VALUE = re.compile(r"[\w.@-]+|\*")
+
+
+def is_valid_topic(topic: str) -> bool:
+    if topic == WILDCARD_TOPIC:
+        return True
+    kind, _, value = topic.partition(":")
+    return kind in TOPIC_KINDS and bool(_TOPIC_VALUE.fullmatch(value))
+
+
+def event_topics(message: Dict[str, Any]) -> List[str]:
+    """Topics an event is published under, including the matching wildcards"""
+    topics = [WILDCARD_TOPIC]
+    for kind, field in (("workflow", "workflow_id"), ("agent", "agent_id"),
+                        ("company", "company_id"), ("event", "type")):
+        value = message.get(field)
+        if value is not None:
+            topics.append(f"{kind}:{value}")
+            topics.append(f"{kind}:*")
+    return topics
+
+
+async def authenticate_socket(websocket: WebSocket) -> Optional[Dict[str, Any]]:
+    """
+    User for a socket's access token (?token=..., since browsers cannot set
+    headers on WebSockets, or an Authorization: Bearer header); None if invalid
+    """
+    token = websocket.query_params.get("token")
+    if not token:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        return None
+    try:
+        return await get_token_user(token)
+    except Exception as e:
+        logger.warning(f"⚠️ WebSocket authentication failed: {e}")
+        return None
+
+
+async def workflow_visible_to(user: Dict[str, Any], workflow_id: str) -> bool:
+    """Whether a user may follow a workflow: their company's (or their own, without a company); admins any"""
+    if user.get("is_admin"):
+        return True
+    workflow_uuid = parse_workflow_uuid(workflow_id)
+    if workflow_uuid is None:
+        return False
+    async with AsyncSessionLocal() as session:
+        workflow = await WorkflowRepository(session).get(workflow_uuid)
+    if workflow is None:
+        return False
+    if workflow.company_id is not None:
+        return workflow.company_id == user.get("company_id")
+    return workflow.user_id == user.get("user_id")
+
+
+async def topic_allowed(user: Dict[str, Any], topic: str) -> bool:
+    """Whether a user may subscribe to a (valid) topic"""
+    if user.get("is_admin"):
+        return True
+    kind, _, value = topic.partition(":")
+    if kind == "company":
+        return user.get("company_id") is not None and value == str(user["company_id"])
+    if kind == "workflow" and value != WILDCARD_TOPIC:
+        return await workflow_visible_to(user, value)
+    return False
+
+
 class ConnectionManager:
-    """WebSocket connection manager"""
+    """
+    WebSocket connection manager.
+    Events are published through a Redis backplane so clients connected to any
+    worker receive them; each event is serialized once by the publishing worker.
+    Every connection has its own bounded send queue and writer task, so
+    delivery never waits on a slow client. Topic events only reach sockets
+    subscribed to one of the event's topics, via a topic -> sockets index.
+    """
     
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.user_connections: Dict[str, List[WebSocket]] = {}
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.user_connections: Dict[str, Set[WebSocket]] = {}
+        self.topic_connections: Dict[str, Set[WebSocket]] = {}
+        self.backplane = RedisBackplane()
+        # Totals for connections that have already closed
+        self._closed_totals = {"sent": 0, "dropped": 0, "coalesced": 0}
+        self._stats = {"slow_consumers_disconnected": 0}
     
     async def connect(self, websocket: WebSocket, user_id: str = None):
         """Accept new WebSocket connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        connection = ClientConnection(
+            websocket,
+            user_id=user_id,
+            max_queue=settings.WS_SEND_QUEUE_SIZE,
+            policy=settings.WS_SLOW_CONSUMER_POLICY,
+            send_timeout=settings.WS_SEND_TIMEOUT
+        )
+        connection.start()
+        self.connections[websocket] = connection
         
         if user_id:
-            if user_id not in self.user_connections:
-                self.user_connections[user_id] = []
-            self.user_connections[user_id].append(websocket)
+            self.user_connections.setdefault(user_id, set()).add(websocket)
+            await self.backplane.add_interest(f"user:{user_id}")
         
-        logger.info(f"WebSocket connected. Active connections: {len(self.active_connections)}")
+        logger.info(f"WebSocket connected. Active connections: {len(self.connections)}")
     
-    def disconnect(self, websocket: WebSocket, user_id: str = None):
+    async def disconnect(self, websocket: WebSocket, user_id: str = None):
         """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        await connection.close()
+        for name in self._closed_totals:
+            self._closed_totals[name] += connection.stats[name]
+        self._remove_topics(websocket, connection.topics)
         
-        if user_id and user_id in self.user_connections:
-            if websocket in self.user_connections[user_id]:
-                self.user_connections[user_id].remove(websocket)
-            if not self.user_connections[user_id]:
+        user_id = user_id or connection.user_id
+        sockets = self.user_connections.get(user_id) if user_id else None
+        if sockets is not None and websocket in sockets:
+            sockets.discard(websocket)
+            if not sockets:
                 del self.user_connections[user_id]
+            await self.backplane.remove_interest(f"user:{user_id}")
+        
+        logger.info(f"WebSocket disconnected. Active connections: {len(self.connections)}")
+    
+    async def subscribe(self, websocket: WebSocket, topics: Iterable[str],
+                        user: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """Subscribe a socket to the topics its user may see; returns (accepted, rejected)"""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return [], list(topics)
         
-        logger.info(f"WebSocket disconnected. Active connections: {len(self.active_connections)}")
+        accepted, rejected = [], []
+        for topic in topics:
+            if not isinstance(topic, str) or not is_valid_topic(topic):
+                rejected.append(topic)
+                continue
+            if topic not in connection.topics and not await topic_allowed(user, topic):
+                rejected.append(topic)
+                continue
+            if topic not in connection.topics and len(connection.topics) >= settings.WS_MAX_TOPICS_PER_CONNECTION:
+                rejected.append(topic)
+                continue
+            connection.topics.add(topic)
+            self.topic_connections.setdefault(topic, set()).add(websocket)
+            accepted.append(topic)
+        return accepted, rejected
+    
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Remove topic subscriptions; returns the topics that were removed"""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return []
+        removed = [topic for topic in topics if topic in connection.topics]
+        connection.topics.difference_update(removed)
+        self._remove_topics(websocket, removed)
+        return removed
+    
+    def _remove_topics(self, websocket: WebSocket, topics: Iterable[str]):
+        for topic in topics:
+            sockets = self.topic_connections.get(topic)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.topic_connections[topic]
     
     async def send_personal_message(self, message: str, websocket: WebSocket):
         """Send message to specific WebSocket"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            # Keep ordering with queued broadcasts
+            self._enqueue(connection, message)
+            return
         try:
             await websocket.send_text(message)
         except Exception as e:
             logger.error(f"Failed to send personal message: {e}")
     
     async def send_to_user(self, message: Dict[str, Any], user_id: str):
-        """Send message to all connections for a user"""
-        if user_id in self.user_connections:
-            message_text = json.dumps(message)
-            for connection in self.user_connections[user_id]:
-                try:
-                    await connection.send_text(message_text)
-                except Exception as e:
-                    logger.error(f"Failed to send message to user {user_id}: {e}")
+        """Send message to all connections for a user, on any worker"""
+        await self.publish(f"user:{user_id}", message)
     
     async def broadcast(self, message: Dict[str, Any]):
-        """Broadcast message to all connected clients"""
+        """Broadcast message to all connected clients, on any worker"""
+        await self.publish(BROADCAST_CHANNEL, message)
+    
+    async def publish_event(self, message: Dict[str, Any]):
+        """Send an event to the sockets subscribed to any of its topics, on any worker"""
+        await self.publish(EVENTS_CHANNEL, message, event_topics(message))
+    
+    async def publish(self, channel: str, message: Dict[str, Any], topics: Tuple[str, ...] = ()):
+        """Serialize once, deliver to local clients, then relay to other workers"""
         message_text = json.dumps(message)
-        disconnected = []
-        
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_text)
-            except Exception as e:
-                logger.error(f"Failed to broadcast message: {e}")
-                disconnected.append(connection)
+        key = coalesce_key(message)
+        await self.deliver_local(channel, message_text, key, topics)
+        await self.backplane.publish(channel, message_text, key, topics)
+    
+    async def deliver_local(self, channel: str, message_text: str, key: Optional[str] = None,
+                            topics: Iterable[str] = ()):
+        """Queue an already-serialized message for this worker's clients on a channel"""
+        if channel == BROADCAST_CHANNEL:
+            sockets = self.connections.keys()
+        elif channel == EVENTS_CHANNEL:
+            sockets = set()
+            for topic in topics:
+                sockets.update(self.topic_connections.get(topic, ()))
+        elif channel.startswith("user:"):
+            sockets = self.user_connections.get(channel[len("user:"):], ())
+        else:
+            return
+        connections = [self.connections[ws] for ws in sockets if ws in self.connections]
         
-        # Remove disconnected connections
-        for connection in disconnected:
-            if connection in self.active_connections:
-                self.active_connections.remove(connection)
+        for connection in connections:
+            self._enqueue(connection, message_text, key)
+    
+    def _enqueue(self, connection: ClientConnection, message_text: str, key: Optional[str] = None):
+        if connection.closed:
+            return
+        if not connection.enqueue(message_text, key):
+            # Closed as a slow consumer; the endpoint's receive loop finishes cleanup
+            self._stats["slow_consumers_disconnected"] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        depths = [connection.depth for connection in self.connections.values()]
+        totals = dict(self._closed_totals)
+        for connection in self.connections.values():
+            for name in totals:
+                totals[name] += connection.stats[name]
+        return {
+            "active_connections": len(self.connections),
+            "users": len(self.user_connections),
+            "topics": len(self.topic_connections),
+            "slow_consumer_policy": settings.WS_SLOW_CONSUMER_POLICY,
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            **totals,
+            **self._stats,
+            "backplane": self.backplane.get_stats()
+        }
 
 
 # Global connection manager instance
 manager = ConnectionManager()
 
+# Executor progress events go straight to subscribed sockets
+workflow_events.add_listener(manager.publish_event)
+
+
+def _requested_topics(message: Dict[str, Any]) -> List[str]:
+    """Topics from a subscribe/unsubscribe message ("topics" list or legacy "subscription")"""
+    topics = message.get("topics")
+    if isinstance(topics, list):
+        return topics
+    subscription = message.get("subscription")
+    return [subscription] if subscription else []
+
 
 @websocket_router.websocket("/dashboard")
 async def websocket_dashboard(websocket: WebSocket):
-    """WebSocket endpoint for dashboard real-time updates"""
-    user_id = "dashboard-user"  # In real app, get from authentication
+    """WebSocket endpoint for dashboard real-time updates (requires an access token)"""
+    user = await authenticate_socket(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user_id = str(user["user_id"])
     await manager.connect(websocket, user_id)
     
     try:
@@ -114,11 +334,19 @@ async def websocket_dashboard(websocket: WebSocket):
                     }), websocket)
                 
                 elif message.get("type") == "subscribe":
-                    # Handle subscription to specific updates
-                    subscription = message.get("subscription", "")
+                    accepted, rejected = await manager.subscribe(websocket, _requested_topics(message), user)
                     await manager.send_personal_message(json.dumps({
                         "type": "subscription_confirmed",
-                        "subscription": subscription,
+                        "topics": accepted,
+                        "rejected": rejected,
+                        "timestamp": datetime.utcnow().isoformat()
+                    }), websocket)
+                
+                elif message.get("type") == "unsubscribe":
+                    removed = manager.unsubscribe(websocket, _requested_topics(message))
+                    await manager.send_personal_message(json.dumps({
+                        "type": "unsubscription_confirmed",
+                        "topics": removed,
                         "timestamp": datetime.utcnow().isoformat()
                     }), websocket)
                 
@@ -136,13 +364,47 @@ async def websocket_dashboard(websocket: WebSocket):
     except WebSocketDisconnect:
         logger.info("Dashboard WebSocket disconnected")
     finally:
-        manager.disconnect(websocket, user_id)
+        await manager.disconnect(websocket, user_id)
+
+
+def _parse_seq(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _send_missed_events(websocket: WebSocket, workflow_id: str, last_seq: int):
+    """Replay buffered progress events after last_seq to a reconnecting client"""
+    events, complete = await workflow_events.replay(workflow_id, last_seq)
+    if not complete:
+        # Some events were evicted; the client should reload full state
+        await manager.send_personal_message(json.dumps({
+            "type": "resync_required",
+            "workflow_id": workflow_id,
+            "last_seq": last_seq,
+            "timestamp": datetime.utcnow().isoformat()
+        }), websocket)
+    for event in events:
+        await manager.send_personal_message(json.dumps(event), websocket)
 
 
 @websocket_router.websocket("/workflow/{workflow_id}")
 async def websocket_workflow(websocket: WebSocket, workflow_id: str):
-    """WebSocket endpoint for workflow-specific updates"""
-    await manager.connect(websocket)
+    """
+    WebSocket endpoint for workflow-specific updates.
+    Progress events carry a per-workflow `seq`; reconnect with ?last_seq=N (or
+    send {"type": "resume", "last_seq": N}) to receive the events missed since.
+    Replayed and live events may overlap, so clients should ignore seq <= last seen.
+    Requires an access token for a user who can see the workflow.
+    """
+    user = await authenticate_socket(websocket)
+    if user is None or not await workflow_visible_to(user, workflow_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await manager.connect(websocket, str(user["user_id"]))
+    # Subscribe before replaying so nothing published in between is lost
+    await manager.subscribe(websocket, [f"workflow:{workflow_id}"], user)
     
     try:
         # Send workflow status
@@ -153,8 +415,9 @@ async def websocket_workflow(websocket: WebSocket, workflow_id: str):
             "timestamp": datetime.utcnow().isoformat()
         }), websocket)
         
-        # Simulate workflow updates
-        asyncio.create_task(send_workflow_updates(websocket, workflow_id))
+        last_seq = _parse_seq(websocket.query_params.get("last_seq"))
+        if last_seq is not None:
+            await _send_missed_events(websocket, workflow_id, last_seq)
         
         while True:
             try:
@@ -163,17 +426,26 @@ async def websocket_workflow(websocket: WebSocket, workflow_id: str):
                 
                 # Handle workflow-specific messages
                 if message.get("type") == "get_status":
-                    await manager.send_personal_message(json.dumps({
+                    latest = workflow_events.latest(workflow_id)
+                    await manager.send_personal_message(json.dumps(latest or {
                         "type": "workflow_update",
                         "workflow_id": workflow_id,
-                        "status": "running",
-                        "progress": 65,
-                        "current_step": "Setting up development environment",
+                        "status": "unknown",
                         "timestamp": datetime.utcnow().isoformat()
                     }), websocket)
+                
+                elif message.get("type") == "resume":
+                    last_seq = _parse_seq(message.get("last_seq"))
+                    if last_seq is not None:
+                        await _send_missed_events(websocket, workflow_id, last_seq)
                     
             except WebSocketDisconnect:
                 break
+            except json.JSONDecodeError:
+                await manager.send_personal_message(json.dumps({
+                    "type": "error",
+                    "message": "Invalid JSON format"
+                }), websocket)
             except Exception as e:
                 logger.error(f"Workflow WebSocket error: {e}")
                 break
@@ -181,27 +453,7 @@ async def websocket_workflow(websocket: WebSocket, workflow_id: str):
     except WebSocketDisconnect:
         logger.info(f"Workflow {workflow_id} WebSocket disconnected")
     finally:
-        manager.disconnect(websocket)
-
-
-async def send_workflow_updates(websocket: WebSocket, workflow_id: str):
-    """Send periodic workflow updates"""
-    try:
-        while True:
-            await asyncio.sleep(30)  # Send updates every 30 seconds
-            
-            # Mock workflow progress update
-            await manager.send_personal_message(json.dumps({
-                "type": "workflow_progress",
-                "workflow_id": workflow_id,
-                "progress": 75,
-                "current_step": "Finalizing setup",
-                "estimated_completion": "5 minutes",
-                "timestamp": datetime.utcnow().isoformat()
-            }), websocket)
-            
-    except Exception as e:
-        logger.error(f"Error sending workflow updates: {e}")
+        await manager.disconnect(websocket)
 
 
 async def broadcast_system_update(update_type: str, data: Dict[str, Any]):
@@ -214,8 +466,9 @@ async def broadcast_system_update(update_type: str, data: Dict[str, Any]):
     await manager.broadcast(message)
 
 
-async def send_agent_update(agent_id: str, status: str, metrics: Dict[str, Any] = None):
-    """Send agent status update"""
+async def send_agent_update(agent_id: str, status: str, metrics: Dict[str, Any] = None,
+                            company_id: str = None):
+    """Send agent status update to agent/company/event subscribers"""
     message = {
         "type": "agent_update",
         "agent_id": agent_id,
@@ -223,11 +476,14 @@ async def send_agent_update(agent_id: str, status: str, metrics: Dict[str, Any]
         "metrics": metrics or {},
         "timestamp": datetime.utcnow().isoformat()
     }
-    await manager.broadcast(message)
+    if company_id:
+        message["company_id"] = company_id
+    await manager.publish_event(message)
 
 
-async def send_workflow_notification(workflow_id: str, event: str, details: Dict[str, Any] = None):
-    """Send workflow event notification"""
+async def send_workflow_notification(workflow_id: str, event: str, details: Dict[str, Any] = None,
+                                     company_id: str = None):
+    """Send workflow event notification to workflow/company/event subscribers"""
     message = {
         "type": "workflow_notification",
         "workflow_id": workflow_id,
@@ -235,10 +491,13 @@ async def send_workflow_notification(workflow_id: str, event: str, details: Dict
         "details": details or {},
         "timestamp": datetime.utcnow().isoformat()
     }
-    await manager.broadcast(message)
+    if company_id:
+        message["company_id"] = company_id
+    await manager.publish_event(message)
 
 
-async def send_approval_notification(approval_id: str, workflow_name: str, user_id: str = None):
+async def send_approval_notification(approval_id: str, workflow_name: str, user_id: str = None,
+                                     workflow_id: str = None, company_id: str = None):
     """Send approval request notification"""
     message = {
         "type": "approval_notification",
@@ -247,8 +506,12 @@ async def send_approval_notification(approval_id: str, workflow_name: str, user_
         "requires_action": True,
         "timestamp": datetime.utcnow().isoformat()
     }
+    if workflow_id:
+        message["workflow_id"] = workflow_id
+    if company_id:
+        message["company_id"] = company_id
     
     if user_id:
         await manager.send_to_user(message, user_id)
     else:
-        await manager.broadcast(message)
+        await manager.publish_event(message)
@@ -0,0 +1,109 @@
+"""
+Server-Sent Events streams for OpsFlow Guardian 2.0
+SSE clients register with the WebSocket ConnectionManager through a small
+socket-like adapter, so they share its topic routing, Redis backplane,
+bounded send queues and slow-consumer policy
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.websocket.events import workflow_events
+from app.websocket.manager import manager
+
+logger = logging.getLogger(__name__)
+
+
+class SSESink:
+    """
+    Socket-like adapter the ConnectionManager can write to.
+    The one-slot outbox makes the connection's writer wait for the HTTP
+    response to consume each message, so backpressure from a slow client
+    lands on the bounded per-connection queue.
+    """
+
+    def __init__(self):
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message_text: str):
+        await self._outbox.put(message_text)
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        # Wake the stream so it ends; None marks end of stream
+        while not self._outbox.empty():
+            self._outbox.get_nowait()
+        self._outbox.put_nowait(None)
+
+    async def receive(self, timeout: float) -> Optional[str]:
+        """Next message, "" on timeout, or None once closed"""
+        try:
+            return await asyncio.wait_for(self._outbox.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return ""
+
+
+def format_sse(message_text: str, event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    """Encode one SSE message (message_text must be single-line JSON)"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {message_text}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _format_event(message: dict, message_text: Optional[str] = None) -> str:
+    return format_sse(message_text or json.dumps(message), message.get("seq"), message.get("type"))
+
+
+async def workflow_event_stream(workflow_id: str, user: Dict[str, Any],
+                                last_seq: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    SSE body for a workflow's progress events (the caller checks the user may see it).
+    Event ids are the per-workflow seq, so a client's Last-Event-ID resumes
+    from the replay buffer. Idle streams get a comment line every
+    SSE_HEARTBEAT_SECONDS to keep proxies from timing them out.
+    """
+    sink = SSESink()
+    await manager.connect(sink)
+    # Subscribe before replaying so nothing published in between is lost
+    await manager.subscribe(sink, [f"workflow:{workflow_id}"], user)
+    sent_seq = last_seq or 0
+    try:
+        yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+
+        if last_seq is not None:
+            events, complete = await workflow_events.replay(workflow_id, last_seq)
+            if not complete:
+                yield _format_event({"type": "resync_required", "workflow_id": workflow_id, "last_seq": last_seq})
+            for event in events:
+                sent_seq = event["seq"]
+                yield _format_event(event)
+
+        while True:
+            message_text = await sink.receive(settings.SSE_HEARTBEAT_SECONDS)
+            if message_text is None:
+                break
+            if not message_text:
+                yield ": keepalive\n\n"
+                continue
+            message = json.loads(message_text)
+            seq = message.get("seq")
+            if seq is not None:
+                if seq <= sent_seq:
+                    continue  # Already sent during replay
+                sent_seq = seq
+            yield _format_event(message, message_text)
+    finally:
+        await manager.disconnect(sink)
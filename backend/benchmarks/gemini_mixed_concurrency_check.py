@@ -0,0 +1,114 @@
+"""
+Mixed Gemini call concurrency check for OpsFlow Guardian 2.0
+
+Runs completions and streams concurrently through GeminiService against a fake
+model (no API key needed) and fails if any call is still stuck after the
+timeout. Completions and streams share the guard's concurrency limiter and the
+service semaphore; taking them in different orders deadlocks once both kinds
+saturate, so this is the regression check for that.
+
+Usage:
+    python benchmarks/gemini_mixed_concurrency_check.py --calls 15 --streams 45 \
+        --latency-ms 20 --timeout 30
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.gemini_service import GeminiService  # noqa: E402
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStream:
+    def __init__(self, chunks: int, latency: float):
+        self._chunks = chunks
+        self._latency = latency
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for index in range(self._chunks):
+            await asyncio.sleep(self._latency)
+            yield FakeChunk(f"chunk-{index} ")
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel with a fixed latency per request/chunk"""
+
+    def __init__(self, latency: float, chunks: int):
+        self.latency = latency
+        self.chunks = chunks
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        await asyncio.sleep(self.latency)
+        if stream:
+            return FakeStream(self.chunks, self.latency)
+        return FakeResponse(f"reply to {prompt}")
+
+
+async def run_check(calls: int, streams: int, latency_ms: float, chunks: int, timeout: float) -> bool:
+    service = GeminiService()
+    service.model = FakeModel(latency_ms / 1000, chunks)
+
+    async def completion(index: int):
+        # Distinct prompts so single-flight does not merge them
+        await service._generate(f"completion {index}")
+
+    async def stream(index: int):
+        async for _ in service._stream(f"stream {index}"):
+            pass
+
+    tasks = [asyncio.create_task(completion(i)) for i in range(calls)]
+    tasks += [asyncio.create_task(stream(i)) for i in range(streams)]
+
+    started = time.perf_counter()
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    elapsed = time.perf_counter() - started
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    failed = [task for task in done if task.exception() is not None]
+    print(f"Completions:   {calls}")
+    print(f"Streams:       {streams}")
+    print(f"Finished:      {len(done) - len(failed)}")
+    print(f"Failed:        {len(failed)}")
+    print(f"Still pending: {len(pending)} after {timeout:.0f}s")
+    print(f"Elapsed:       {elapsed:.2f}s")
+    print(f"Service stats: {service.get_stats()}")
+    for task in failed[:5]:
+        print(f"  error: {task.exception()!r}")
+    return not pending and not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed Gemini completion/stream concurrency check")
+    parser.add_argument("--calls", type=int, default=15, help="Concurrent completions")
+    parser.add_argument("--streams", type=int, default=45, help="Concurrent streams")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Fake latency per request and per chunk")
+    parser.add_argument("--chunks", type=int, default=5, help="Chunks per stream")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds before calls count as stuck")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run_check(args.calls, args.streams, args.latency_ms, args.chunks, args.timeout))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
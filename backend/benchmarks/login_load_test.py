@@ -0,0 +1,82 @@
+"""
+Login load test for OpsFlow Guardian 2.0
+
+Fires N concurrent logins at /api/v1/auth/login-json and reports latency
+percentiles. Run it once against a server started from the commit before the
+async session change and once after to compare p99 under load.
+
+Usage:
+    python benchmarks/login_load_test.py --base-url http://localhost:8000 \
+        --email bench@opsflow.com --password secret --concurrency 200 --requests 2000
+"""
+
+import argparse
+import asyncio
+import math
+import statistics
+import time
+from typing import List
+
+import httpx
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_load_test(base_url: str, email: str, password: str, concurrency: int, total_requests: int):
+    """Run the login load test and print a latency summary"""
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+
+        async def single_login():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/api/v1/auth/login-json",
+                        json={"email": email, "password": password}
+                    )
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(single_login() for _ in range(total_requests)))
+        wall_time = time.perf_counter() - wall_start
+
+    print(f"Requests:     {total_requests} ({concurrency} concurrent)")
+    print(f"Errors:       {errors}")
+    print(f"Throughput:   {total_requests / wall_time:.1f} req/s")
+    print(f"Mean latency: {statistics.mean(latencies):.1f} ms")
+    print(f"p50 latency:  {percentile(latencies, 50):.1f} ms")
+    print(f"p95 latency:  {percentile(latencies, 95):.1f} ms")
+    print(f"p99 latency:  {percentile(latencies, 99):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent login load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    asyncio.run(run_load_test(args.base_url, args.email, args.password, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()
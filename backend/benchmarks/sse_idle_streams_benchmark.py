@@ -0,0 +1,121 @@
+"""
+Idle SSE streams benchmark for OpsFlow Guardian 2.0
+
+Opens N concurrent GET /api/v1/workflows/{id}/events streams against a single
+worker, holds them idle through at least one heartbeat, and reports the
+server's resident memory before and after (total and per stream) along with
+how many streams stayed open.
+
+Start a single worker and note its pid. All streams come from one IP, so run
+with DEBUG=true (or a large RATE_LIMIT_ROUTE_QUOTAS entry) to bypass rate limits:
+    DEBUG=true uvicorn main:app --workers 1 --port 8000 &
+
+Usage:
+    ulimit -n 65536
+    python benchmarks/sse_idle_streams_benchmark.py --base-url http://localhost:8000 \
+        --server-pid <pid> --streams 20000 --hold 30
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+import httpx
+
+
+def read_rss_kb(pid: Optional[int]) -> Optional[int]:
+    """Resident set size of a local process in KiB (Linux)"""
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return None
+
+
+async def hold_stream(client: httpx.AsyncClient, url: str, opened: List[int], heartbeats: List[int],
+                      stop: asyncio.Event):
+    """Open one stream and read it until told to stop"""
+    try:
+        async with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                opened[1] += 1
+                return
+            opened[0] += 1
+            lines = response.aiter_lines()
+            while not stop.is_set():
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                except StopAsyncIteration:
+                    opened[2] += 1  # Server ended the stream
+                    return
+                if line.startswith(": keepalive"):
+                    heartbeats[0] += 1
+    except Exception:
+        opened[1] += 1
+
+
+async def run_benchmark(base_url: str, workflow_prefix: str, streams: int, hold: float, ramp: int,
+                        server_pid: Optional[int]):
+    rss_before = read_rss_kb(server_pid)
+    opened = [0, 0, 0]  # [opened, failed, closed early]
+    heartbeats = [0]
+    stop = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=streams, max_keepalive_connections=0)
+    timeout = httpx.Timeout(60.0, read=None)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        tasks = []
+        start = time.perf_counter()
+        for i in range(streams):
+            # Spread streams over many workflows like real dashboards would
+            url = f"/api/v1/workflows/{workflow_prefix}-{i % 1000}/events"
+            tasks.append(asyncio.create_task(hold_stream(client, url, opened, heartbeats, stop)))
+            if (i + 1) % ramp == 0:
+                await asyncio.sleep(0.1)
+
+        while opened[0] + opened[1] < streams:
+            await asyncio.sleep(0.5)
+        print(f"Opened {opened[0]} streams ({opened[1]} failed) in {time.perf_counter() - start:.1f}s")
+
+        await asyncio.sleep(hold)
+        rss_after = read_rss_kb(server_pid)
+
+        # Separate client: the streaming pool is saturated
+        async with httpx.AsyncClient(base_url=base_url) as health_client:
+            response = await health_client.get("/health")
+            websockets = response.json().get("websockets", {})
+
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"After {hold:.0f}s idle: {opened[0] - opened[2]} streams open "
+          f"(server reports {websockets.get('active_connections')} connections)")
+    print(f"Heartbeats received: {heartbeats[0]}")
+    if rss_before is not None and rss_after is not None:
+        delta_kb = rss_after - rss_before
+        print(f"Server RSS: {rss_before / 1024:.1f} MiB -> {rss_after / 1024:.1f} MiB "
+              f"(+{delta_kb / 1024:.1f} MiB, {delta_kb * 1024 / max(opened[0], 1):.0f} bytes/stream)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Idle SSE stream capacity benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--workflow-prefix", default="bench-workflow")
+    parser.add_argument("--streams", type=int, default=20000)
+    parser.add_argument("--hold", type=float, default=30.0, help="Seconds to hold streams idle")
+    parser.add_argument("--ramp", type=int, default=500, help="Streams opened per 100ms")
+    parser.add_argument("--server-pid", type=int, default=None, help="Server worker pid for RSS sampling")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(
+        args.base_url, args.workflow_prefix, args.streams, args.hold, args.ramp, args.server_pid
+    ))
+
+
+if __name__ == "__main__":
+    main()
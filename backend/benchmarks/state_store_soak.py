@@ -0,0 +1,98 @@
+"""
+State store soak test for OpsFlow Guardian 2.0
+
+Pushes N synthetic executions through a StateStore the way the executors do
+(stored while running, re-stored when finished, offloaded, then evicted) and
+samples process RSS along the way. After warm-up, RSS should stay flat; the
+script exits non-zero if it grows more than --max-growth-mb.
+
+Usage:
+    python benchmarks/state_store_soak.py --executions 1000000 --concurrency 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.state_store import StateStore, process_memory  # noqa: E402
+
+
+def rss_mb() -> float:
+    return process_memory().get("rss_bytes", 0) / (1024 * 1024)
+
+
+async def run_soak(executions: int, concurrency: int, max_terminal: int, samples: int, max_growth_mb: float) -> bool:
+    offloaded = [0]
+
+    async def offload(key, value):
+        offloaded[0] += 1  # Stands in for the Redis/Postgres write
+
+    store = StateStore(
+        "soak_executions",
+        is_terminal=lambda execution: execution["status"] in ("completed", "failed"),
+        max_live=concurrency * 2,
+        max_terminal=max_terminal,
+        terminal_ttl=60,
+        offload=offload
+    )
+
+    sample_every = max(1, executions // samples)
+    readings = []
+    in_flight = []
+    start = time.perf_counter()
+    for i in range(executions):
+        execution_id = str(uuid.uuid4())
+        execution = {
+            "execution_id": execution_id,
+            "status": "running",
+            "step_results": {f"step-{n}": {"status": "completed", "output": "x" * 64} for n in range(3)},
+        }
+        store[execution_id] = execution
+        in_flight.append(execution)
+
+        if len(in_flight) >= concurrency:
+            for finished in in_flight:
+                finished["status"] = "completed" if i % 50 else "failed"
+                store[finished["execution_id"]] = finished
+            in_flight = []
+            await asyncio.sleep(0)  # Let offload tasks run
+
+        if i % sample_every == 0:
+            readings.append((i, rss_mb(), len(store)))
+
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    readings.append((executions, rss_mb(), len(store)))
+
+    print(f"Executions: {executions} in {elapsed:.1f}s ({executions / elapsed:.0f}/s), offloaded {offloaded[0]}")
+    for processed, rss, size in readings:
+        print(f"  {processed:>9} executions  rss {rss:8.1f} MB  stored {size}")
+
+    # Ignore the first quarter while the tiers fill up
+    steady = [rss for _, rss, _ in readings[len(readings) // 4:]]
+    growth = max(steady) - min(steady) if steady else 0.0
+    print(f"Steady-state RSS growth: {growth:.1f} MB (limit {max_growth_mb:.1f} MB)")
+    print(f"Store stats: {store.get_stats()}")
+    return growth <= max_growth_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bounded state store memory soak test")
+    parser.add_argument("--executions", type=int, default=1_000_000)
+    parser.add_argument("--concurrency", type=int, default=500, help="Executions in flight at once")
+    parser.add_argument("--max-terminal", type=int, default=1000)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--max-growth-mb", type=float, default=16.0)
+    args = parser.parse_args()
+
+    ok = asyncio.run(run_soak(args.executions, args.concurrency, args.max_terminal, args.samples, args.max_growth_mb))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
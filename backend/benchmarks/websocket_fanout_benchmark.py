@@ -0,0 +1,112 @@
+"""
+WebSocket fan-out latency benchmark for OpsFlow Guardian 2.0
+
+Opens N dashboard WebSocket clients against a multi-worker server, publishes
+events straight onto the Redis backplane broadcast channel, and reports how
+many clients received each event and the end-to-end delivery latency.
+
+Start the server with several workers first, e.g.:
+    uvicorn main:app --workers 4 --port 8000
+
+Usage:
+    ulimit -n 65536
+    python benchmarks/websocket_fanout_benchmark.py --ws-url ws://localhost:8000/ws/dashboard \
+        --redis-url redis://localhost:6379/0 --clients 10000 --events 20
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from typing import List
+
+import redis.asyncio as redis
+import websockets
+
+CHANNEL = "opsflow:ws:broadcast"
+ORIGIN = "bench"  # Not a worker id, so every worker relays it
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def client(ws_url: str, ready: asyncio.Event, connected: List[int], latencies: List[float], stop: asyncio.Event):
+    """One dashboard client recording the latency of every benchmark event"""
+    try:
+        async with websockets.connect(ws_url, max_queue=None, open_timeout=60) as ws:
+            await ws.recv()  # connection_established
+            connected[0] += 1
+            await ready.wait()
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                message = json.loads(raw)
+                if message.get("type") == "benchmark":
+                    latencies.append(time.time() - message["sent_at"])
+    except Exception:
+        connected[1] += 1
+
+
+async def run_benchmark(ws_url: str, redis_url: str, clients: int, events: int, interval: float, ramp: int):
+    ready = asyncio.Event()
+    stop = asyncio.Event()
+    connected = [0, 0]  # [open, failed]
+    latencies: List[float] = []
+
+    tasks = []
+    for i in range(clients):
+        tasks.append(asyncio.create_task(client(ws_url, ready, connected, latencies, stop)))
+        if (i + 1) % ramp == 0:
+            await asyncio.sleep(0.1)  # Don't overrun the accept backlog
+
+    while connected[0] + connected[1] < clients:
+        await asyncio.sleep(0.5)
+    print(f"Connected: {connected[0]} clients ({connected[1]} failed)")
+    ready.set()
+
+    publisher = redis.from_url(redis_url, decode_responses=True)
+    try:
+        for seq in range(events):
+            payload = json.dumps({"type": "benchmark", "seq": seq, "sent_at": time.time()})
+            await publisher.publish(CHANNEL, f"{ORIGIN}|||{payload}")
+            await asyncio.sleep(interval)
+        await asyncio.sleep(5)  # Let stragglers drain
+    finally:
+        await publisher.aclose()
+
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    expected = connected[0] * events
+    print(f"Events: {events}, deliveries: {len(latencies)}/{expected} "
+          f"({100 * len(latencies) / max(expected, 1):.2f}%)")
+    for pct in (50, 95, 99):
+        print(f"p{pct}: {percentile(latencies, pct) * 1000:.1f} ms")
+    if latencies:
+        print(f"max: {max(latencies) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket cross-worker fan-out benchmark")
+    parser.add_argument("--ws-url", default="ws://localhost:8000/ws/dashboard")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between published events")
+    parser.add_argument("--ramp", type=int, default=500, help="Connections opened per 100ms")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.ws_url, args.redis_url, args.clients, args.events, args.interval, args.ramp))
+
+
+if __name__ == "__main__":
+    main()
@@ -25,7 +25,26 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Import database initialization
-from app.db.database import initialize_database, get_database_health
+from app.db.database import (
+    initialize_database,
+    get_database_health,
+    close_async_database,
+    init_raw_pool,
+    close_raw_pool
+)
+from app.services.supabase_service import supabase_service
+from app.services.http_client import http_clients
+from app.services.redis_service import redis_service
+from app.services.rate_limiter import rate_limiter
+from app.middleware.rate_limiting import RateLimitMiddleware
+from app.websocket.manager import manager as websocket_manager, websocket_router
+from app.websocket.events import workflow_events
+from app.services.execution_queue import execution_queue
+from app.services.execution_checkpoints import execution_checkpoints
+from app.core.state_store import get_memory_stats
+from app.services.plan_cache import plan_cache
+from app.services.chat_stream import chat_stream_metrics
+from app.services.llm_resilience import get_guard_stats
 
 # Create FastAPI application
 app = FastAPI(
@@ -37,6 +56,10 @@ app = FastAPI(
     openapi_url="/openapi.json"
 )
 
+# Distributed rate limiting (shared across workers through Redis).
+# Added before CORS so 429 responses still carry CORS headers.
+app.add_middleware(RateLimitMiddleware)
+
 # Add CORS middleware for frontend integration
 app.add_middleware(
     CORSMiddleware,
@@ -79,6 +102,7 @@ app.include_router(endpoints.auth.router, prefix="/api/v1/auth", tags=["Authenti
 if google_oauth_available:
     app.include_router(google_auth_router, tags=["Google Authentication"])
 app.include_router(endpoints.company.router, prefix="/api/v1", tags=["Company Profile"])
+app.include_router(websocket_router, prefix="/ws", tags=["WebSocket"])
 
 
 @app.on_event("startup")
@@ -92,12 +116,71 @@ async def startup_event():
         logger.info("✅ Database initialization successful")
     except Exception as e:
         logger.error(f"❌ Database startup error: {e}")
+    
+    # Warm up the shared asyncpg pool used for raw queries
+    try:
+        await init_raw_pool()
+    except Exception as e:
+        logger.error(f"❌ Raw query pool startup error: {e}")
+    
+    # Connect to Redis (rate limiter falls back to in-process limits without it)
+    try:
+        await redis_service.initialize()
+    except Exception as e:
+        logger.warning(f"⚠️ Redis unavailable at startup: {e}")
+    
+    # Relay WebSocket events between workers (local-only without Redis)
+    await websocket_manager.backplane.start(websocket_manager.deliver_local)
+    
+    # Consume queued workflow executions (Portia SDK is optional in development)
+    try:
+        from app.services.portia_service import execute_workflow_job, portia_service
+        await execution_queue.start(execute_workflow_job)
+        # Agent chat streams from its Gemini service, so bring it up before the first request
+        await portia_service.initialize()
+    except ImportError as e:
+        logger.warning(f"⚠️ Workflow executor not available: {e}")
+    
+    # Re-queue executions interrupted by a crash (checkpointed steps are skipped)
+    try:
+        await execution_checkpoints.recover_unfinished(execution_queue)
+    except Exception as e:
+        logger.error(f"❌ Execution recovery sweep failed: {e}")
+    
+    # Open pooled HTTP clients for the upstreams we call on hot paths
+    http_clients.start([
+        supabase_service.supabase_url,
+        "https://oauth2.googleapis.com",
+        "https://www.googleapis.com"
+    ])
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up database connections on shutdown"""
     logger.info("🛑 Shutting down OpsFlow Guardian 2.0...")
+    
+    # Flush buffered audit events before the process exits
+    try:
+        await supabase_service.flush_audit_events()
+    except Exception as e:
+        logger.error(f"❌ Error flushing audit events: {e}")
+    
+    try:
+        await http_clients.close()
+    except Exception as e:
+        logger.error(f"❌ Error closing HTTP clients: {e}")
+    
+    await execution_queue.stop()
+    await websocket_manager.backplane.stop()
+    await redis_service.close()
+    
+    try:
+        await close_raw_pool()
+        await close_async_database()
+    except Exception as e:
+        logger.error(f"❌ Error closing async database connections: {e}")
+    
     logger.info("✅ Shutdown complete")
 
 
@@ -137,7 +220,19 @@ async def health_check():
                 "database_type": db_health["database_type"]
             },
             "database_info": db_health.get("database_info", {}),
-            "connection_pool": db_health.get("connection_pool", {})
+            "connection_pool": db_health.get("connection_pool", {}),
+            "raw_query_pool": db_health.get("raw_query_pool", {}),
+            "audit_buffer": supabase_service.audit_buffer.get_stats(),
+            "http_clients": http_clients.get_stats(),
+            "rate_limiter": rate_limiter.get_stats(),
+            "websockets": websocket_manager.get_stats(),
+            "workflow_events": workflow_events.get_stats(),
+            "execution_queue": await execution_queue.get_stats(),
+            "execution_checkpoints": execution_checkpoints.get_stats(),
+            "memory": get_memory_stats(),
+            "plan_cache": plan_cache.get_stats(),
+            "chat_streams": chat_stream_metrics.get_stats(),
+            "llm_guards": get_guard_stats()
         }
     except Exception as e:
         logger.error(f"Health check error: {e}")
@@ -159,6 +254,7 @@ async def database_status():
             "database_type": db_health["database_type"],
             "database_info": db_health.get("database_info", {}),
             "connection_pool": db_health.get("connection_pool", {}),
+            "raw_query_pool": db_health.get("raw_query_pool", {}),
             "features": db_health.get("features", {}),
             "status": db_health["status"],
             "connection_url": os.getenv("DATABASE_URL", "").replace("password", "***") if "DATABASE_URL" in os.environ else "not configured"